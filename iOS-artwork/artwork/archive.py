@@ -0,0 +1,70 @@
+#-------------------------------------------------------------------------------
+#
+# iOS .artwork file extractor
+# (c)2008-2011 Dave Peck <code [at] davepeck [dot] org> All Rights Reserved
+# 
+# Released under the three-clause BSD license.
+#
+# http://github.com/davepeck/iphone-tidbits/
+#
+#-------------------------------------------------------------------------------
+
+import sys
+import tarfile
+import zipfile
+from io import BytesIO
+
+class ArchiveWriter(object):
+    """Streams files into a .zip or .tar archive, or as a tar stream to stdout when the
+    archive file name is "-". Entries carry fixed timestamps and permissions, so
+    writing the same files in the same order always produces the same bytes."""
+
+    ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0) # The earliest date a zip file can hold.
+    FILE_MODE = 0644
+
+    def __init__(self, archive_file_name):
+        super(ArchiveWriter, self).__init__()
+        self.archive_file_name = archive_file_name
+        self._zip = None
+        self._tar = None
+        if archive_file_name == "-":
+            self._tar = tarfile.open(fileobj=sys.stdout, mode="w|")
+        elif archive_file_name.lower().endswith(".zip"):
+            # Images are compressed already; storing them is faster and no bigger.
+            self._zip = zipfile.ZipFile(archive_file_name, "w", zipfile.ZIP_STORED, True)
+        elif archive_file_name.lower().endswith(".tar"):
+            self._tar = tarfile.open(archive_file_name, mode="w")
+        else:
+            raise ValueError("Don't know how to write an archive named %s (use .zip, .tar or -)" % archive_file_name)
+
+    @staticmethod
+    def is_supported(archive_file_name):
+        return (archive_file_name == "-") or archive_file_name.lower().endswith(".zip") or archive_file_name.lower().endswith(".tar")
+
+    @property
+    def is_stdout(self):
+        return self.archive_file_name == "-"
+
+    def add(self, name, data):
+        """Append a file named name holding the bytes data."""
+        if self._zip is not None:
+            info = zipfile.ZipInfo(name, ArchiveWriter.ZIP_DATE_TIME)
+            info.external_attr = (0100000 | ArchiveWriter.FILE_MODE) << 16
+            info.compress_type = zipfile.ZIP_STORED
+            self._zip.writestr(info, data)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = 0
+            info.mode = ArchiveWriter.FILE_MODE
+            self._tar.addfile(info, BytesIO(data))
+
+    def close(self):
+        if self._zip is not None:
+            self._zip.close()
+            self._zip = None
+        if self._tar is not None:
+            self._tar.close()
+            self._tar = None
+            if self.is_stdout:
+                sys.stdout.flush()
@@ -11,16 +11,20 @@
 
 import os
 import mmap
-import struct
+import hashlib
+import numpy     # You must have numpy installed
 import PIL.Image # You must have the Python Imaging Library (PIL) installed
 
 from .binary_file import BinaryFile
+from .util import clone_file
 
 class ArtworkBinaryFile(BinaryFile):
     """Represents an iOS SDK .artwork file"""
     
     WIDTH_BYTE_PACKING = 8 # Determined by inspection/luck.
     
+    stats = None # Set to an artwork.stats.Stats to time reading and decoding.
+    
     def __init__(self, filename):
         super(ArtworkBinaryFile, self).__init__(filename)
         
@@ -31,41 +35,170 @@ class ArtworkBinaryFile(BinaryFile):
         if remainder != 0: offset += (ArtworkBinaryFile.WIDTH_BYTE_PACKING - remainder)
         return offset        
 
-    def get_pil_image(self, width, height, offset):
-        """Return a PIL image instance of given size, at a given offset in the .artwork file."""
-        pil_image = PIL.Image.new("RGBA", (width, height))
-        pil_pixels = pil_image.load()
+    @staticmethod
+    def _build_unpremultiply_table():
+        """Build a 256x256 lookup table mapping (alpha, premultiplied color) to straight color."""
+        alpha = numpy.arange(256, dtype=numpy.int32).reshape(256, 1)
+        color = numpy.arange(256, dtype=numpy.int32).reshape(1, 256)
+        table = (color * 255 + alpha // 2) // numpy.maximum(alpha, 1)
+        table[0, :] = color[0, :] # Fully transparent pixels keep whatever color they have.
+        return numpy.minimum(table, 255).astype(numpy.uint8)
+
+    def _get_bgra_array(self, width, height, offset, aligned_width = None):
+        """Return a (height, width, 4) numpy view of the premultiplied BGRA pixels at offset.
+        Rows are aligned_width pixels apart (by default, as _align() says for width.)
+        The view is only writable if the underlying file was mapped for writing."""
+        if aligned_width is None:
+            aligned_width = ArtworkBinaryFile._align(width)
+        pixel_count = ((height - 1) * aligned_width) + width
+        flat = numpy.frombuffer(self.data, dtype=numpy.uint8, count=4 * pixel_count, offset=offset)
+        return numpy.lib.stride_tricks.as_strided(flat, shape=(height, width, 4), strides=(4 * aligned_width, 4, 1))
 
+    def get_bgra_view(self, width, height, offset, rect = None):
+        """Return a (height, width, 4) numpy view of an image's premultiplied BGRA pixels,
+        straight into the mapped file: nothing is decoded or copied. With rect, an
+        (x, y, width, height) tuple, only that part of the image is viewed; a band of
+        whole rows is (0, y, width, row_count). Raises ValueError if rect isn't inside
+        the image. The view is only writable if the file was mapped for writing."""
+        if rect is None:
+            return self._get_bgra_array(width, height, offset)
+        x, y, rect_width, rect_height = rect
+        if (x < 0) or (y < 0) or (rect_width < 1) or (rect_height < 1) or (x + rect_width > width) or (y + rect_height > height):
+            raise ValueError("The rectangle %r is not inside the %dx%d image." % (rect, width, height))
         aligned_width = ArtworkBinaryFile._align(width)
+        return self._get_bgra_array(rect_width, rect_height, offset + 4 * ((y * aligned_width) + x), aligned_width)
+
+    @staticmethod
+    def unpremultiply_bgra(bgra, out = None):
+        """Un-premultiply a (height, width, 4) array of premultiplied BGRA pixels into straight
+        BGRA, returning out. By default out is a new array; pass the array itself (a copy, or
+        a view of a writable file) to un-premultiply it in place."""
+        if out is None:
+            out = numpy.empty(bgra.shape, dtype=numpy.uint8)
+        alpha = bgra[:, :, 3]
+        if out is not bgra:
+            out[:, :, 3] = alpha
+        alpha_base = alpha.astype(numpy.intp) << 8
+        table = ArtworkBinaryFile.UNPREMULTIPLY_TABLE.ravel()
+        for channel in range(3):
+            out[:, :, channel] = table.take(alpha_base | bgra[:, :, channel])
+        return out
+
+    def get_image_digest(self, width, height, offset):
+        """Return a hex SHA-1 of the premultiplied pixels of an image, ignoring row padding.
+        Much cheaper than decoding: it identifies an image's contents straight from the mmap."""
+        digest = hashlib.sha1(b"%dx%d:" % (width, height))
+        digest.update(numpy.ascontiguousarray(self._get_bgra_array(width, height, offset)).data)
+        return digest.hexdigest()
+
+    @staticmethod
+    def pil_image_from_bgra(bgra):
+        """Un-premultiply a (height, width, 4) array of premultiplied BGRA pixels into a PIL RGBA image."""
+        height, width = bgra.shape[0:2]
+        # View each BGRA pixel as a single little-endian word: b | g << 8 | r << 16 | a << 24
+        pixels = numpy.ascontiguousarray(bgra).view('<u4')[:, :, 0]
+        alpha_base = (pixels >> 24) << 8
+        table = ArtworkBinaryFile.UNPREMULTIPLY_TABLE.ravel()
+
+        rgba = numpy.empty((height, width, 4), dtype=numpy.uint8)
+        rgba[:, :, 0] = table.take((alpha_base | ((pixels >> 16) & 0xFF)).astype(numpy.intp))
+        rgba[:, :, 1] = table.take((alpha_base | ((pixels >> 8) & 0xFF)).astype(numpy.intp))
+        rgba[:, :, 2] = table.take((alpha_base | (pixels & 0xFF)).astype(numpy.intp))
+        rgba[:, :, 3] = pixels >> 24
+
+        return PIL.Image.frombuffer("RGBA", (width, height), rgba, "raw", "RGBA", 0, 1)
+
+    @staticmethod
+    def compact_pil_image_from_bgra(bgra):
+        """Like pil_image_from_bgra, but a grayscale image comes back as an LA image, and a
+        fully opaque one as an RGB image, or as an L image if it is also grayscale. Opaque
+        pixels need no un-premultiplying."""
+        height, width = bgra.shape[0:2]
+        pixels = numpy.ascontiguousarray(bgra).view('<u4')[:, :, 0]
+        # b == g and g == r for every pixel?
+        is_gray = not ((pixels ^ (pixels >> 8)) & 0xFFFF).any()
+        if not (pixels >= 0xFF000000).all():
+            if not is_gray:
+                return ArtworkBinaryFile.pil_image_from_bgra(bgra)
+            # Equal premultiplied colors un-premultiply to equal colors; one channel will do.
+            table = ArtworkBinaryFile.UNPREMULTIPLY_TABLE.ravel()
+            la = numpy.empty((height, width, 2), dtype=numpy.uint8)
+            la[:, :, 0] = table.take((((pixels >> 24) << 8) | (pixels & 0xFF)).astype(numpy.intp))
+            la[:, :, 1] = pixels >> 24
+            return PIL.Image.frombuffer("LA", (width, height), la, "raw", "LA", 0, 1)
+        if is_gray:
+            gray = numpy.ascontiguousarray(bgra[:, :, 0])
+            return PIL.Image.frombuffer("L", (width, height), gray, "raw", "L", 0, 1)
+        bgr = numpy.ascontiguousarray(bgra[:, :, 0:3])
+        return PIL.Image.frombuffer("RGB", (width, height), bgr, "raw", "BGR", 0, 1)
+
+    @staticmethod
+    def scale_bgra(bgra, scale, resample = PIL.Image.ANTIALIAS):
+        """Resample a (height, width, 4) array of premultiplied BGRA pixels by scale with the
+        given PIL filter, returning a new array. Filtering premultiplied pixels keeps the
+        (meaningless) colors of transparent pixels from bleeding into their neighbours."""
+        height, width = bgra.shape[0:2]
+        scaled_width = max(1, int(round(width * scale)))
+        scaled_height = max(1, int(round(height * scale)))
+        if (scaled_width, scaled_height) == (width, height):
+            return bgra
+        pil_image = PIL.Image.frombuffer("RGBa", (width, height), numpy.ascontiguousarray(bgra), "raw", "BGRa", 0, 1)
+        pil_image = pil_image.resize((scaled_width, scaled_height), resample)
+        return numpy.frombuffer(pil_image.tobytes("raw", "BGRa"), dtype=numpy.uint8).reshape(scaled_height, scaled_width, 4)
+
+    def get_pil_image(self, width, height, offset, compact = False):
+        """Return a PIL image instance of given size, at a given offset in the .artwork file.
+        With compact, opaque images are returned as RGB or L images, and grayscale images
+        with transparency as LA images, rather than RGBA."""
+        bgra = self._get_bgra_array(width, height, offset)
+        stats = self.stats
+        if stats is not None:
+            # Copying the pixels out first separates page faults from pixel conversion.
+            start = stats.start()
+            bgra = numpy.ascontiguousarray(bgra)
+            stats.record("read pixels", start, bytes_read = bgra.nbytes)
+            start = stats.start()
+        if compact:
+            pil_image = ArtworkBinaryFile.compact_pil_image_from_bgra(bgra)
+        else:
+            pil_image = ArtworkBinaryFile.pil_image_from_bgra(bgra)
+        if stats is not None:
+            stats.record("unpremultiply", start, pixels = width * height)
+        return pil_image
+
+    def get_raw_bytes(self, width, height, offset):
+        """Return the premultiplied BGRA pixels of an image, row after row, without the row padding."""
+        stats = self.stats
+        if stats is not None:
+            start = stats.start()
+        raw_bytes = numpy.ascontiguousarray(self._get_bgra_array(width, height, offset)).tostring()
+        if stats is not None:
+            stats.record("read pixels", start, bytes_read = len(raw_bytes))
+        return raw_bytes
+
+ArtworkBinaryFile.UNPREMULTIPLY_TABLE = ArtworkBinaryFile._build_unpremultiply_table()
 
-        for y in range(height):
-            for x in range(width):
-                pixel_offset = offset + (4 * ((y * aligned_width) + x))
-                b, g, r, a = struct.unpack_from('<BBBB', self.data, pixel_offset)
-                if a != 0:
-                    r = (r*255 + a//2)//a
-                    g = (g*255 + a//2)//a
-                    b = (b*255 + a//2)//a
-                pil_pixels[x, y] = (r, g, b, a)
-                
-        return pil_image       
-        
 
 class WritableArtworkBinaryFile(ArtworkBinaryFile):
     """Represents a writable iOS SDK .artwork file"""
     
-    def __init__(self, filename, template_binary):
+    def __init__(self, filename, template_binary = None):
+        """Create filename as a copy of template_binary, or, with no template, write into
+        the existing filename (typically one that another process created from a template.)"""
         super(WritableArtworkBinaryFile, self).__init__(filename)
-        self._data_length = template_binary.data_length
+        if template_binary is not None:
+            self._data_length = template_binary.data_length
+        else:
+            self._data_length = os.path.getsize(filename)
         self.template_binary = template_binary
     
     @property
     def data(self):
         if self._data is None:
-            # Zero out the file...
-            self._file = open(self.filename, "wb")
-            self._file.write(self.template_binary.data) # TODO: I don't know why I can't just zero out. Is there something else in these artwork files?
-            self._file.close()
+            if self.template_binary is not None:
+                # Start from a copy of the template. (TODO: I don't know why I can't just zero out. Is there something else in these artwork files?)
+                # Where the filesystem supports it the copy shares the template's blocks until we write to them.
+                clone_file(self.template_binary.filename, self.filename)
 
             self._file = open(self.filename, "r+b")
             self._data = mmap.mmap(self._file.fileno(), self.data_length, access=mmap.ACCESS_WRITE)
@@ -90,21 +223,38 @@ class WritableArtworkBinaryFile(ArtworkBinaryFile):
         self.close()
         os.remove(self.filename)
         
+    @staticmethod
+    def _premultiplied_bgra(pil_image):
+        """Premultiply and swizzle an RGB or RGBA PIL image into a (height, width, 4) BGRA array."""
+        rgb_or_rgba = numpy.asarray(pil_image)
+        height, width = rgb_or_rgba.shape[0:2]
+        bgra = numpy.empty((height, width, 4), dtype=numpy.uint8)
+        if pil_image.mode == 'RGBA':
+            alpha = rgb_or_rgba[:, :, 3:4].astype(numpy.uint16)
+            bgra[:, :, 0:3] = (rgb_or_rgba[:, :, 2::-1] * alpha + 127) // 255
+            bgra[:, :, 3] = rgb_or_rgba[:, :, 3]
+        else:
+            bgra[:, :, 0:3] = rgb_or_rgba[:, :, 2::-1]
+            bgra[:, :, 3] = 255
+        return bgra
+
     def write_pil_image(self, width, height, offset, pil_image):
-        """Write a PIL image instance of given size, to a given offset in the .artwork file."""
-        pil_pixels = pil_image.load()
-        
-        aligned_width = ArtworkBinaryFile._align(width)
-        
-        for y in range(height):
-            for x in range(width):
-                if pil_image.mode == 'RGBA':
-                    r, g, b, a = pil_pixels[x, y]
-                    packed = struct.pack('<BBBB', (b*a + 127)//255, (g*a + 127)//255, (r*a + 127)//255, a)
-                else:
-                    r, g, b = pil_pixels[x, y]
-                    packed = struct.pack('<BBBB', b, g, r, 255)
-                pixel_offset = offset + (4 * ((y * aligned_width) + x))
-                self.data[pixel_offset:pixel_offset + 4] = packed    
-        
-        
\ No newline at end of file
+        """Write a PIL image instance of given size, to a given offset in the .artwork file.
+        Returns False, without writing, if the file already holds exactly those pixels."""
+        stats = self.stats
+        if stats is not None:
+            start = stats.start()
+        bgra = WritableArtworkBinaryFile._premultiplied_bgra(pil_image)
+        if stats is not None:
+            stats.record("premultiply", start, pixels = width * height)
+            start = stats.start()
+        destination = self._get_bgra_array(width, height, offset)
+        if numpy.array_equal(destination, bgra):
+            if stats is not None:
+                stats.record("write pixels", start, bytes_read = bgra.nbytes)
+            return False
+        # A single strided assignment copies every row and leaves the row padding untouched.
+        destination[...] = bgra
+        if stats is not None:
+            stats.record("write pixels", start, bytes_read = bgra.nbytes, bytes_written = bgra.nbytes)
+        return True
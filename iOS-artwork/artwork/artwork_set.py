@@ -0,0 +1,166 @@
+#-------------------------------------------------------------------------------
+#
+# iOS .artwork file extractor
+# (c)2008-2011 Dave Peck <code [at] davepeck [dot] org> All Rights Reserved
+#
+# Released under the three-clause BSD license.
+#
+# http://github.com/davepeck/iphone-tidbits/
+#
+#-------------------------------------------------------------------------------
+
+import threading
+from collections import OrderedDict
+
+from .artwork_file import ArtworkBinaryFile
+from .catalog import get_default_catalog
+
+#-------------------------------------------------------------------------------
+# ImageCache
+#-------------------------------------------------------------------------------
+
+class ImageCache(object):
+    """A least-recently-used cache of decoded PIL images, bounded by the number of
+    pixel bytes it holds rather than by the number of images. Safe to share between threads.
+    To cache something else (such as encoded images), pass a function giving its byte size."""
+
+    def __init__(self, max_bytes, byte_size_of = None):
+        super(ImageCache, self).__init__()
+        self.max_bytes = max_bytes
+        self.byte_size_of = byte_size_of or ImageCache.image_byte_size
+        self.byte_size = 0
+        self.hits = 0
+        self.misses = 0
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def image_byte_size(pil_image):
+        width, height = pil_image.size
+        return width * height * len(pil_image.getbands())
+
+    def __len__(self):
+        return len(self._images)
+
+    def get(self, key):
+        """Return the cached image for key, or None. Counts as a hit or a miss."""
+        with self._lock:
+            image = self._images.pop(key, None)
+            if image is None:
+                self.misses += 1
+                return None
+            self._images[key] = image # most recently used goes last
+            self.hits += 1
+            return image
+
+    def put(self, key, image):
+        """Cache image under key, evicting the least recently used images to make room.
+        An image bigger than the whole cache is not cached at all."""
+        byte_size = self.byte_size_of(image)
+        if byte_size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._images.pop(key, None)
+            if previous is not None:
+                self.byte_size -= self.byte_size_of(previous)
+            while self.byte_size + byte_size > self.max_bytes:
+                ignored, evicted = self._images.popitem(last = False)
+                self.byte_size -= self.byte_size_of(evicted)
+            self._images[key] = image
+            self.byte_size += byte_size
+
+    def clear(self):
+        with self._lock:
+            self._images.clear()
+            self.byte_size = 0
+
+
+#-------------------------------------------------------------------------------
+# ArtworkSet
+#-------------------------------------------------------------------------------
+
+class ArtworkSet(object):
+    """Random access, by name, to the images of one supported .artwork file.
+
+    The artwork file is mapped once, and decoded images are kept in an ImageCache,
+    so fetching a popular image again costs a dictionary lookup. Images handed out
+    are shared with the cache: treat them as read-only (copy() them before drawing.)
+
+        artwork_set = ArtworkSet("/path/to/Shared~iphone.artwork")
+        pil_image = artwork_set["UINavigationBarDefaultBackground.png"]
+        half_size = artwork_set.get("UINavigationBarDefaultBackground.png", scale = 0.5)
+    """
+
+    DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+
+    def __init__(self, artwork_file_name, set_info = None, cache_bytes = DEFAULT_CACHE_BYTES):
+        """Raises ValueError if artwork_file_name isn't a supported artwork file. Pass set_info
+        to use an ArtworkSetInfo other than the one in the catalog of supported files."""
+        super(ArtworkSet, self).__init__()
+        if set_info is None:
+            set_info = get_default_catalog().find(artwork_file_name)
+            if set_info is None:
+                raise ValueError("The artwork file %s is not currently supported." % artwork_file_name)
+        self.artwork_file_name = artwork_file_name
+        self.set_info = set_info
+        self.artwork_binary = ArtworkBinaryFile(artwork_file_name)
+        self.cache = ImageCache(cache_bytes)
+        self._indexes = dict((name, i) for i, name in enumerate(set_info.names))
+
+    @property
+    def name(self):
+        return self.set_info.name
+
+    @property
+    def version(self):
+        return self.set_info.version
+
+    @property
+    def hits(self):
+        return self.cache.hits
+
+    @property
+    def misses(self):
+        return self.cache.misses
+
+    def names(self):
+        """The names of all the images, in the order they appear in the catalog."""
+        return list(self.set_info.names)
+
+    def __len__(self):
+        return self.set_info.image_count
+
+    def __contains__(self, name):
+        return name in self._indexes
+
+    def __iter__(self):
+        return iter(self.set_info.names)
+
+    def image_geometry(self, name):
+        """Return the (width, height, offset) of the named image. Raises KeyError for unknown names."""
+        i = self._indexes[name]
+        return (int(self.set_info.widths[i]), int(self.set_info.heights[i]), int(self.set_info.offsets[i]))
+
+    def get_bgra_array(self, name, rect = None):
+        """A read-only (height, width, 4) view of the named image's premultiplied BGRA pixels,
+        or of the (x, y, width, height) rect of them. See ArtworkBinaryFile.get_bgra_view()."""
+        width, height, offset = self.image_geometry(name)
+        return self.artwork_binary.get_bgra_view(width, height, offset, rect)
+
+    def get(self, name, scale = 1.0):
+        """Return the named image as a PIL RGBA image, resampled by scale (in premultiplied
+        space.) Raises KeyError for unknown names."""
+        if scale <= 0:
+            raise ValueError("The scale must be positive, not %r." % scale)
+        key = (name, scale)
+        pil_image = self.cache.get(key)
+        if pil_image is None:
+            bgra = self.get_bgra_array(name)
+            if scale != 1.0:
+                bgra = ArtworkBinaryFile.scale_bgra(bgra, scale)
+            pil_image = ArtworkBinaryFile.pil_image_from_bgra(bgra)
+            self.cache.put(key, pil_image)
+        return pil_image
+
+    def __getitem__(self, name):
+        return self.get(name)
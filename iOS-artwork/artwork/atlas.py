@@ -0,0 +1,148 @@
+#-------------------------------------------------------------------------------
+#
+# iOS .artwork file extractor
+# (c)2008-2011 Dave Peck <code [at] davepeck [dot] org> All Rights Reserved
+# 
+# Released under the three-clause BSD license.
+#
+# http://github.com/davepeck/iphone-tidbits/
+#
+#-------------------------------------------------------------------------------
+
+import numpy
+
+from .artwork_file import ArtworkBinaryFile
+
+#-------------------------------------------------------------------------------
+# MaxRects bin packing
+#-------------------------------------------------------------------------------
+
+class MaxRectsBin(object):
+    """Packs rectangles into a fixed-size bin using the MaxRects algorithm with the
+    best short side fit heuristic. (See Jukka Jylanki, "A Thousand Ways to Pack the
+    Bin".) The bin keeps a list of maximal free rectangles, which may overlap."""
+
+    def __init__(self, width, height):
+        super(MaxRectsBin, self).__init__()
+        self.width = width
+        self.height = height
+        self.free_rects = [(0, 0, width, height)]
+        self.used_width = 0
+        self.used_height = 0
+
+    def insert(self, width, height):
+        """Find room for a width x height rectangle. Returns its (x, y), or None if it doesn't fit."""
+        best = None
+        best_fit = None
+        for free_x, free_y, free_width, free_height in self.free_rects:
+            if (width <= free_width) and (height <= free_height):
+                leftover_width = free_width - width
+                leftover_height = free_height - height
+                fit = (min(leftover_width, leftover_height), max(leftover_width, leftover_height))
+                if (best_fit is None) or (fit < best_fit):
+                    best = (free_x, free_y)
+                    best_fit = fit
+        if best is None:
+            return None
+        self._place((best[0], best[1], width, height))
+        self.used_width = max(self.used_width, best[0] + width)
+        self.used_height = max(self.used_height, best[1] + height)
+        return best
+
+    def _place(self, used):
+        used_x, used_y, used_width, used_height = used
+        used_right = used_x + used_width
+        used_bottom = used_y + used_height
+
+        free_rects = []
+        for free in self.free_rects:
+            free_x, free_y, free_width, free_height = free
+            free_right = free_x + free_width
+            free_bottom = free_y + free_height
+            if (used_x >= free_right) or (used_right <= free_x) or (used_y >= free_bottom) or (used_bottom <= free_y):
+                free_rects.append(free)
+                continue
+            # Keep the (up to four) maximal parts of the free rectangle around the used one.
+            if used_x > free_x:
+                free_rects.append((free_x, free_y, used_x - free_x, free_height))
+            if used_right < free_right:
+                free_rects.append((used_right, free_y, free_right - used_right, free_height))
+            if used_y > free_y:
+                free_rects.append((free_x, free_y, free_width, used_y - free_y))
+            if used_bottom < free_bottom:
+                free_rects.append((free_x, used_bottom, free_width, free_bottom - used_bottom))
+
+        self.free_rects = MaxRectsBin._prune(free_rects)
+
+    @staticmethod
+    def _prune(rects):
+        """Drop every rectangle that is contained in another one."""
+        rects = sorted(set(rects), key=lambda rect: rect[2] * rect[3], reverse=True)
+        kept = []
+        for x, y, width, height in rects:
+            contained = False
+            for kept_x, kept_y, kept_width, kept_height in kept:
+                if (x >= kept_x) and (y >= kept_y) and (x + width <= kept_x + kept_width) and (y + height <= kept_y + kept_height):
+                    contained = True
+                    break
+            if not contained:
+                kept.append((x, y, width, height))
+        return kept
+
+
+#-------------------------------------------------------------------------------
+# Atlases
+#-------------------------------------------------------------------------------
+
+class Atlas(object):
+    """One sprite sheet: its size and the (name, x, y, width, height) of every image on it."""
+    def __init__(self, width, height):
+        super(Atlas, self).__init__()
+        self.width = width
+        self.height = height
+        self.placements = []
+
+    def jsonable(self, file_name):
+        return {
+            "file": file_name,
+            "width": self.width,
+            "height": self.height,
+            "images": [{"name": name, "x": x, "y": y, "width": width, "height": height} for name, x, y, width, height in self.placements],
+        }
+
+
+def pack_atlases(image_infos, max_size = 2048, padding = 1):
+    """Lay the images out on as few max_size x max_size sheets as the packer manages,
+    leaving padding pixels between neighbours. Images bigger than a sheet get a sheet
+    of their own. Returns a list of Atlas objects, cropped to the area actually used."""
+    order = sorted(image_infos, key=lambda image_info: (-max(image_info.width, image_info.height), -(image_info.width * image_info.height), image_info.name))
+    bins = []
+    for image_info in order:
+        padded_width = image_info.width + padding
+        padded_height = image_info.height + padding
+        position = None
+        for packer, atlas in bins:
+            position = packer.insert(padded_width, padded_height)
+            if position is not None:
+                break
+        if position is None:
+            packer = MaxRectsBin(max(max_size, padded_width), max(max_size, padded_height))
+            atlas = Atlas(0, 0)
+            bins.append((packer, atlas))
+            position = packer.insert(padded_width, padded_height)
+        atlas.placements.append((image_info.name, position[0], position[1], image_info.width, image_info.height))
+
+    for packer, atlas in bins:
+        atlas.width = packer.used_width
+        atlas.height = packer.used_height
+    return [atlas for packer, atlas in bins]
+
+
+def render_atlas(artwork_binary, atlas, image_infos_by_name):
+    """Copy every image's premultiplied pixels from the artwork file into one buffer,
+    un-premultiply the whole sheet at once, and return it as a PIL image."""
+    bgra = numpy.zeros((atlas.height, atlas.width, 4), dtype=numpy.uint8)
+    for name, x, y, width, height in atlas.placements:
+        image_info = image_infos_by_name[name]
+        bgra[y:y + height, x:x + width] = artwork_binary._get_bgra_array(width, height, image_info.offset)
+    return ArtworkBinaryFile.pil_image_from_bgra(bgra)
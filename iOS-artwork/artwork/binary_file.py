@@ -10,8 +10,9 @@
 #-------------------------------------------------------------------------------
 
 import mmap
+import struct
 
-from .util import KnuthMorrisPratt
+from .util import MultiPatternSearch
 
 class BinaryFile(object):
     """Represents a binary file on disk, and has tools to rapidly read and search it."""
@@ -47,34 +48,45 @@ class BinaryFile(object):
         return self._data_length
         
     def find(self, bytes, starting_at = 0):
-        return KnuthMorrisPratt.find(bytes, self.data, starting_at)
+        return self.data.find(bytes, starting_at)
         
-    def find_all(self, bytes):
+    def find_all(self, bytes, overlapping = False):
         """Returns the offsets into the file for all occurences of the 'bytes' sequence"""
-        done = False
         occurences = []
-        current = 0
-        bytes_length = len(bytes)
-        while not done:
-            occurence = self.find(bytes, starting_at = current)
-            done = (occurence == -1)
-            if not done:
-                occurences.append(occurence)
-                current = occurence + bytes_length # Won't find overlaps, but who cares?
+        step = 1 if overlapping else len(bytes)
+        occurence = self.find(bytes)
+        while occurence != -1:
+            occurences.append(occurence)
+            occurence = self.find(bytes, starting_at = occurence + step)
         return occurences
         
+    def find_all_of(self, patterns, overlapping = False):
+        """Returns a dictionary mapping each of the byte sequences in 'patterns' to the
+        offsets into the file of all its occurences. The file is scanned only once."""
+        return MultiPatternSearch(patterns).find_all(self.data, overlapping)
+        
     def find_all_int(self, the_int):
         bytes = struct.pack('<H', the_int)
         return self.find_all(bytes)
         
     def find_all_ints(self, ints):
-        bytes = struct.pack('<%s' % 'H' * len(ints), *ints)
+        bytes = struct.pack('<%dH' % len(ints), *ints)
         return self.find_all(bytes)
+        
+    def find_each_int(self, ints, overlapping = False):
+        """Returns a dictionary mapping each int to the offsets of all its occurences."""
+        occurences = self.find_all_of([struct.pack('<H', the_int) for the_int in ints], overlapping)
+        return dict((the_int, occurences[struct.pack('<H', the_int)]) for the_int in ints)
     
     def find_all_long(self, the_long):
         bytes = struct.pack('<L', the_long)
         return self.find_all(bytes)
         
     def find_all_longs(self, longs):
-        bytes = struct.pack('<%s' % 'L' * len(longs), *longs)
+        bytes = struct.pack('<%dL' % len(longs), *longs)
         return self.find_all(bytes)
+        
+    def find_each_long(self, longs, overlapping = False):
+        """Returns a dictionary mapping each long to the offsets of all its occurences."""
+        occurences = self.find_all_of([struct.pack('<L', the_long) for the_long in longs], overlapping)
+        return dict((the_long, occurences[struct.pack('<L', the_long)]) for the_long in longs)
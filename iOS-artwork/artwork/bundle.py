@@ -0,0 +1,234 @@
+#-------------------------------------------------------------------------------
+#
+# iOS .artwork file extractor
+# (c)2008-2011 Dave Peck <code [at] davepeck [dot] org> All Rights Reserved
+#
+# Released under the three-clause BSD license.
+#
+# http://github.com/davepeck/iphone-tidbits/
+#
+#-------------------------------------------------------------------------------
+
+import os
+import json
+import zipfile
+
+import numpy
+
+from .artwork_file import ArtworkBinaryFile, WritableArtworkBinaryFile
+from .manifest import file_digest
+
+#-------------------------------------------------------------------------------
+# Differences between two artwork files
+#-------------------------------------------------------------------------------
+
+class ArtworkDiff(object):
+    """The images that differ between an old and a new artwork file, paired by name.
+    changed and added are lists of the new file's ArtworkInfos; removed is a list of names."""
+
+    def __init__(self, old_set_info, new_set_info, changed, added, removed, unchanged_count):
+        super(ArtworkDiff, self).__init__()
+        self.old_set_info = old_set_info
+        self.new_set_info = new_set_info
+        self.changed = changed
+        self.added = added
+        self.removed = removed
+        self.unchanged_count = unchanged_count
+
+    @property
+    def same_layout(self):
+        """Do both files have the same catalog entry, so that every image is at the same offset?"""
+        return (self.old_set_info.name, self.old_set_info.byte_size) == (self.new_set_info.name, self.new_set_info.byte_size)
+
+
+def diff_artwork(old_binary, old_set_info, new_binary, new_set_info):
+    """Compare two artwork files image by image. Images with the same name and size are
+    compared pixel by pixel, straight from both files."""
+    old_image_infos = dict((image_info.name, image_info) for image_info in old_set_info.iter_images())
+    changed = []
+    added = []
+    unchanged_count = 0
+    for image_info in new_set_info.iter_images():
+        old_image_info = old_image_infos.pop(image_info.name, None)
+        if old_image_info is None:
+            added.append(image_info)
+            continue
+        if (old_image_info.width, old_image_info.height) != (image_info.width, image_info.height):
+            changed.append(image_info)
+            continue
+        old_bgra = old_binary._get_bgra_array(old_image_info.width, old_image_info.height, old_image_info.offset)
+        new_bgra = new_binary._get_bgra_array(image_info.width, image_info.height, image_info.offset)
+        if not numpy.array_equal(old_bgra, new_bgra):
+            changed.append(image_info)
+        else:
+            unchanged_count += 1
+    removed = [name for name in old_set_info.names if name in old_image_infos]
+    return ArtworkDiff(old_set_info, new_set_info, changed, added, removed, unchanged_count)
+
+def gap_runs(set_info):
+    """The (offset, length) runs of bytes in an artwork file that no image covers."""
+    spans = []
+    for image_info in set_info.iter_images():
+        aligned_width = ArtworkBinaryFile._align(image_info.width)
+        spans.append((image_info.offset, image_info.offset + 4 * (((image_info.height - 1) * aligned_width) + image_info.width)))
+    runs = []
+    current = 0
+    for start, end in sorted(spans):
+        if start > current:
+            runs.append((current, start - current))
+        current = max(current, end)
+    if current < set_info.byte_size:
+        runs.append((current, set_info.byte_size - current))
+    return runs
+
+
+#-------------------------------------------------------------------------------
+# Patch bundles
+#-------------------------------------------------------------------------------
+
+# A bundle is a zip file holding a JSON manifest, the premultiplied BGRA pixels of
+# every changed or added image (exactly as stored, without row padding), and, when
+# they differ, the bytes between the images of the new file.
+
+BUNDLE_FORMAT = 1
+MANIFEST_NAME = "bundle.json"
+PIXELS_DIRECTORY = "pixels/"
+GAPS_NAME = "gaps.bin"
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+def _artwork_jsonable(artwork_file_name, set_info):
+    return {"name": set_info.name, "version": set_info.version, "byte_size": set_info.byte_size, "digest": file_digest(artwork_file_name)}
+
+def _gap_bytes(artwork_binary, runs):
+    return b"".join(artwork_binary.data[offset:offset + length] for offset, length in runs)
+
+def _add(bundle_zip, name, data):
+    info = zipfile.ZipInfo(name, ZIP_DATE_TIME)
+    info.external_attr = 0644 << 16
+    info.compress_type = zipfile.ZIP_DEFLATED
+    bundle_zip.writestr(info, data)
+
+def write_bundle(bundle_file_name, diff, old_binary, new_binary):
+    """Write the changed and added images of diff, taken from new_binary, into a bundle
+    that apply_bundle() can turn old_binary's file into new_binary's file with."""
+    images = []
+    for kind, image_infos in (("changed", diff.changed), ("added", diff.added)):
+        for image_info in image_infos:
+            images.append({"kind": kind, "name": image_info.name, "width": image_info.width, "height": image_info.height, "offset": image_info.offset})
+
+    gaps = []
+    runs = gap_runs(diff.new_set_info)
+    gap_bytes = _gap_bytes(new_binary, runs)
+    if (not diff.same_layout) or (gap_bytes != _gap_bytes(old_binary, runs)):
+        gaps = runs
+
+    manifest = {
+        "format": BUNDLE_FORMAT,
+        "from": _artwork_jsonable(old_binary.filename, diff.old_set_info),
+        "to": _artwork_jsonable(new_binary.filename, diff.new_set_info),
+        "images": images,
+        "removed": diff.removed,
+        "gaps": gaps,
+    }
+
+    bundle_zip = zipfile.ZipFile(bundle_file_name, "w", zipfile.ZIP_DEFLATED, True)
+    try:
+        _add(bundle_zip, MANIFEST_NAME, json.dumps(manifest, indent = 4, sort_keys = True))
+        for image in images:
+            _add(bundle_zip, PIXELS_DIRECTORY + image["name"], new_binary.get_raw_bytes(image["width"], image["height"], image["offset"]))
+        if gaps:
+            _add(bundle_zip, GAPS_NAME, gap_bytes)
+    finally:
+        bundle_zip.close()
+
+def read_bundle_manifest(bundle_zip):
+    try:
+        manifest = json.loads(bundle_zip.read(MANIFEST_NAME))
+    except (KeyError, ValueError):
+        raise ValueError("Not an artwork patch bundle.")
+    if manifest.get("format") != BUNDLE_FORMAT:
+        raise ValueError("Unknown artwork patch bundle format %r." % manifest.get("format"))
+    return manifest
+
+def apply_bundle(bundle_file_name, artwork_file_name, set_info, new_set_info, create_file_name):
+    """Create create_file_name by applying a bundle to the artwork file it was made from.
+    new_set_info describes the file the bundle was made to (see bundle_target()).
+
+    If both files have the same layout the new file starts out as a copy of the original
+    and only the changed images are written. Otherwise the unchanged images are copied
+    from the original to their new offsets. Either way, the result must match the file
+    the bundle was made from, byte for byte. Raises ValueError if anything is amiss,
+    leaving no file behind."""
+    bundle_zip = zipfile.ZipFile(bundle_file_name, "r")
+    try:
+        manifest = read_bundle_manifest(bundle_zip)
+        original = manifest["from"]
+        if (original["name"], original["byte_size"]) != (set_info.name, set_info.byte_size) or (file_digest(artwork_file_name) != original["digest"]):
+            raise ValueError("The bundle was made from a different artwork file (%s version %s.)" % (original["name"], original["version"]))
+
+        artwork_binary = ArtworkBinaryFile(artwork_file_name)
+        same_layout = (manifest["to"]["name"], manifest["to"]["byte_size"]) == (original["name"], original["byte_size"])
+        create_binary = None
+        try:
+            if same_layout:
+                create_binary = WritableArtworkBinaryFile(create_file_name, artwork_binary)
+            else:
+                f = open(create_file_name, "wb")
+                f.truncate(new_set_info.byte_size)
+                f.close()
+                create_binary = WritableArtworkBinaryFile(create_file_name)
+            create_binary.open()
+
+            bundled_names = set(image["name"] for image in manifest["images"])
+            if not same_layout:
+                old_image_infos = dict((image_info.name, image_info) for image_info in set_info.iter_images())
+                for image_info in new_set_info.iter_images():
+                    if image_info.name in bundled_names:
+                        continue
+                    old_image_info = old_image_infos.get(image_info.name)
+                    if old_image_info is None:
+                        raise ValueError("The bundle is missing the pixels of %s." % image_info.name)
+                    destination = create_binary._get_bgra_array(image_info.width, image_info.height, image_info.offset)
+                    destination[...] = artwork_binary._get_bgra_array(old_image_info.width, old_image_info.height, old_image_info.offset)
+
+            for image in manifest["images"]:
+                width, height, offset = image["width"], image["height"], image["offset"]
+                pixels = bundle_zip.read(PIXELS_DIRECTORY + image["name"])
+                if len(pixels) != 4 * width * height:
+                    raise ValueError("The bundled pixels of %s are the wrong size." % image["name"])
+                destination = create_binary._get_bgra_array(width, height, offset)
+                destination[...] = numpy.frombuffer(pixels, dtype=numpy.uint8).reshape(height, width, 4)
+
+            if manifest["gaps"]:
+                gap_bytes = bundle_zip.read(GAPS_NAME)
+                current = 0
+                for offset, length in manifest["gaps"]:
+                    create_binary.data[offset:offset + length] = gap_bytes[current:current + length]
+                    current += length
+
+            create_binary.close()
+            if file_digest(create_file_name) != manifest["to"]["digest"]:
+                raise ValueError("The patched file doesn't match the file the bundle was made from.")
+        except:
+            if create_binary is not None:
+                if create_binary._data is not None:
+                    create_binary.close()
+                elif create_binary._file is not None:
+                    # The file was opened, but mapping it failed.
+                    create_binary._file.close()
+            if os.path.exists(create_file_name):
+                os.remove(create_file_name)
+            raise
+    finally:
+        bundle_zip.close()
+    return manifest
+
+def bundle_target(bundle_file_name):
+    """Return the (name, byte_size) of the artwork file a bundle was made to, so that its
+    catalog entry can be looked up before applying it."""
+    bundle_zip = zipfile.ZipFile(bundle_file_name, "r")
+    try:
+        manifest = read_bundle_manifest(bundle_zip)
+    finally:
+        bundle_zip.close()
+    return (manifest["to"]["name"], manifest["to"]["byte_size"])
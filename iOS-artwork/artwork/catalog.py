@@ -0,0 +1,276 @@
+#-------------------------------------------------------------------------------
+#
+# iOS .artwork file extractor
+# (c)2008-2011 Dave Peck <code [at] davepeck [dot] org> All Rights Reserved
+# 
+# Released under the three-clause BSD license.
+#
+# http://github.com/davepeck/iphone-tidbits/
+#
+#-------------------------------------------------------------------------------
+
+import os
+import mmap
+import json
+import struct
+import hashlib
+
+import numpy
+
+#-------------------------------------------------------------------------------
+# ArtworkInfo, ArtworkSetInfo
+#-------------------------------------------------------------------------------
+
+class ArtworkInfo(object):
+    def __init__(self, jsonable):
+        super(ArtworkInfo, self).__init__()
+        self.name = jsonable[0]
+        self.width = jsonable[1]
+        self.height = jsonable[2]
+        self.offset = jsonable[3]
+
+class ArtworkSetInfo(object):
+    """Describes the images in one supported .artwork file. The image names, widths,
+    heights and offsets are kept as columns rather than as an object per image."""
+    def __init__(self, name, version, byte_size, names, widths, heights, offsets):
+        super(ArtworkSetInfo, self).__init__()
+        self.name = name
+        self.version = version
+        self.byte_size = byte_size
+        self.names = names
+        self.widths = widths
+        self.heights = heights
+        self.offsets = offsets
+
+    @staticmethod
+    def from_jsonable(jsonable):
+        images = jsonable["images"]
+        return ArtworkSetInfo(
+            jsonable["name"],
+            jsonable["version"],
+            jsonable["byte_size"],
+            [image[0] for image in images],
+            numpy.array([image[1] for image in images], dtype=numpy.uint16),
+            numpy.array([image[2] for image in images], dtype=numpy.uint16),
+            numpy.array([image[3] for image in images], dtype=numpy.uint32))
+
+    @property
+    def image_count(self):
+        return len(self.names)
+
+    @property
+    def pixels_per_point(self):
+        """2 for the images of the @2x artwork files, 1 for the others."""
+        return 2 if "@2x" in self.name else 1
+
+    def iter_images(self):
+        for jsonable in zip(self.names, self.widths.tolist(), self.heights.tolist(), self.offsets.tolist()):
+            yield ArtworkInfo(jsonable)
+
+
+#-------------------------------------------------------------------------------
+# The supported artwork files that ship next to this package
+#-------------------------------------------------------------------------------
+
+def supported_artwork_files_directory():
+    return os.path.join(os.path.dirname(os.path.dirname(os.path.realpath(__file__))), "supported_artwork_files")
+
+def supported_artwork_catalog_file_name():
+    return supported_artwork_files_directory() + ".catalog"
+
+_default_catalog = None
+
+def get_default_catalog():
+    """The (shared) ArtworkCatalog of the supported artwork files."""
+    global _default_catalog
+    if _default_catalog is None:
+        _default_catalog = ArtworkCatalog(supported_artwork_files_directory(), supported_artwork_catalog_file_name())
+    return _default_catalog
+
+
+#-------------------------------------------------------------------------------
+# ArtworkCatalog
+#-------------------------------------------------------------------------------
+
+class ArtworkCatalog(object):
+    """All supported artwork sets, compiled from a directory of JSON files into a single
+    file that is mapped into memory. The JSON files remain the source of truth: the
+    compiled file remembers which JSON files (by name, size and mtime) it was built
+    from, and is rebuilt as soon as any of them changes.
+
+    The compiled file holds a header, a directory of (basename, byte_size) keys, and
+    one block per set: its name and version followed by the width, height and offset
+    columns and the packed image names. Looking up a set only touches its own block."""
+
+    MAGIC = b"ARTCAT01"
+    HEADER_FORMAT = "<8s20sL"
+    DIRECTORY_ENTRY_FORMAT = "<QLLLL" # byte_size, key_offset, key_length, set_offset, set_length
+    SET_HEADER_FORMAT = "<LLL"        # image_count, name_length, version_length
+
+    def __init__(self, json_directory, catalog_file_name):
+        super(ArtworkCatalog, self).__init__()
+        self.json_directory = json_directory
+        self.catalog_file_name = catalog_file_name
+        self._data = None
+        self._directory = None
+        self._in_memory_sets = None
+
+    def json_file_names(self):
+        return sorted(file_name for file_name in os.listdir(self.json_directory) if file_name.endswith(".json"))
+
+    def json_signature(self):
+        """A digest of the names, sizes and modification times of all the JSON files."""
+        digest = hashlib.sha1()
+        for file_name in self.json_file_names():
+            stat = os.stat(os.path.join(self.json_directory, file_name))
+            digest.update(("%s:%d:%r\n" % (file_name, stat.st_size, stat.st_mtime)).encode('utf-8'))
+        return digest.digest()
+
+    def read_json_set_infos(self):
+        set_infos = []
+        for file_name in self.json_file_names():
+            f = open(os.path.join(self.json_directory, file_name), "r")
+            jsonable = json.loads(f.read())
+            f.close()
+            set_infos.append(ArtworkSetInfo.from_jsonable(jsonable))
+        return set_infos
+
+    @staticmethod
+    def _pack_set(set_info):
+        name = set_info.name.encode('utf-8')
+        version = set_info.version.encode('utf-8')
+        encoded_names = [image_name.encode('utf-8') for image_name in set_info.names]
+        name_ends = numpy.cumsum([len(encoded_name) for encoded_name in encoded_names], dtype=numpy.uint32)
+
+        block = struct.pack(ArtworkCatalog.SET_HEADER_FORMAT, set_info.image_count, len(name), len(version)) + name + version
+        block += b"\0" * (-len(block) % 4) # keep the columns aligned
+        block += set_info.offsets.astype('<u4').tostring()
+        block += name_ends.astype('<u4').tostring()
+        block += set_info.widths.astype('<u2').tostring()
+        block += set_info.heights.astype('<u2').tostring()
+        block += b"".join(encoded_names)
+        return block
+
+    def compile(self):
+        """Build the compiled catalog file from the JSON files."""
+        signature = self.json_signature()
+        set_infos = self.read_json_set_infos()
+
+        keys = [set_info.name.encode('utf-8') for set_info in set_infos]
+        blocks = [ArtworkCatalog._pack_set(set_info) for set_info in set_infos]
+
+        header_length = struct.calcsize(ArtworkCatalog.HEADER_FORMAT)
+        directory_length = len(set_infos) * struct.calcsize(ArtworkCatalog.DIRECTORY_ENTRY_FORMAT)
+        current = header_length + directory_length + sum(len(key) for key in keys)
+
+        directory = b""
+        key_offset = header_length + directory_length
+        for set_info, key, block in zip(set_infos, keys, blocks):
+            current += -current % 4
+            directory += struct.pack(ArtworkCatalog.DIRECTORY_ENTRY_FORMAT, set_info.byte_size, key_offset, len(key), current, len(block))
+            key_offset += len(key)
+            current += len(block)
+
+        contents = struct.pack(ArtworkCatalog.HEADER_FORMAT, ArtworkCatalog.MAGIC, signature, len(set_infos)) + directory + b"".join(keys)
+        for block in blocks:
+            contents += b"\0" * (-len(contents) % 4)
+            contents += block
+
+        temporary_file_name = "%s.%d.tmp" % (self.catalog_file_name, os.getpid())
+        f = open(temporary_file_name, "wb")
+        f.write(contents)
+        f.close()
+        os.rename(temporary_file_name, self.catalog_file_name)
+
+    def _map(self):
+        """Map the compiled file, returning False if it is missing, invalid or out of date."""
+        try:
+            f = open(self.catalog_file_name, "rb")
+        except IOError:
+            return False
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (mmap.error, ValueError):
+            f.close()
+            return False
+        f.close()
+
+        header_length = struct.calcsize(ArtworkCatalog.HEADER_FORMAT)
+        if len(data) < header_length:
+            data.close()
+            return False
+        magic, signature, set_count = struct.unpack_from(ArtworkCatalog.HEADER_FORMAT, data, 0)
+        if (magic != ArtworkCatalog.MAGIC) or (signature != self.json_signature()):
+            data.close()
+            return False
+
+        directory = {}
+        entry_length = struct.calcsize(ArtworkCatalog.DIRECTORY_ENTRY_FORMAT)
+        for i in range(set_count):
+            byte_size, key_offset, key_length, set_offset, set_length = struct.unpack_from(ArtworkCatalog.DIRECTORY_ENTRY_FORMAT, data, header_length + (i * entry_length))
+            key = data[key_offset:key_offset + key_length].decode('utf-8')
+            directory[(key, byte_size)] = (set_offset, set_length)
+
+        self._data = data
+        self._directory = directory
+        return True
+
+    def open(self):
+        """Map the compiled catalog, (re)building it first if it is stale. If it can't be
+        written, fall back to keeping the JSON contents in memory."""
+        if (self._data is not None) or (self._in_memory_sets is not None):
+            return
+        if self._map():
+            return
+        try:
+            self.compile()
+        except (IOError, OSError):
+            pass
+        if not self._map():
+            self._in_memory_sets = dict(((set_info.name, set_info.byte_size), set_info) for set_info in self.read_json_set_infos())
+
+    def _read_set(self, set_offset, byte_size):
+        data = self._data
+        image_count, name_length, version_length = struct.unpack_from(ArtworkCatalog.SET_HEADER_FORMAT, data, set_offset)
+        current = set_offset + struct.calcsize(ArtworkCatalog.SET_HEADER_FORMAT)
+        name = data[current:current + name_length].decode('utf-8')
+        current += name_length
+        version = data[current:current + version_length].decode('utf-8')
+        current += version_length
+        current += -(current - set_offset) % 4
+
+        offsets = numpy.frombuffer(data, dtype='<u4', count=image_count, offset=current)
+        current += 4 * image_count
+        name_ends = numpy.frombuffer(data, dtype='<u4', count=image_count, offset=current)
+        current += 4 * image_count
+        widths = numpy.frombuffer(data, dtype='<u2', count=image_count, offset=current)
+        current += 2 * image_count
+        heights = numpy.frombuffer(data, dtype='<u2', count=image_count, offset=current)
+        current += 2 * image_count
+
+        names_blob = data[current:current + (int(name_ends[-1]) if image_count else 0)]
+        starts = [0] + name_ends[:-1].tolist()
+        names = [names_blob[start:end].decode('utf-8') for start, end in zip(starts, name_ends.tolist())]
+
+        return ArtworkSetInfo(name, version, byte_size, names, widths, heights, offsets)
+
+    def get_set_info(self, basename, byte_size):
+        """Return the ArtworkSetInfo for an artwork file with the given basename and size, or None."""
+        self.open()
+        if self._in_memory_sets is not None:
+            return self._in_memory_sets.get((basename, byte_size))
+        entry = self._directory.get((basename, byte_size))
+        if entry is None:
+            return None
+        return self._read_set(entry[0], byte_size)
+
+    def find(self, artwork_file_name):
+        """Return the ArtworkSetInfo describing the artwork file on disk, or None if it isn't supported."""
+        return self.get_set_info(os.path.basename(artwork_file_name), os.path.getsize(artwork_file_name))
+
+    def keys(self):
+        """All supported (basename, byte_size) pairs."""
+        self.open()
+        if self._in_memory_sets is not None:
+            return sorted(self._in_memory_sets)
+        return sorted(self._directory)
@@ -0,0 +1,101 @@
+#-------------------------------------------------------------------------------
+#
+# iOS .artwork file extractor
+# (c)2008-2011 Dave Peck <code [at] davepeck [dot] org> All Rights Reserved
+#
+# Released under the three-clause BSD license.
+#
+# http://github.com/davepeck/iphone-tidbits/
+#
+#-------------------------------------------------------------------------------
+
+import os
+import json
+
+from .formats import export_name
+
+class ContentStore(object):
+    """A directory of exported images named by the digest of their pixels, so that an
+    image found in many places (several sets, several iOS versions) is encoded once.
+    Images written with other formats, compress levels or modes are kept apart."""
+
+    DIRECTORY_NAME = ".artwork-store"
+
+    def __init__(self, directory, image_format, compress_level, compact = False):
+        super(ContentStore, self).__init__()
+        self.directory = os.path.join(directory, "%s-%s%s" % (image_format, "default" if compress_level is None else compress_level, "-compact" if compact else ""))
+        self.image_format = image_format
+
+    def object_file_name(self, digest):
+        return os.path.join(self.directory, digest[0:2], export_name(digest + ".png", self.image_format))
+
+    def has(self, digest):
+        return os.path.exists(self.object_file_name(digest))
+
+    def temporary_file_name(self, digest):
+        """Where to write an object before add() moves it into place, so that an
+        interrupted export never leaves a partial object behind."""
+        object_file_name = self.object_file_name(digest)
+        object_directory = os.path.dirname(object_file_name)
+        if not os.path.isdir(object_directory):
+            os.makedirs(object_directory)
+        return "%s.%d.tmp" % (object_file_name, os.getpid())
+
+    def add(self, digest, temporary_file_name):
+        os.rename(temporary_file_name, self.object_file_name(digest))
+
+    def link(self, digest, export_file_name):
+        """Hardlink the object to export_file_name, returning False if the filesystem can't."""
+        object_file_name = self.object_file_name(digest)
+        try:
+            if os.path.lexists(export_file_name):
+                if os.path.samefile(object_file_name, export_file_name):
+                    return True
+                os.remove(export_file_name)
+            os.link(object_file_name, export_file_name)
+        except (OSError, AttributeError):
+            return False
+        return True
+
+
+class DedupManifest(object):
+    """Records, in an export directory, which stored object every exported image is.
+    Where an image couldn't be hardlinked, this is the only record of it."""
+
+    FILE_NAME = ".artwork-dedup.json"
+
+    def __init__(self, directory):
+        super(DedupManifest, self).__init__()
+        self.directory = directory
+        self.images = {}
+
+    @property
+    def file_name(self):
+        return os.path.join(self.directory, DedupManifest.FILE_NAME)
+
+    @staticmethod
+    def load(directory):
+        """Read the manifest in directory, so that another export can add to it. A missing or unreadable manifest is an empty one."""
+        manifest = DedupManifest(directory)
+        try:
+            f = open(manifest.file_name, "r")
+            try:
+                manifest.images = json.loads(f.read())["images"]
+            finally:
+                f.close()
+        except (IOError, ValueError, KeyError, TypeError):
+            pass
+        return manifest
+
+    def record(self, export_file_name, object_file_name, linked):
+        self.images[os.path.relpath(export_file_name, self.directory)] = {
+            "object": os.path.relpath(object_file_name, self.directory),
+            "linked": linked,
+        }
+
+    def save(self):
+        temporary_file_name = "%s.%d.tmp" % (self.file_name, os.getpid())
+        f = open(temporary_file_name, "w")
+        f.write(json.dumps({"images": self.images}, indent = 4, sort_keys = True))
+        f.close()
+        os.rename(temporary_file_name, self.file_name)
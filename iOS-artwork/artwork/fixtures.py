@@ -0,0 +1,182 @@
+#-------------------------------------------------------------------------------
+#
+# iOS .artwork file extractor
+# (c)2008-2011 Dave Peck <code [at] davepeck [dot] org> All Rights Reserved
+#
+# Released under the three-clause BSD license.
+#
+# http://github.com/davepeck/iphone-tidbits/
+#
+#-------------------------------------------------------------------------------
+
+import os
+import struct
+
+import numpy
+
+from .artwork_file import WritableArtworkBinaryFile
+from .structs import CFString, CFString64, NList, NList64, ArtworkSetInformation, ArtworkSetInformation64, ArtworkSizeInformation, ArtworkSizeInformation64
+
+#-------------------------------------------------------------------------------
+# Synthetic files for benchmarking and experimenting without an iOS SDK
+#-------------------------------------------------------------------------------
+
+#-------------------------------------------------------------------------------
+# .artwork files
+#-------------------------------------------------------------------------------
+
+def random_premultiplied_bgra(random, width, height):
+    """A (height, width, 4) array of random, validly premultiplied BGRA pixels (no color exceeds its alpha.)"""
+    bgra = random.randint(0, 256, size=(height, width, 4)).astype(numpy.uint16)
+    bgra[:, :, 0:3] = (bgra[:, :, 0:3] * (bgra[:, :, 3:4] + 1)) >> 8
+    return bgra.astype(numpy.uint8)
+
+def write_artwork_file(set_info, file_name, seed = 0):
+    """Write a file with the name, size and image layout described by set_info, filled with
+    random pixels. The bytes between images are zero. (A few catalogs have images that share
+    bytes; the image written last wins, so its neighbour may not be validly premultiplied.)"""
+    f = open(file_name, "wb")
+    f.truncate(set_info.byte_size)
+    f.close()
+
+    random = numpy.random.RandomState(seed)
+    artwork_binary = WritableArtworkBinaryFile(file_name)
+    artwork_binary.open()
+    for image_info in set_info.iter_images():
+        destination = artwork_binary._get_bgra_array(image_info.width, image_info.height, image_info.offset)
+        destination[...] = random_premultiplied_bgra(random, image_info.width, image_info.height)
+    artwork_binary.close()
+
+
+#-------------------------------------------------------------------------------
+# Mach-O files
+#-------------------------------------------------------------------------------
+
+MH_MAGIC = 0xfeedface
+MH_MAGIC_64 = 0xfeedfacf
+FAT_MAGIC = 0xcafebabe
+MH_EXECUTE = 2
+LC_SEGMENT = 0x1
+LC_SEGMENT_64 = 0x19
+LC_SYMTAB = 0x2
+N_SECT = 0xe
+
+CPU_TYPE_ARM = 12
+CPU_TYPE_ARM64 = 0x0100000c
+CPU_SUBTYPE_ARM_V7 = 9
+CPU_SUBTYPE_ARM64_ALL = 0
+
+CFSTRING_FLAGS = 0x7c8 # a constant, ASCII CFString
+
+class _MachOBuilder(object):
+    """Lays out the __DATA segment of a synthetic Mach-O file. The segment's addresses equal
+    its file offsets, which is what UIKitBinaryFile assumes of the shared image tables."""
+
+    BASE = 0x1000
+
+    def __init__(self, is_64_bit):
+        super(_MachOBuilder, self).__init__()
+        self.is_64_bit = is_64_bit
+        self.pointer_format = '<Q' if is_64_bit else '<L'
+        self.body = bytearray()
+
+    def alloc(self, data, alignment = 8):
+        """Append data to the segment and return its address."""
+        self.body.extend(b"\0" * (-(self.BASE + len(self.body)) % alignment))
+        address = self.BASE + len(self.body)
+        self.body.extend(data)
+        return address
+
+    def pointers(self, addresses):
+        return b"".join(struct.pack(self.pointer_format, address) for address in addresses)
+
+
+def build_macho(iphone_set_infos, ipad_set_infos, is_64_bit = False, cputype = None, cpusubtype = None, filler_symbol_count = 0):
+    """Build a UIKit-like Mach-O file whose ___sharedImageSetsPhone and ___sharedImageSetsPad
+    tables describe the given ArtworkSetInfos (two of each, like UIKitBinaryFile expects), with
+    a __cfstring section holding all the names and filler_symbol_count extra symbols (every
+    other one a thumb function.) Returns the file's contents. The 64-bit artwork tables
+    follow the unverified ArtworkSetInformation64 layout, so they only exercise the Mach-O
+    header and symbol table code."""
+    if cputype is None:
+        cputype = CPU_TYPE_ARM64 if is_64_bit else CPU_TYPE_ARM
+    if cpusubtype is None:
+        cpusubtype = CPU_SUBTYPE_ARM64_ALL if is_64_bit else CPU_SUBTYPE_ARM_V7
+    cfstring_type = CFString64 if is_64_bit else CFString
+    nlist_type = NList64 if is_64_bit else NList
+    set_information_type = ArtworkSetInformation64 if is_64_bit else ArtworkSetInformation
+    size_information_type = ArtworkSizeInformation64 if is_64_bit else ArtworkSizeInformation
+
+    builder = _MachOBuilder(is_64_bit)
+
+    # The characters of every string, then the __cfstring section pointing at them.
+    strings = []
+    def add_cfstring(string):
+        strings.append((builder.alloc(string.encode('ascii') + b"\0", 1), len(string)))
+        return len(strings) - 1
+    tables = []
+    for set_infos in (iphone_set_infos, ipad_set_infos):
+        tables.append([(add_cfstring(os.path.splitext(set_info.name)[0]), [add_cfstring(name) for name in set_info.names], set_info) for set_info in set_infos])
+    cfstrings = b"".join(struct.pack('<' + cfstring_type.FORMAT, 0, CFSTRING_FLAGS, pointer, length) for pointer, length in strings)
+    cfstrings_address = builder.alloc(cfstrings, 16)
+    cfstring_address = lambda i: cfstrings_address + (i * cfstring_type.SIZE)
+
+    # The image set tables, each with its size and name arrays.
+    symbols = []
+    for symbol_name, table in zip(("___sharedImageSetsPhone", "___sharedImageSetsPad"), tables):
+        records = []
+        for set_name_i, name_is, set_info in table:
+            sizes = b"".join(struct.pack('<' + size_information_type.FORMAT, offset, width, height) for width, height, offset in zip(set_info.widths.tolist(), set_info.heights.tolist(), set_info.offsets.tolist()))
+            sizes_address = builder.alloc(sizes)
+            names_address = builder.alloc(builder.pointers([cfstring_address(i) for i in name_is]))
+            records.append(struct.pack('<' + set_information_type.FORMAT, cfstring_address(set_name_i), 0, 0, sizes_address, names_address, set_info.image_count, 0, 0, 0, 0))
+        symbols.append((symbol_name, builder.alloc(b"".join(records)), 0))
+    for i in range(filler_symbol_count):
+        symbols.append(("_filler_function_%d" % i, 0x4000 + (4 * i), NList.N_ARM_THUMB_DEF if (i % 2) else 0))
+
+    # The symbol table and its strings.
+    string_table = b"\0"
+    nlists = b""
+    for name, address, desc in symbols:
+        nlists += struct.pack('<' + nlist_type.FORMAT, len(string_table), N_SECT, 1, desc, address)
+        string_table += name.encode('ascii') + b"\0"
+    symbols_address = builder.alloc(nlists)
+    strings_address = builder.alloc(string_table, 1)
+    total_size = builder.BASE + len(builder.body)
+
+    # The header and load commands: one segment with one section, and the symbol table.
+    if is_64_bit:
+        header = struct.pack('<8L', MH_MAGIC_64, cputype, cpusubtype, MH_EXECUTE, 2, 72 + 80 + 24, 0, 0)
+        segment = struct.pack('<LL16sQQQQLLLL', LC_SEGMENT_64, 72 + 80, b"__DATA", 0, total_size, 0, total_size, 3, 3, 1, 0)
+        section = struct.pack('<16s16sQQLLLLLLLL', b"__cfstring", b"__DATA", cfstrings_address, len(cfstrings), cfstrings_address, 3, 0, 0, 0, 0, 0, 0)
+    else:
+        header = struct.pack('<7L', MH_MAGIC, cputype, cpusubtype, MH_EXECUTE, 2, 56 + 68 + 24, 0)
+        segment = struct.pack('<LL16sLLLLLLLL', LC_SEGMENT, 56 + 68, b"__DATA", 0, total_size, 0, total_size, 3, 3, 1, 0)
+        section = struct.pack('<16s16sLLLLLLLLL', b"__cfstring", b"__DATA", cfstrings_address, len(cfstrings), cfstrings_address, 2, 0, 0, 0, 0, 0)
+    symtab = struct.pack('<6L', LC_SYMTAB, 24, symbols_address, len(symbols), strings_address, len(string_table))
+
+    contents = bytearray(total_size)
+    commands = header + segment + section + symtab
+    contents[0:len(commands)] = commands
+    contents[builder.BASE:] = builder.body
+    return bytes(contents)
+
+def build_fat_macho(slices):
+    """Build a universal binary from a list of (cputype, cpusubtype, contents) slices."""
+    alignment = 14 # 2**14
+    contents = bytearray(struct.pack('>LL', FAT_MAGIC, len(slices)))
+    offset = 1 << alignment
+    placed = []
+    for cputype, cpusubtype, slice_contents in slices:
+        contents += struct.pack('>5L', cputype, cpusubtype, offset, len(slice_contents), alignment)
+        placed.append((offset, slice_contents))
+        offset += len(slice_contents) + (-len(slice_contents) % (1 << alignment))
+    contents += b"\0" * (offset - len(contents))
+    for slice_offset, slice_contents in placed:
+        contents[slice_offset:slice_offset + len(slice_contents)] = slice_contents
+    return bytes(contents)
+
+def write_file(file_name, contents):
+    f = open(file_name, "wb")
+    f.write(contents)
+    f.close()
@@ -0,0 +1,143 @@
+#-------------------------------------------------------------------------------
+#
+# iOS .artwork file extractor
+# (c)2008-2011 Dave Peck <code [at] davepeck [dot] org> All Rights Reserved
+#
+# Released under the three-clause BSD license.
+#
+# http://github.com/davepeck/iphone-tidbits/
+#
+#-------------------------------------------------------------------------------
+
+import os
+import struct
+from io import BytesIO
+
+import numpy
+import PIL.Image
+
+from .artwork_file import ArtworkBinaryFile
+
+#-------------------------------------------------------------------------------
+# Export formats
+#
+#   png  - straight RGBA, or RGB/L for opaque images
+#   webp - lossless WebP (RGB for opaque images)
+#   raw  - the premultiplied BGRA pixels exactly as stored in the artwork file,
+#          without the row padding, after a small header:
+#
+#              4 bytes  RAW_MAGIC
+#              4 bytes  width  (little-endian)
+#              4 bytes  height (little-endian)
+#
+#          followed by height rows of width * 4 bytes.
+#-------------------------------------------------------------------------------
+
+FORMATS = ["png", "webp", "raw"]
+DEFAULT_FORMAT = "png"
+
+# Scaled exports are box filtered: halving an @2x image then averages each 2x2 block
+# of pixels, as a 1x image should. (Older PILs only have ANTIALIAS.)
+SCALE_FILTER = getattr(PIL.Image, "BOX", PIL.Image.ANTIALIAS)
+
+RAW_MAGIC = b"BGRa"
+RAW_HEADER_FORMAT = "<4sLL"
+
+def is_format_available(image_format):
+    """raw is always available; png and webp depend on how PIL was built."""
+    if image_format == "raw":
+        return True
+    PIL.Image.init()
+    return image_format.upper() in PIL.Image.SAVE
+
+def export_name(name, image_format):
+    """The file name to export an image called name (always a .png name) to."""
+    if image_format == DEFAULT_FORMAT:
+        return name
+    return "%s.%s" % (os.path.splitext(name)[0], image_format)
+
+def scaled_export_name(name, image_format, pixels_per_point):
+    """Like export_name, but following the @2x convention: an image with two pixels per
+    point is name@2x.png, and one with a single pixel per point keeps its name."""
+    file_name = export_name(name, image_format)
+    if pixels_per_point == 1:
+        return file_name
+    root, extension = os.path.splitext(file_name)
+    return "%s@%gx%s" % (root, pixels_per_point, extension)
+
+def save_options(image_format, compress_level):
+    """PIL save() options for a compress level from 0 (fastest) to 9 (smallest), or None for PIL's default."""
+    if image_format == "webp":
+        options = {"lossless": True, "exact": True}
+        if compress_level is not None:
+            options["method"] = (compress_level * 6) // 9
+        return options
+    if compress_level is not None:
+        return {"compress_level": compress_level}
+    return {}
+
+def _write_encoded(f, stats, width, height, image_format, compress_level, pil_image = None, raw_bytes = None):
+    """Encode pil_image (or, for raw, raw_bytes) in the given format and write it to f."""
+    if image_format == "raw":
+        encoded = struct.pack(RAW_HEADER_FORMAT, RAW_MAGIC, width, height) + raw_bytes
+    else:
+        if stats is None:
+            pil_image.save(f, image_format, **save_options(image_format, compress_level))
+            return
+        # Encode in memory first, to tell encoding and writing apart.
+        start = stats.start()
+        buffer = BytesIO()
+        pil_image.save(buffer, image_format, **save_options(image_format, compress_level))
+        encoded = buffer.getvalue()
+        stats.record("encode", start, pixels = width * height)
+
+    if stats is not None:
+        start = stats.start()
+    f.write(encoded)
+    if stats is not None:
+        stats.record("write file", start, bytes_written = len(encoded))
+
+def write_image(artwork_binary, width, height, offset, f, image_format = DEFAULT_FORMAT, compress_level = None, compact = False):
+    """Write one image from artwork_binary to the file object f in the given format. With
+    compact, images are saved in the smallest PIL mode that holds them exactly (see
+    ArtworkBinaryFile.compact_pil_image_from_bgra) rather than always as RGBA.
+    If artwork_binary has stats, encoding and writing are timed too."""
+    if image_format == "raw":
+        _write_encoded(f, artwork_binary.stats, width, height, image_format, compress_level, raw_bytes = artwork_binary.get_raw_bytes(width, height, offset))
+    else:
+        _write_encoded(f, artwork_binary.stats, width, height, image_format, compress_level, pil_image = artwork_binary.get_pil_image(width, height, offset, compact))
+
+def write_scaled_images(artwork_binary, width, height, offset, scaled_files, image_format = DEFAULT_FORMAT, compress_level = None, compact = False):
+    """Write one image from artwork_binary at several scales; scaled_files is a list of
+    (scale, f). The pixels are read once, and each scale is resampled from them in
+    premultiplied space before being un-premultiplied and encoded (as for write_image.)"""
+    stats = artwork_binary.stats
+    if stats is not None:
+        start = stats.start()
+    bgra = artwork_binary.get_bgra_view(width, height, offset)
+    if stats is not None:
+        bgra = numpy.ascontiguousarray(bgra)
+        stats.record("read pixels", start, bytes_read = bgra.nbytes)
+
+    for scale, f in scaled_files:
+        scaled_bgra = bgra
+        if scale != 1:
+            if stats is not None:
+                start = stats.start()
+            scaled_bgra = ArtworkBinaryFile.scale_bgra(bgra, scale, SCALE_FILTER)
+            if stats is not None:
+                stats.record("scale", start, pixels = scaled_bgra.shape[0] * scaled_bgra.shape[1])
+        scaled_height, scaled_width = scaled_bgra.shape[0:2]
+
+        if image_format == "raw":
+            _write_encoded(f, stats, scaled_width, scaled_height, image_format, compress_level, raw_bytes = numpy.ascontiguousarray(scaled_bgra).tostring())
+            continue
+        if stats is not None:
+            start = stats.start()
+        if compact:
+            pil_image = ArtworkBinaryFile.compact_pil_image_from_bgra(scaled_bgra)
+        else:
+            pil_image = ArtworkBinaryFile.pil_image_from_bgra(scaled_bgra)
+        if stats is not None:
+            stats.record("unpremultiply", start, pixels = scaled_width * scaled_height)
+        _write_encoded(f, stats, scaled_width, scaled_height, image_format, compress_level, pil_image = pil_image)
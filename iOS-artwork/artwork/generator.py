@@ -0,0 +1,76 @@
+#-------------------------------------------------------------------------------
+#
+# iOS .artwork file extractor
+# (c)2008-2011 Dave Peck <code [at] davepeck [dot] org> All Rights Reserved
+#
+# Released under the three-clause BSD license.
+#
+# http://github.com/davepeck/iphone-tidbits/
+#
+#-------------------------------------------------------------------------------
+
+import os
+import json
+from timeit import default_timer
+
+from .uikit_file import UIKitBinaryFile
+
+#-------------------------------------------------------------------------------
+# Generating supported_artwork_files JSON from UIKit binaries
+#-------------------------------------------------------------------------------
+
+def artwork_set_jsonable(artwork_set, uikit_directory_name, version_string):
+    """Describe a single artwork set found in the mach-o binary. The .artwork file must
+    sit next to the binary, for its size."""
+    names, sizes = artwork_set.read_artworks()
+    images_jsonable = zip(names, sizes['width'].tolist(), sizes['height'].tolist(), sizes['offset'].tolist())
+
+    artwork_set_file_name = os.path.join(uikit_directory_name, "%s.artwork" % artwork_set.name)
+    artwork_set_file_size = os.path.getsize(artwork_set_file_name)
+
+    return {
+        "name": os.path.basename(artwork_set_file_name),
+        "version": version_string,
+        "byte_size": artwork_set_file_size,
+        "images": images_jsonable,
+    }
+
+def write_artwork_set_json(output_directory_name, jsonable):
+    """Write one supported_artwork_files JSON file, returning its name. Binaries processed
+    at the same time may describe the same file, so it is written atomically."""
+    images_file_name = os.path.join(output_directory_name, "%s-%d.json" % (jsonable["name"], jsonable["byte_size"]))
+    temporary_file_name = "%s.%d.tmp" % (images_file_name, os.getpid())
+    images_file = open(temporary_file_name, "w")
+    images_file.write(json.dumps(jsonable, indent = 4))
+    images_file.close()
+    os.rename(temporary_file_name, images_file_name)
+    return images_file_name
+
+def generate_from_binary(task):
+    """Write the JSON files for every shared artwork set of one UIKit binary. The task is
+    (uikit_file_name, version_string, arch, output_directory_name); returns (uikit_file_name,
+    version_string, written, timings, error) where written lists (json_file_name, image_count)
+    and timings is a list of (stage, seconds). error is None on success."""
+    uikit_file_name, version_string, arch, output_directory_name = task
+    timings = []
+    written = []
+    try:
+        start = default_timer()
+        uikit = UIKitBinaryFile(uikit_file_name, arch)
+        uikit.default_header
+        timings.append(("headers", default_timer() - start))
+
+        start = default_timer()
+        uikit.symbol_index
+        timings.append(("symbols", default_timer() - start))
+
+        start = default_timer()
+        uikit_directory_name = os.path.dirname(uikit_file_name)
+        artwork_sets = list(uikit.iter_shared_iphone_image_sets()) + list(uikit.iter_shared_ipad_image_sets())
+        for artwork_set in artwork_sets:
+            jsonable = artwork_set_jsonable(artwork_set, uikit_directory_name, version_string)
+            written.append((write_artwork_set_json(output_directory_name, jsonable), len(jsonable["images"])))
+        timings.append(("artwork sets", default_timer() - start))
+    except Exception as e:
+        return (uikit_file_name, version_string, written, timings, "%s" % e)
+    return (uikit_file_name, version_string, written, timings, None)
@@ -0,0 +1,566 @@
+#-------------------------------------------------------------------------------
+#
+# iOS .artwork file extractor
+# (c)2008-2011 Dave Peck <code [at] davepeck [dot] org> All Rights Reserved
+#
+# Released under the three-clause BSD license.
+#
+# http://github.com/davepeck/iphone-tidbits/
+#
+#-------------------------------------------------------------------------------
+
+import os
+import json
+import math
+
+import numpy
+
+from .artwork_file import ArtworkBinaryFile
+from .catalog import ArtworkSetInfo
+
+#-------------------------------------------------------------------------------
+# Guessing the layout of an artwork file that no catalog describes
+#
+# In every known artwork file, each image starts on a page boundary, its rows are
+# padded as ArtworkBinaryFile._align() says, and the rest of its last page is
+# zero. The images come one after the other, and the file ends where the last
+# image ends. A new version of a file mostly holds the images of an older one,
+# with a few added, removed or resized. So we line the images of the closest
+# known catalog up, in file order, with the pages of the file, keeping each
+# image where its pixels look right. Most images are simply where the reference
+# says, perhaps moved by a whole number of pages, so those are pinned first; only
+# the rest are searched for. The result is only a proposal: images of the same
+# size that follow each other can't always be told apart (they are reported as
+# unresolved), and new or resized images are left as unknown blocks.
+#-------------------------------------------------------------------------------
+
+MAX_PAGE_SIZE = 16384
+
+def closest_set_info(catalog, basename, byte_size):
+    """The catalog entry for basename whose size is closest to byte_size, or None."""
+    keys = [key for key in catalog.keys() if key[0] == basename]
+    if len(keys) == 0:
+        return None
+    return catalog.get_set_info(*min(keys, key = lambda key: abs(key[1] - byte_size)))
+
+def image_byte_size(width, height):
+    """The bytes an image spans, row padding included."""
+    return 4 * height * ArtworkBinaryFile._align(width)
+
+def page_size_of(groups):
+    """The largest power of two (up to MAX_PAGE_SIZE) that every group starts at a multiple of."""
+    page_size = MAX_PAGE_SIZE
+    while page_size > 4 and any(group.offset % page_size for group in groups):
+        page_size //= 2
+    return page_size
+
+class _Group(object):
+    """The images of a reference catalog that start in the same place, and the bytes up to
+    the next such place (the slot.) Some offsets have their low bits set, perhaps as flags;
+    those are kept as the distance from the group's offset. An image that is special in
+    this way, or bigger than its slot, can't be checked pixel by pixel: only its slot is.
+    A group that shares bytes with an earlier image is checked, but may fail the check
+    where the other image's pixels won."""
+
+    def __init__(self, offset, image_infos, slot_byte_size, is_shared = False):
+        super(_Group, self).__init__()
+        self.offset = offset
+        self.image_infos = image_infos
+        self.slot_byte_size = slot_byte_size
+        primary = image_infos[0]
+        self.width = primary.width
+        self.height = primary.height
+        self.is_special = (primary.offset != offset) or (image_byte_size(primary.width, primary.height) > slot_byte_size)
+        self.is_shared = is_shared
+
+    @property
+    def kind(self):
+        """Groups of the same kind fit the same places."""
+        if self.is_special:
+            return (True, self.slot_byte_size)
+        return (False, self.width, self.height)
+
+def reference_groups(set_info):
+    """Group the images of set_info by where they start, in file order."""
+    by_offset = {}
+    for image_info in set_info.iter_images():
+        by_offset.setdefault(image_info.offset - (image_info.offset % 4), []).append(image_info)
+    offsets = sorted(by_offset)
+    groups = []
+    shared_until = 0
+    for offset, next_offset in zip(offsets, offsets[1:] + [set_info.byte_size]):
+        image_infos = sorted(by_offset[offset], key = lambda image_info: image_info.offset)
+        groups.append(_Group(offset, image_infos, next_offset - offset, offset < shared_until))
+        for image_info in image_infos:
+            # The last row needs no padding.
+            end = image_info.offset + 4 * ((image_info.height - 1) * ArtworkBinaryFile._align(image_info.width) + image_info.width)
+            shared_until = max(shared_until, end)
+    return groups
+
+
+class InferredLayout(object):
+    """The outcome of infer_layout(): the proposed ArtworkSetInfo, the names of the reference
+    images that weren't found, the (offset, length) of the blocks no image explains, and the
+    unresolved (names, offsets): images of the same size that are at those offsets, but
+    not necessarily all of them, nor in that order."""
+
+    def __init__(self, set_info, reference_set_info, missing, unknown_blocks, unresolved):
+        super(InferredLayout, self).__init__()
+        self.set_info = set_info
+        self.reference_set_info = reference_set_info
+        self.missing = missing
+        self.unknown_blocks = unknown_blocks
+        self.unresolved = unresolved
+
+    @property
+    def is_complete(self):
+        """Does every byte of the file belong to a placed image (or its page padding)?"""
+        return (len(self.unknown_blocks) == 0) and (len(self.unresolved) == 0)
+
+    def jsonable(self):
+        set_info = self.set_info
+        return {
+            "name": set_info.name,
+            "version": set_info.version,
+            "byte_size": set_info.byte_size,
+            "images": zip(set_info.names, set_info.widths.tolist(), set_info.heights.tolist(), set_info.offsets.tolist()),
+        }
+
+    def save_json(self, directory):
+        """Write the proposed catalog, named like the files in supported_artwork_files, and return its name."""
+        file_name = os.path.join(directory, "%s-%d.json" % (self.set_info.name, self.set_info.byte_size))
+        f = open(file_name, "w")
+        f.write(json.dumps(self.jsonable(), indent = 4))
+        f.close()
+        return file_name
+
+
+class _PageChecker(object):
+    """Answers "could this group of images start at this page?" From a count of invalid
+    pixels per page and of the zero bytes at the end of each page, both made in one pass
+    over the file, it works out every page each size of image could start at. Only row
+    padding is left to check one placement at a time."""
+
+    def __init__(self, artwork_binary, page_size):
+        super(_PageChecker, self).__init__()
+        self.artwork_binary = artwork_binary
+        self.page_size = page_size
+        self.byte_size = artwork_binary.data_length
+        self.page_count = (self.byte_size + page_size - 1) // page_size
+
+        padded = numpy.zeros(self.page_count * page_size, dtype=numpy.uint8)
+        padded[0:self.byte_size] = numpy.frombuffer(artwork_binary.data, dtype=numpy.uint8, count=self.byte_size)
+
+        # A premultiplied pixel never has a color greater than its alpha.
+        bgra = padded.reshape(-1, 4)
+        alpha = bgra[:, 3]
+        invalid = (bgra[:, 0] > alpha) | (bgra[:, 1] > alpha) | (bgra[:, 2] > alpha)
+        invalid_per_page = invalid.reshape(self.page_count, page_size // 4).sum(axis=1)
+        self.invalid_before_page = numpy.concatenate(([0], numpy.cumsum(invalid_per_page)))
+
+        nonzero = padded.reshape(self.page_count, page_size)[:, ::-1] != 0
+        self.zeros_ending_page = numpy.where(nonzero.any(axis=1), nonzero.argmax(axis=1), page_size)
+
+        self.blank_pages = (self.zeros_ending_page == page_size)
+        self.nonblank_count = max(1, self.page_count - int(self.blank_pages.sum()))
+
+        self._starts = {}
+        self._evidence = {}
+        self._padding = {}
+
+    def pages_of(self, byte_size):
+        return (byte_size + self.page_size - 1) // self.page_size
+
+    def group_pages(self, group):
+        if group.is_special:
+            return self.pages_of(group.slot_byte_size)
+        return self.pages_of(image_byte_size(group.width, group.height))
+
+    def is_telling(self, group):
+        """Does the group have zeros (at the end of its last page, or of its rows) that
+        tell a right place from a wrong one? Otherwise it fits wherever pixels are valid."""
+        if group.is_special:
+            return False
+        byte_size = image_byte_size(group.width, group.height)
+        return (byte_size % self.page_size != 0) or (ArtworkBinaryFile._align(group.width) != group.width)
+
+    def starts(self, group):
+        """A boolean array of the pages the group could start at, ignoring row padding."""
+        if group.is_special:
+            key = (True, group.slot_byte_size)
+        else:
+            key = (False, image_byte_size(group.width, group.height))
+        if key not in self._starts:
+            is_special, byte_size = key
+            page_count = self.pages_of(byte_size)
+            count = self.page_count - page_count + 1
+            if not is_special:
+                count = min(count, (self.byte_size - byte_size) // self.page_size + 1)
+            starts = numpy.zeros(self.page_count + 1, dtype=bool)
+            if (count > 0) and is_special:
+                # Their pixels needn't start on a pixel boundary, so they can't be checked at all.
+                starts[0:count] = True
+            elif count > 0:
+                ibp = self.invalid_before_page
+                starts[0:count] = (ibp[page_count:page_count + count] == ibp[0:count])
+                tail = page_count * self.page_size - byte_size
+                starts[0:count] &= (self.zeros_ending_page[page_count - 1:page_count - 1 + count] >= tail)
+            self._starts[key] = (starts, numpy.flatnonzero(starts))
+        return self._starts[key]
+
+    def evidence(self, group):
+        """How much fitting somewhere says about a group: minus the log of the share of
+        the pages with something on them that it could start at."""
+        key = group.kind
+        if key not in self._evidence:
+            pages = self.starts(group)[1]
+            pages = pages[pages < self.page_count]
+            fits = max(1, int((~self.blank_pages[pages]).sum()))
+            self._evidence[key] = -math.log(min(1.0, float(fits) / self.nonblank_count))
+        return self._evidence[key]
+
+    def has_zero_padding(self, group, page):
+        aligned_width = ArtworkBinaryFile._align(group.width)
+        if group.is_special or (aligned_width == group.width):
+            return True
+        key = (group.width, group.height, page)
+        if key not in self._padding:
+            rows = numpy.frombuffer(self.artwork_binary.data, dtype=numpy.uint8, count=image_byte_size(group.width, group.height), offset=page * self.page_size)
+            self._padding[key] = not rows.reshape(group.height, aligned_width * 4)[:, group.width * 4:].any()
+        return self._padding[key]
+
+    def is_blank(self, page):
+        return self.blank_pages[page]
+
+    def fits_at(self, group, pages):
+        """fits() for an array of pages, any of which may be out of range."""
+        starts = self.starts(group)[0]
+        in_range = (pages >= 0) & (pages < self.page_count)
+        result = numpy.zeros(len(pages), dtype=bool)
+        result[in_range] = starts[pages[in_range]]
+        for index in numpy.flatnonzero(result).tolist():
+            result[index] = self.has_zero_padding(group, int(pages[index]))
+        return result
+
+    def fits(self, group, page):
+        """Could the group start at page? Its pages must hold only validly premultiplied
+        pixels, its row padding and the rest of its last page must be zero, and it must
+        end inside the file."""
+        return bool(self.starts(group)[0][page]) and self.has_zero_padding(group, page)
+
+    def next_fit(self, group, page):
+        """The first page from page on that the group could start at, or None."""
+        pages = self.starts(group)[1]
+        for candidate in pages[numpy.searchsorted(pages, page):].tolist():
+            if self.has_zero_padding(group, candidate):
+                return candidate
+        return None
+
+
+#-------------------------------------------------------------------------------
+# Pinning the images that haven't moved
+#
+# Between two versions of a file most images stay put, or move along with everything
+# after an image that was added, removed or resized: by the same whole number of pages.
+# The shifts that runs of telling images agree on are tried, and the best sequence of
+# them is found. A run of images is pinned at its shift only if together they say
+# enough, and sliding them a page or two doesn't fit them as well. Images that check
+# out anywhere (blank pages, special images) are only pinned between telling
+# neighbours that agree on their shift.
+#-------------------------------------------------------------------------------
+
+SHIFT_VOTE_RUN = 3       # Telling images in a row that must fit at a shift for it to be tried.
+MAX_SHIFTS = 128         # The most shifts tried.
+UNPINNED_COST = 3.0      # An image left for the alignment below.
+SHIFT_COST = 10.0        # Changing shift from one image to the next.
+OVERWRITTEN_COST = 0.7   # An image that shares bytes, pinned where it doesn't fit.
+SLIDE_PAGES = 3          # How far a run of pinned images is slid, to see if it fits as well there.
+MIN_RUN_EVIDENCE = 30.0  # What a run of pinned images must say in all.
+
+def _candidate_shifts(checker, groups, reference_pages, reference_byte_size):
+    """The shifts, in pages, worth trying: none, the change in file size, and those that
+    runs of telling groups could all be at, most votes first."""
+    origin = max(reference_pages) + 1
+    runs = [[]]
+    for group, reference_page in zip(groups, reference_pages):
+        if not checker.is_telling(group):
+            continue
+        pages = checker.starts(group)[1]
+        pages = pages[~checker.blank_pages[numpy.minimum(pages, checker.page_count - 1)]]
+        runs[-1].append(pages - reference_page + origin)
+        if len(runs[-1]) == SHIFT_VOTE_RUN:
+            runs.append(runs[-1][1:])
+    shift_indices = [reduce(numpy.intersect1d, run) for run in runs if len(run) == SHIFT_VOTE_RUN]
+    shifts = [0]
+    size_shift = (checker.byte_size - reference_byte_size) // checker.page_size
+    if size_shift != 0:
+        shifts.append(size_shift)
+    if len(shift_indices) > 0:
+        votes = numpy.bincount(numpy.concatenate(shift_indices))
+        for shift_index in numpy.argsort(-votes, kind='mergesort').tolist():
+            if (len(shifts) >= MAX_SHIFTS) or (votes[shift_index] == 0):
+                break
+            if (shift_index - origin) not in shifts:
+                shifts.append(shift_index - origin)
+    return shifts
+
+def _fit_evidence(checker, group, page):
+    """What the group fitting at page says, or 0 if it doesn't fit there."""
+    if (page < 0) or (page >= checker.page_count) or checker.is_blank(page) or not checker.is_telling(group):
+        return 0.0
+    return checker.evidence(group) if checker.fits(group, page) else 0.0
+
+def _run_evidence(checker, groups, reference_pages, run, shift):
+    """What the groups with the given indices, fitting where shift puts them, say together."""
+    return sum(_fit_evidence(checker, groups[index], reference_pages[index] + shift) for index in run)
+
+def _pin_groups(checker, groups, reference_pages, reference_byte_size):
+    """Return, for each group, the page it is pinned at, or None."""
+    shifts = _candidate_shifts(checker, groups, reference_pages, reference_byte_size)
+    pages = numpy.array(reference_pages)[:, numpy.newaxis] + numpy.array(shifts)[numpy.newaxis, :]
+    fits = numpy.array([checker.fits_at(group, pages[index]) for index, group in enumerate(groups)])
+    # Telling images say something where they fit, unless it's on a blank page, where any of them would.
+    evidence = numpy.array([checker.evidence(group) if checker.is_telling(group) else 0.0 for group in groups])
+    evidence = numpy.where(fits & ~checker.blank_pages[numpy.clip(pages, 0, checker.page_count - 1)], evidence[:, numpy.newaxis], 0.0)
+    # Images that share bytes may have been overwritten, so they may be pinned where they don't fit.
+    for index, group in enumerate(groups):
+        if group.is_shared:
+            overwritten = ~fits[index] & (pages[index] >= 0) & (pages[index] < checker.page_count)
+            fits[index] |= overwritten
+            evidence[index, overwritten] = -OVERWRITTEN_COST
+
+    # The best run of shifts, the way one finds the likeliest states of a hidden Markov
+    # model. States 0..n-1 are pinned at shifts[state], states n..2n-1 are unpinned,
+    # having last been pinned at shifts[state - n]. A change of shift must leave the
+    # group after the last pinned one, so each state also keeps the page that one ends at.
+    shift_count = len(shifts)
+    state_shifts = numpy.concatenate([shifts, shifts])
+    unpinned_states = numpy.arange(shift_count) + shift_count
+    scores = numpy.zeros(2 * shift_count)
+    end_pages = numpy.zeros(2 * shift_count, dtype=numpy.int64)
+    back = []
+    for index, group in enumerate(groups):
+        shift_cost = SHIFT_COST if index > 0 else 0.0
+        into = scores[:, numpy.newaxis] - numpy.where(state_shifts[:, numpy.newaxis] != numpy.array(shifts)[numpy.newaxis, :], shift_cost, 0.0)
+        into[end_pages[:, numpy.newaxis] > pages[index][numpy.newaxis, :]] = -numpy.inf
+        pinned_from = numpy.argmax(into, axis=0)
+        pinned_scores = numpy.where(fits[index], into[pinned_from, numpy.arange(shift_count)] + evidence[index], -numpy.inf)
+        unpinned_from = numpy.where(scores[0:shift_count] >= scores[shift_count:], numpy.arange(shift_count), unpinned_states)
+        back.append(numpy.concatenate([pinned_from, unpinned_from]))
+        scores = numpy.concatenate([pinned_scores, scores[unpinned_from] - UNPINNED_COST])
+        end_pages = numpy.concatenate([pages[index] + checker.group_pages(group), end_pages[unpinned_from]])
+
+    state = int(numpy.argmax(scores))
+    pinned_shifts = [None] * len(groups)
+    has_evidence = [False] * len(groups)
+    for index in range(len(groups) - 1, -1, -1):
+        if state < shift_count:
+            pinned_shifts[index] = shifts[state]
+            has_evidence[index] = evidence[index, state] > 0
+        state = int(back[index][state])
+
+    # A run of small images often fits just as well a page or two along: then which
+    # image is where is anyone's guess, and the run is left to the alignment.
+    index = 0
+    while index < len(groups):
+        if pinned_shifts[index] is None:
+            index += 1
+            continue
+        shift = pinned_shifts[index]
+        end = index
+        while (end < len(groups)) and (pinned_shifts[end] in (shift, None)):
+            end += 1
+        run = [run_index for run_index in range(index, end) if pinned_shifts[run_index] is not None]
+        run_evidence = _run_evidence(checker, groups, reference_pages, run, shift)
+        slides = [slide for slide in range(-SLIDE_PAGES, SLIDE_PAGES + 1) if slide != 0]
+        if (run_evidence < MIN_RUN_EVIDENCE) or any(_run_evidence(checker, groups, reference_pages, run, shift + slide) >= run_evidence for slide in slides):
+            for run_index in run:
+                pinned_shifts[run_index] = None
+                has_evidence[run_index] = False
+        index = end
+
+    # Images pinned without evidence of their own need telling neighbours that agree.
+    index = 0
+    while index < len(groups):
+        if (pinned_shifts[index] is None) or has_evidence[index]:
+            index += 1
+            continue
+        end = index
+        while (end < len(groups)) and (pinned_shifts[end] is not None) and not has_evidence[end]:
+            end += 1
+        neighbours = set()
+        if (index > 0) and has_evidence[index - 1]:
+            neighbours.add(pinned_shifts[index - 1])
+        if (end < len(groups)) and has_evidence[end]:
+            neighbours.add(pinned_shifts[end])
+        if neighbours != set([pinned_shifts[index]]) or len(set(pinned_shifts[index:end])) != 1:
+            for unpinned in range(index, end):
+                pinned_shifts[unpinned] = None
+        index = end
+
+    # Pinned groups can't overlap.
+    pinned_pages = [None] * len(groups)
+    end_page = 0
+    for index, shift in enumerate(pinned_shifts):
+        if shift is None:
+            continue
+        page = reference_pages[index] + shift
+        if page >= end_page:
+            pinned_pages[index] = page
+            end_page = page + checker.group_pages(groups[index])
+    return pinned_pages
+
+
+#-------------------------------------------------------------------------------
+# Lining the file's pages up with the reference's images
+#
+# Between two pinned images, one image fitting somewhere says little: only the zeros at
+# the ends of images and rows tell a right place from a wrong one. So rather than place
+# images one at a time, we look for the best alignment of the sequence of reference
+# images with the pages between, the way one aligns two strings: every image placed
+# scores a point (less for images that would fit anywhere, and nothing on a blank page,
+# where any image fits), and every image left out, or run of pages skipped, costs some.
+# A beam of the best partial alignments keeps this quick.
+#-------------------------------------------------------------------------------
+
+TELLING_SCORE = 1.0    # An image placed where its zeros are.
+UNTELLING_SCORE = 0.25 # An image placed where it could be anyway.
+MISSING_COST = 0.3     # An image of the reference that is left out.
+UNKNOWN_COST = 1.0     # A run of pages that no image of the reference explains.
+BEAM_WIDTH = 32        # How many partial alignments are kept.
+
+def _align_groups(checker, groups, indices, start_page, end_page):
+    """Return [(group_index, page)] of the best alignment found of the groups with the
+    given indices to the pages from start_page up to end_page."""
+    beam = {start_page: (0.0, None)}
+    for index in indices:
+        group = groups[index]
+        group_score = TELLING_SCORE if checker.is_telling(group) else UNTELLING_SCORE
+        group_pages = checker.group_pages(group)
+        candidates = {}
+
+        def score(page):
+            return 0.0 if checker.is_blank(page) else group_score
+
+        def consider(page, candidate_score, chain):
+            if (page not in candidates) or (candidates[page][0] < candidate_score):
+                candidates[page] = (candidate_score, chain)
+
+        for page, (beam_score, chain) in beam.iteritems():
+            if (page + group_pages <= end_page) and checker.fits(group, page):
+                consider(page + group_pages, beam_score + score(page), (chain, index, page))
+            consider(page, beam_score - MISSING_COST, chain)
+            later_page = checker.next_fit(group, page + 1)
+            if (later_page is not None) and (later_page + group_pages <= end_page):
+                consider(later_page + group_pages, beam_score + score(later_page) - UNKNOWN_COST, (chain, index, later_page))
+
+        best = sorted(candidates.iteritems(), key = lambda (page, (candidate_score, chain)): (-candidate_score, page))
+        beam = dict(best[0:BEAM_WIDTH])
+
+    # Pages left over at the end are one more unknown run.
+    def final_score(item):
+        page, (beam_score, chain) = item
+        return beam_score - (UNKNOWN_COST if page < end_page else 0.0)
+    page, (beam_score, chain) = max(beam.iteritems(), key = final_score)
+
+    placements = []
+    while chain is not None:
+        chain, index, page = chain
+        placements.append((index, page))
+    placements.reverse()
+    return placements
+
+def _unresolved_runs(checker, groups, placements, pinned_shifts):
+    """Split the placements into those that stand and runs of groups of one kind that were
+    placed only in part, with gaps, or (where pinned) at more than one shift: which group
+    went where is a guess. pinned_shifts maps the index of each pinned group to its shift."""
+    pages = dict(placements)
+    standing = []
+    unresolved = []
+    start = 0
+    while start < len(groups):
+        end = start + 1
+        while (end < len(groups)) and (groups[end].kind == groups[start].kind):
+            end += 1
+        run = range(start, end)
+        run_pages = [pages[index] for index in run if index in pages]
+        contiguous = all(page + checker.group_pages(groups[start]) == next_page for page, next_page in zip(run_pages, run_pages[1:]))
+        shifts = set(pinned_shifts[index] for index in run if index in pinned_shifts)
+        if (len(run) > 1) and (len(run_pages) > 0) and ((len(run_pages) < len(run)) or not contiguous or (len(shifts) > 1)):
+            unresolved.append((run, run_pages))
+        else:
+            standing.extend((index, pages[index]) for index in run if index in pages)
+        start = end
+    return standing, unresolved
+
+def infer_layout(artwork_binary, reference_set_info, version = None):
+    """Guess where the images of reference_set_info are in artwork_binary's file, which
+    has the same basename. Images that are where the reference has them, give or take a
+    whole number of pages, are pinned there; the others are lined up with the pages in
+    between. Images that don't fit in with their neighbours are left out, runs of images
+    of the same size that can't be told apart are unresolved, and the pages that no
+    image explains are reported as unknown blocks."""
+    groups = reference_groups(reference_set_info)
+    page_size = page_size_of(groups)
+    checker = _PageChecker(artwork_binary, page_size)
+    reference_pages = [group.offset // page_size for group in groups]
+    pinned_pages = _pin_groups(checker, groups, reference_pages, reference_set_info.byte_size)
+
+    placements = []
+    free = []
+    start_page = 0
+    for index, page in enumerate(pinned_pages + [checker.page_count]):
+        if (page is None) and (index < len(groups)):
+            free.append(index)
+            continue
+        if len(free) > 0:
+            placements.extend(_align_groups(checker, groups, free, start_page, page))
+            free = []
+        if index < len(groups):
+            placements.append((index, page))
+            start_page = page + checker.group_pages(groups[index])
+
+    # Runs of one kind are checked as a whole, pinned groups and all: a run pinned at
+    # one shift where the reference had one more group is as ambiguous as any other.
+    pinned_shifts = dict((index, page - reference_pages[index]) for index, page in enumerate(pinned_pages) if page is not None)
+    placements, unresolved_runs = _unresolved_runs(checker, groups, placements, pinned_shifts)
+
+    placed = {}
+    for index, start_page in placements:
+        group = groups[index]
+        for image_info in group.image_infos:
+            placed[image_info.name] = (image_info.width, image_info.height, (start_page * page_size) + (image_info.offset - group.offset))
+
+    # The pages of unresolved images aren't unknown.
+    occupied = [(start_page, checker.group_pages(groups[index])) for index, start_page in placements]
+    unresolved = []
+    unresolved_names = set()
+    for run, run_pages in unresolved_runs:
+        occupied.extend((start_page, checker.group_pages(groups[run[0]])) for start_page in run_pages)
+        names = [image_info.name for index in run for image_info in groups[index].image_infos]
+        unresolved.append((names, [start_page * page_size for start_page in run_pages]))
+        unresolved_names.update(names)
+
+    unknown_blocks = []
+    page = 0
+    for start_page, pages in sorted(occupied):
+        if start_page > page:
+            unknown_blocks.append((page * page_size, (start_page - page) * page_size))
+        page = max(page, start_page + pages)
+
+    # Whatever is left at the end is unexplained; the last image's own padding isn't.
+    if page * page_size < checker.byte_size:
+        unknown_blocks.append((page * page_size, checker.byte_size - (page * page_size)))
+
+    # Keep the reference catalog's order.
+    names = [name for name in reference_set_info.names if name in placed]
+    missing = [name for name in reference_set_info.names if (name not in placed) and (name not in unresolved_names)]
+    set_info = ArtworkSetInfo(
+        reference_set_info.name,
+        version if version is not None else reference_set_info.version,
+        checker.byte_size,
+        names,
+        numpy.array([placed[name][0] for name in names], dtype=numpy.uint16),
+        numpy.array([placed[name][1] for name in names], dtype=numpy.uint16),
+        numpy.array([placed[name][2] for name in names], dtype=numpy.uint32))
+    return InferredLayout(set_info, reference_set_info, missing, unknown_blocks, unresolved)
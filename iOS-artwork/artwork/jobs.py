@@ -0,0 +1,292 @@
+#-------------------------------------------------------------------------------
+#
+# iOS .artwork file extractor
+# (c)2008-2011 Dave Peck <code [at] davepeck [dot] org> All Rights Reserved
+# 
+# Released under the three-clause BSD license.
+#
+# http://github.com/davepeck/iphone-tidbits/
+#
+#-------------------------------------------------------------------------------
+
+import os
+import signal
+import collections
+import multiprocessing
+from io import BytesIO
+
+import PIL.Image
+
+from .artwork_file import ArtworkBinaryFile, WritableArtworkBinaryFile
+from .formats import DEFAULT_FORMAT, write_image, write_scaled_images
+from .stats import Stats
+
+#-------------------------------------------------------------------------------
+# Running tasks, either in-process or across a pool of worker processes
+#-------------------------------------------------------------------------------
+
+WINDOW_PER_JOB = 2
+
+def run_jobs(worker, tasks, jobs = 1, initializer = None, initargs = ()):
+    """Apply worker to every task, yielding the results in task order.
+    With jobs > 1 the tasks are shared across a pool of that many processes;
+    each process runs initializer(*initargs) once before its first task.
+
+    At most WINDOW_PER_JOB * jobs tasks are in flight at once: a new task is only
+    handed out once the oldest result has been yielded. So a slow image, or a slow
+    consumer of the results, holds the workers back instead of letting finished
+    results (which may be whole encoded images) pile up in memory."""
+    if jobs <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        for task in tasks:
+            yield worker(task)
+    else:
+        pool = multiprocessing.Pool(jobs, initializer, initargs)
+        try:
+            in_flight = collections.deque()
+            for task in tasks:
+                if len(in_flight) == WINDOW_PER_JOB * jobs:
+                    yield in_flight.popleft().get()
+                in_flight.append(pool.apply_async(worker, (task,)))
+            while in_flight:
+                yield in_flight.popleft().get()
+            pool.close()
+        except:
+            pool.terminate()
+            raise
+        finally:
+            pool.join()
+
+
+def end_image_stats(stats):
+    """The records of the image a worker just handled, to send back with its result, or None."""
+    if stats is None:
+        return None
+    return stats.end_image()
+
+
+#-------------------------------------------------------------------------------
+# Export workers
+#-------------------------------------------------------------------------------
+
+# Each worker process maps the artwork file itself, so only small task tuples
+# (and never pixel data) travel between processes.
+_export_artwork_binary = None
+_export_format = DEFAULT_FORMAT
+_export_compress_level = None
+_export_compact = False
+
+def init_export_worker(artwork_file_name, image_format = DEFAULT_FORMAT, compress_level = None, collect_stats = False, compact = False):
+    global _export_artwork_binary, _export_format, _export_compress_level, _export_compact
+    _export_artwork_binary = ArtworkBinaryFile(artwork_file_name)
+    _export_format = image_format
+    _export_compress_level = compress_level
+    _export_compact = compact
+    if collect_stats:
+        _export_artwork_binary.stats = Stats()
+
+def export_image(task):
+    """Decode one image and save it. The task is (name, width, height, offset, export_file_name);
+    returns (name, export_file_name, error, image_stats) where error is None on success and
+    image_stats is None unless the worker collects stats."""
+    name, width, height, offset, export_file_name = task
+    stats = _export_artwork_binary.stats
+    if stats is not None:
+        stats.begin_image(name, width * height)
+    error = None
+    try:
+        f = open(export_file_name, "wb")
+        try:
+            write_image(_export_artwork_binary, width, height, offset, f, _export_format, _export_compress_level, _export_compact)
+        finally:
+            f.close()
+    except Exception as e:
+        error = "%s" % e
+    return (name, export_file_name, error, end_image_stats(stats))
+
+def export_scaled_image(task):
+    """Decode one image once and save it at several scales. The task is (name, width, height,
+    offset, scaled_export_file_names), a list of (scale, export_file_name); returns (name,
+    export_file_names, error, image_stats) as for export_image."""
+    name, width, height, offset, scaled_export_file_names = task
+    stats = _export_artwork_binary.stats
+    if stats is not None:
+        stats.begin_image(name, width * height)
+    export_file_names = [export_file_name for scale, export_file_name in scaled_export_file_names]
+    error = None
+    try:
+        scaled_files = []
+        try:
+            for scale, export_file_name in scaled_export_file_names:
+                scaled_files.append((scale, open(export_file_name, "wb")))
+            write_scaled_images(_export_artwork_binary, width, height, offset, scaled_files, _export_format, _export_compress_level, _export_compact)
+        finally:
+            for scale, f in scaled_files:
+                f.close()
+    except Exception as e:
+        error = "%s" % e
+    return (name, export_file_names, error, end_image_stats(stats))
+
+def encode_image(task):
+    """Decode one image and encode it in memory. The task is (name, width, height, offset).
+    Returns (name, data, error, image_stats) where exactly one of data and error is None."""
+    name, width, height, offset = task
+    stats = _export_artwork_binary.stats
+    if stats is not None:
+        stats.begin_image(name, width * height)
+    try:
+        encoded = BytesIO()
+        write_image(_export_artwork_binary, width, height, offset, encoded, _export_format, _export_compress_level, _export_compact)
+    except Exception as e:
+        return (name, None, "%s" % e, end_image_stats(stats))
+    return (name, encoded.getvalue(), None, end_image_stats(stats))
+
+
+#-------------------------------------------------------------------------------
+# Workers that take images from any number of artwork files
+#-------------------------------------------------------------------------------
+
+# A pool may be handed images from many artwork files; each worker maps a
+# file the first time it needs it.
+_artwork_binaries = {}
+_batch_format = DEFAULT_FORMAT
+_batch_compress_level = None
+_batch_compact = False
+_batch_stats = None
+
+def get_artwork_binary(artwork_file_name):
+    artwork_binary = _artwork_binaries.get(artwork_file_name)
+    if artwork_binary is None:
+        artwork_binary = _artwork_binaries[artwork_file_name] = ArtworkBinaryFile(artwork_file_name)
+        artwork_binary.stats = _batch_stats
+    return artwork_binary
+
+def init_batch_export_worker(image_format = DEFAULT_FORMAT, compress_level = None, collect_stats = False, compact = False):
+    global _batch_format, _batch_compress_level, _batch_compact, _batch_stats
+    _batch_format = image_format
+    _batch_compress_level = compress_level
+    _batch_compact = compact
+    if collect_stats:
+        _batch_stats = Stats()
+
+def batch_export_image(task):
+    """Decode one image of any artwork file and save it. The task is (artwork_file_name, name,
+    width, height, offset, export_file_name); returns (artwork_file_name, name, export_file_name,
+    error, image_stats) as for export_image."""
+    artwork_file_name, name, width, height, offset, export_file_name = task
+    stats = _batch_stats
+    if stats is not None:
+        stats.begin_image(name, width * height)
+    error = None
+    try:
+        f = open(export_file_name, "wb")
+        try:
+            write_image(get_artwork_binary(artwork_file_name), width, height, offset, f, _batch_format, _batch_compress_level, _batch_compact)
+        finally:
+            f.close()
+    except Exception as e:
+        error = "%s" % e
+    return (artwork_file_name, name, export_file_name, error, end_image_stats(stats))
+
+def init_encode_worker():
+    # Leave Ctrl-C to the parent process, which shuts the pool down.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def encode_artwork_image(task):
+    """Decode one image and encode it in memory, for serving. The task is (artwork_file_name, width,
+    height, offset, image_format, compress_level); returns (data, error) where exactly one is None."""
+    artwork_file_name, width, height, offset, image_format, compress_level = task
+    try:
+        encoded = BytesIO()
+        write_image(get_artwork_binary(artwork_file_name), width, height, offset, encoded, image_format, compress_level)
+    except Exception as e:
+        return (None, "%s" % e)
+    return (encoded.getvalue(), None)
+
+
+#-------------------------------------------------------------------------------
+# Create workers
+#-------------------------------------------------------------------------------
+
+# The created file already exists (copied from its template) by the time the
+# workers start. Each worker maps it for writing. Most images have their own
+# bytes, but a few catalogs have images that share bytes with others (such as a
+# 1024x1024 image laid over a couple of hundred small ones.) Where two images
+# overlap, what ends up in the file depends on which is written last, so only
+# images that overlap no other may go to the pool; see split_overlapping().
+_create_binary = None
+
+def image_byte_span(image_info):
+    """The (start, end) of the bytes an image's pixels occupy, row padding between rows included."""
+    aligned_width = ArtworkBinaryFile._align(image_info.width)
+    return (image_info.offset, image_info.offset + 4 * (((image_info.height - 1) * aligned_width) + image_info.width))
+
+def split_overlapping(image_infos):
+    """Split image_infos into the images that share no bytes with any other, which may be
+    written in any order, and those that do, which must be written one after the other
+    in the given order. Both lists keep the given order."""
+    spans = sorted((image_byte_span(image_info), i) for i, image_info in enumerate(image_infos))
+    overlapping = set()
+    cluster = []
+    cluster_end = None
+    for (start, end), i in spans:
+        if (cluster_end is not None) and (start < cluster_end):
+            cluster.append(i)
+            cluster_end = max(cluster_end, end)
+            continue
+        if len(cluster) > 1:
+            overlapping.update(cluster)
+        cluster = [i]
+        cluster_end = end
+    if len(cluster) > 1:
+        overlapping.update(cluster)
+    independent = [image_info for i, image_info in enumerate(image_infos) if i not in overlapping]
+    return (independent, [image_info for i, image_info in enumerate(image_infos) if i in overlapping])
+
+def init_create_worker(create_file_name, collect_stats = False):
+    global _create_binary
+    _create_binary = WritableArtworkBinaryFile(create_file_name)
+    if collect_stats:
+        _create_binary.stats = Stats()
+
+def read_import_image(pil_image_name, width, height):
+    """Open and validate an image to import. Returns (pil_image, error) where exactly one is None."""
+    if not os.path.exists(pil_image_name):
+        return (None, "An image named %s was not found in directory %s" % (os.path.basename(pil_image_name), os.path.dirname(pil_image_name)))
+
+    try:
+        pil_image = PIL.Image.open(pil_image_name)
+    except IOError:
+        return (None, "The image file named %s was invalid or could not be read." % pil_image_name)
+
+    actual_width, actual_height = pil_image.size
+    if (actual_width != width) or (actual_height != height):
+        return (None, "The image file named %s should be %d x %d in size, but is actually %d x %d." % (pil_image_name, width, height, actual_width, actual_height))
+
+    try:
+        if (pil_image.mode != 'RGBA') and (pil_image.mode != 'RGB'):
+            pil_image = pil_image.convert('RGBA')
+        else:
+            pil_image.load()
+    except Exception:
+        return (None, "The image file named %s could not be converted to a usable format." % pil_image_name)
+
+    return (pil_image, None)
+
+def import_image(task):
+    """Read, validate and write one image. The task is (name, width, height, offset, pil_image_name);
+    returns (name, error, written, image_stats) where error is None on success, written is False
+    if the pixels were already in the file, and image_stats is None unless the worker collects stats."""
+    name, width, height, offset, pil_image_name = task
+    stats = _create_binary.stats
+    if stats is not None:
+        stats.begin_image(name, width * height)
+        start = stats.start()
+    pil_image, error = read_import_image(pil_image_name, width, height)
+    if stats is not None:
+        stats.record("load image", start, bytes_read = os.path.getsize(pil_image_name) if error is None else 0)
+    if error is not None:
+        return (name, error, False, end_image_stats(stats))
+    written = _create_binary.write_pil_image(width, height, offset, pil_image)
+    return (name, None, written, end_image_stats(stats))
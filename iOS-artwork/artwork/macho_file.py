@@ -9,22 +9,132 @@
 #
 #-------------------------------------------------------------------------------
 
+import os
+import struct
+from collections import namedtuple
+
 import macholib                     # You must have macholib installed. Search PyPi for it!
 from macholib.MachO import MachO
 
 from .binary_file import BinaryFile
-from .structs import NList
+from .structs import CFString, CFString64, CFStringArray, NList, NList64
+from .symbol_index import SymbolIndex
+from .util import flatten, load_cache, save_cache
+
+Section = namedtuple("Section", "sectname segname addr size offset")
+SymbolTable = namedtuple("SymbolTable", "symoff nsyms stroff strsize")
+
+class MachOHeader(object):
+    """The parts of one architecture's Mach-O header that we use: where its slice is, its
+    byte order and word size, its sections and its symbol table command. Unlike macholib's
+    headers these are small and plain, so they can be cached on disk."""
+
+    def __init__(self, arch, offset, size, endian, is_64_bit, sections, symbol_table):
+        super(MachOHeader, self).__init__()
+        self.arch = arch
+        self.offset = offset
+        self.size = size
+        self.endian = endian
+        self.is_64_bit = is_64_bit
+        self.sections = sections
+        self.symbol_table = symbol_table
+
+    @staticmethod
+    def from_macholib(header):
+        sections = []
+        for flat in flatten(header.commands):
+            if type(flat) in (macholib.mach_o.section, macholib.mach_o.section_64):
+                sections.append(Section(str(flat.sectname).rstrip("\0"), str(flat.segname).rstrip("\0"), int(flat.addr), int(flat.size), int(flat.offset)))
+        symbol_table = header.getSymbolTableCommand()
+        if symbol_table is not None:
+            symbol_table = SymbolTable(int(symbol_table.symoff), int(symbol_table.nsyms), int(symbol_table.stroff), int(symbol_table.strsize))
+        is_64_bit = header.MH_MAGIC in (macholib.mach_o.MH_MAGIC_64, macholib.mach_o.MH_CIGAM_64)
+        return MachOHeader(MachOBinaryFile.header_arch(header), header.offset, header.size, header.endian, is_64_bit, sections, symbol_table)
+
 
-class MachOBinaryFile(BinaryFile, MachO):
+class MachOBinaryFile(BinaryFile):
     """Represents a Mach-O binary file, with special methods to 
-    find important data in the file."""
+    find important data in the file.
+    
+    Universal (fat) binaries hold one Mach-O file per architecture. Pass arch 
+    (for instance "armv7", "arm64" or "x86_64") to pick which slice to read; 
+    by default the first one is used. All reads go through slice_data, a view 
+    of that slice in the file's mmap, so the slice is never copied.
+    
+    The load commands are parsed with macholib only the first time a binary is
+    seen; the headers we need, and the symbol table, are cached on disk next to
+    the binary until its size or modification time changes."""
 
-    def __init__(self, filename):
+    HEADER_CACHE_EXTENSION = ".headers"
+    SYMBOL_CACHE_EXTENSION = ".symbols"
+    
+    _headers = None
+    _macho = None
+    _symbol_index = None
+    _default_header = None
+    _slice_data = None
+
+    def __init__(self, filename, arch = None):
         super(MachOBinaryFile, self).__init__(filename)
+        self.arch = arch
+        
+    @staticmethod
+    def header_arch(header):
+        """The architecture name of a macholib header, such as "armv7", "arm64", "i386" or "x86_64"."""
+        cputype = header.header.cputype
+        cpusubtype = header.header.cpusubtype
+        arch = "%s" % macholib.mach_o.CPU_TYPE_NAMES.get(cputype, cputype)
+        if arch == "ARM":
+            # Subtypes are named like CPU_SUBTYPE_ARM_V7; we want armv7.
+            subtype = "%s" % macholib.mach_o.get_cpu_subtype(cputype, cpusubtype)
+            if subtype.startswith("CPU_SUBTYPE_ARM_") and not subtype.endswith("_ALL"):
+                arch += subtype[len("CPU_SUBTYPE_ARM_"):]
+        return arch.lower()
+        
+    @property
+    def macho(self):
+        """macholib's MachO for the file, parsed on first use."""
+        if self._macho is None:
+            self._macho = MachO(self.filename)
+        return self._macho
+        
+    @property
+    def header_cache_file_name(self):
+        return self.filename + MachOBinaryFile.HEADER_CACHE_EXTENSION
+        
+    @property
+    def header_cache_key(self):
+        stat = os.stat(self.filename)
+        return (stat.st_size, stat.st_mtime)
+        
+    @property
+    def headers(self):
+        """A MachOHeader for each architecture in the file."""
+        if self._headers is None:
+            key = self.header_cache_key
+            self._headers = load_cache(self.header_cache_file_name, key)
+            if self._headers is None:
+                self._headers = [MachOHeader.from_macholib(header) for header in self.macho.headers]
+                save_cache(self.header_cache_file_name, key, self._headers)
+        return self._headers
+        
+    @property
+    def architectures(self):
+        return [header.arch for header in self.headers]
 
     @property
     def default_header(self):
-        return self.headers[0]
+        if self._default_header is None:
+            if self.arch is None:
+                self._default_header = self.headers[0]
+            else:
+                for header in self.headers:
+                    if header.arch == self.arch:
+                        self._default_header = header
+                        break
+                else:
+                    raise ValueError("%s has no %s slice (it has %s)" % (self.filename, self.arch, ", ".join(self.architectures)))
+        return self._default_header
         
     @property
     def default_endian(self):
@@ -37,16 +147,33 @@ class MachOBinaryFile(BinaryFile, MachO):
     @property
     def is_big_endian(self):
         return self.default_endian == ">"
+        
+    @property
+    def is_64_bit(self):
+        return self.default_header.is_64_bit
 
     @property
     def default_header_offset(self):
-        # TODO: this is an assumption which probably doesn't hold true everywhere? What about fat headers?
-        return 0
+        return self.default_header.offset
+        
+    @property
+    def slice_data(self):
+        """The bytes of the selected architecture's Mach-O file. Offsets into it are the ones
+        found in the Mach-O's own load commands and pointers."""
+        if self._slice_data is None:
+            self._slice_data = buffer(self.data, self.default_header_offset, self.default_header.size)
+        return self._slice_data
+        
+    @property
+    def cfstring_type(self):
+        return CFString64 if self.is_64_bit else CFString
+        
+    @property
+    def nlist_type(self):
+        return NList64 if self.is_64_bit else NList
 
     def macho_sections(self):
-        for flat in flatten(self.default_header.commands):
-            if type(flat) == macholib.mach_o.section:
-                yield flat
+        return iter(self.default_header.sections)
                 
     def macho_section(self, sectname, segname):
         for section in self.macho_sections():
@@ -57,63 +184,84 @@ class MachOBinaryFile(BinaryFile, MachO):
     def cfstring_section(self):
         return self.macho_section('__cfstring', '__DATA')
         
+    def read_cfstrings(self):
+        """Return a CFStringArray of all constant CFStrings in the binary."""
+        cfs = self.cfstring_section()
+        string_count = cfs.size // self.cfstring_type.SIZE
+        return CFStringArray.read(self.default_endian, self.slice_data, cfs.addr, string_count, self.cfstring_type)
+        
     def iter_cfstrings(self):
         cfs = self.cfstring_section()
-        string_count = cfs.size / CFString.SIZE
+        cfstring_size = self.cfstring_type.SIZE
+        string_count = cfs.size // cfstring_size
         for i in range(string_count):
-            cfstring_addr = cfs.addr + (i * CFString.SIZE)
+            cfstring_addr = cfs.addr + (i * cfstring_size)
             cfstring = self.read_cfstring(cfstring_addr)
             yield cfstring
             
     def iter_strings(self):
-        for cfstring in self.iter_cfstrings():
-            yield cfstring.string
+        return iter(self.read_cfstrings())
 
     def read_cfstring(self, offset):
         """Read a constant CFString structure from the binary."""
-        return CFString(self.default_endian, self.data, offset)
+        return self.cfstring_type(self.default_endian, self.slice_data, offset)
         
     def read_nlist(self, offset):
         """Read an nlist entry from the binary."""
-        return NList(self.default_endian, self.data, offset)
+        return self.nlist_type(self.default_endian, self.slice_data, offset)
         
     def read_cstring(self, offset):
         """Read an ASCII null-terminated C String from the binary."""
+        data = self.slice_data
         end = offset
-        while self.data[end] != '\0':
+        while data[end] != '\0':
             end += 1
-        return self.data[offset:end].decode('ascii')
+        return data[offset:end].decode('ascii')
         
     def read_offset(self, offset):
         """Read a pointer value found at given offset."""
-        return struct.unpack_from('%sL' % self.default_endian, self.data, offset)
+        return struct.unpack_from(self.default_endian + self.cfstring_type.POINTER_FORMAT, self.slice_data, offset)[0]
 
-    def find_symbol(self, symbol):
-        """Given a symbol (potentially not exported), return the offset into the binary where
-        that symbol's data is found."""
+    @property
+    def symbol_cache_file_name(self):
+        return "%s.%s%s" % (self.filename, self.default_header.arch, MachOBinaryFile.SYMBOL_CACHE_EXTENSION)
         
-        # Find the symbol table.
-        symbol_table = self.default_header.getSymbolTableCommand()
+    @property
+    def symbol_cache_key(self):
+        """Identifies the binary (and the header within it) that a cached symbol index belongs to."""
+        stat = os.stat(self.filename)
+        return (stat.st_size, stat.st_mtime, self.default_header_offset, self.is_64_bit)
+
+    @property
+    def symbol_index(self):
+        """A SymbolIndex of the whole symbol table. It is built once, and cached on disk next to the binary."""
+        if self._symbol_index is None:
+            key = self.symbol_cache_key
+            self._symbol_index = SymbolIndex.load(self.symbol_cache_file_name, key)
+            if self._symbol_index is None:
+                self._symbol_index = self.read_symbol_index()
+                self._symbol_index.save(self.symbol_cache_file_name, key)
+        return self._symbol_index
+        
+    def read_symbol_index(self):
+        """Decode the symbol table into a SymbolIndex, bypassing any cache."""
+        symbol_table = self.default_header.symbol_table
         if symbol_table is None:
-            return None
+            return SymbolIndex({})
         
-        # Compute key offsets into the file. 
+        # Key offsets into the slice. 
         # (The file wasn't loaded via dyld so we don't have to compute vm/file slides.)
-        symbols_addr = self.default_header_offset + symbol_table.symoff
-        strings_addr = self.default_header_offset + symbol_table.stroff
-
-        # Find the symbol, and if found determine the address for its data.
-        symbol_addr = symbols_addr
-        for i in range(symbol_table.nsyms):
-            symbol_nlist = NList(self.default_endian, self.data, symbol_addr)
-            string_addr = strings_addr + symbol_nlist.n_strx
-            read_symbol = self.read_cstring(string_addr)
-            if (symbol_nlist.n_strx != 0) and (symbol == read_symbol):
-                address = symbol_nlist.n_value
-                if (symbol_nlist.n_desc & NList.N_ARM_THUMB_DEF) != 0:
-                    return (address | 1)
-                else:
-                    return address
-            symbol_addr += NList.SIZE
+        return SymbolIndex.from_symbol_table(self.nlist_type, self.default_endian, self.slice_data, symbol_table.symoff, symbol_table.nsyms, symbol_table.stroff, symbol_table.strsize)
+
+    def find_symbol(self, symbol):
+        """Given a symbol (potentially not exported), return the offset into the binary where
+        that symbol's data is found."""
+        return self.symbol_index.get(symbol)
         
-        return None
+    def find_symbols_with_prefix(self, prefix):
+        """Return a list of (symbol, offset) for all symbols starting with prefix."""
+        return list(self.symbol_index.iter_prefix(prefix))
+        
+    def find_symbols_matching(self, pattern):
+        """Return a list of (symbol, offset) for all symbols matching the regular expression pattern."""
+        return list(self.symbol_index.iter_matching(pattern))
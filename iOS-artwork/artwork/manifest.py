@@ -0,0 +1,127 @@
+#-------------------------------------------------------------------------------
+#
+# iOS .artwork file extractor
+# (c)2008-2011 Dave Peck <code [at] davepeck [dot] org> All Rights Reserved
+# 
+# Released under the three-clause BSD license.
+#
+# http://github.com/davepeck/iphone-tidbits/
+#
+#-------------------------------------------------------------------------------
+
+import os
+import json
+import hashlib
+
+def file_digest(file_name):
+    """Return a hex SHA-1 of a file's contents."""
+    digest = hashlib.sha1()
+    f = open(file_name, "rb")
+    try:
+        chunk = f.read(1 << 20)
+        while chunk:
+            digest.update(chunk)
+            chunk = f.read(1 << 20)
+    finally:
+        f.close()
+    return digest.hexdigest()
+
+def artwork_identity(artwork_file_name, set_info):
+    """What we remember about the artwork file an export came from."""
+    stat = os.stat(artwork_file_name)
+    return {
+        "name": set_info.name,
+        "version": set_info.version,
+        "byte_size": stat.st_size,
+        "mtime": stat.st_mtime,
+    }
+
+
+class ExportManifest(object):
+    """Records, in an export directory, where each exported image came from and what
+    was written for it, so that a later export can skip the images that are already
+    up to date.
+
+    For every image we keep its offset and size in the artwork file, a digest of its
+    source pixels, and the size, mtime and digest of the exported file. The export
+    options (such as the format) that the images were written with are kept too."""
+
+    FILE_NAME = ".artwork-manifest.json"
+
+    def __init__(self, directory, artwork = None, images = None, options = None):
+        super(ExportManifest, self).__init__()
+        self.directory = directory
+        self.artwork = artwork
+        self.options = options
+        self.images = images if images is not None else {}
+
+    @property
+    def file_name(self):
+        return os.path.join(self.directory, ExportManifest.FILE_NAME)
+
+    @staticmethod
+    def load(directory):
+        """Read the manifest in directory. A missing or unreadable manifest is an empty one."""
+        manifest = ExportManifest(directory)
+        try:
+            f = open(manifest.file_name, "r")
+            try:
+                jsonable = json.loads(f.read())
+            finally:
+                f.close()
+            manifest.artwork = jsonable["artwork"]
+            manifest.images = jsonable["images"]
+            manifest.options = jsonable.get("options")
+        except (IOError, ValueError, KeyError, TypeError):
+            pass
+        return manifest
+
+    def save(self):
+        temporary_file_name = "%s.%d.tmp" % (self.file_name, os.getpid())
+        f = open(temporary_file_name, "w")
+        f.write(json.dumps({"artwork": self.artwork, "images": self.images, "options": self.options}, indent = 4, sort_keys = True))
+        f.close()
+        os.rename(temporary_file_name, self.file_name)
+
+    def _output_matches(self, entry, export_file_name):
+        try:
+            stat = os.stat(export_file_name)
+        except OSError:
+            return False
+        if stat.st_size != entry["output_size"]:
+            return False
+        if stat.st_mtime == entry["output_mtime"]:
+            return True
+        # Touched, but perhaps not changed.
+        return file_digest(export_file_name) == entry["output_digest"]
+
+    def is_current(self, artwork_binary, image_info, export_file_name, artwork):
+        """Is the exported file for image_info still what exporting it from artwork_binary would write?
+        artwork is the artwork_identity of artwork_binary's file."""
+        entry = self.images.get(image_info.name)
+        if entry is None:
+            return False
+        if (entry["offset"], entry["width"], entry["height"]) != (image_info.offset, image_info.width, image_info.height):
+            return False
+        if not self._output_matches(entry, export_file_name):
+            return False
+        if artwork == self.artwork:
+            # Same artwork file, untouched since the last export.
+            return True
+        return artwork_binary.get_image_digest(image_info.width, image_info.height, image_info.offset) == entry["source_digest"]
+
+    def record(self, artwork_binary, image_info, export_file_name):
+        """Remember that image_info was just exported to export_file_name."""
+        stat = os.stat(export_file_name)
+        self.images[image_info.name] = {
+            "offset": image_info.offset,
+            "width": image_info.width,
+            "height": image_info.height,
+            "source_digest": artwork_binary.get_image_digest(image_info.width, image_info.height, image_info.offset),
+            "output_size": stat.st_size,
+            "output_mtime": stat.st_mtime,
+            "output_digest": file_digest(export_file_name),
+        }
+
+    def forget(self, name):
+        self.images.pop(name, None)
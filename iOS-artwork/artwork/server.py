@@ -0,0 +1,186 @@
+#-------------------------------------------------------------------------------
+#
+# iOS .artwork file extractor
+# (c)2008-2011 Dave Peck <code [at] davepeck [dot] org> All Rights Reserved
+#
+# Released under the three-clause BSD license.
+#
+# http://github.com/davepeck/iphone-tidbits/
+#
+#-------------------------------------------------------------------------------
+
+import os
+import json
+import urllib
+import multiprocessing
+from SocketServer import ThreadingMixIn
+from BaseHTTPServer import HTTPServer, BaseHTTPRequestHandler
+
+from .artwork_file import ArtworkBinaryFile
+from .artwork_set import ImageCache
+from .formats import FORMATS, is_format_available
+from .jobs import init_encode_worker, encode_artwork_image
+
+CONTENT_TYPES = {
+    "png": "image/png",
+    "webp": "image/webp",
+    "raw": "application/octet-stream",
+}
+
+#-------------------------------------------------------------------------------
+# ServedArtworkSet
+#-------------------------------------------------------------------------------
+
+class ServedArtworkSet(object):
+    """One supported artwork file, as seen by the server: its catalog entry, a
+    name -> image index, and a read-only mapping used to compute ETags."""
+
+    def __init__(self, artwork_file_name, set_info):
+        super(ServedArtworkSet, self).__init__()
+        self.artwork_file_name = artwork_file_name
+        self.set_info = set_info
+        self.artwork_binary = ArtworkBinaryFile(artwork_file_name)
+        self.artwork_binary.data # map it now, before several threads want it at once
+        self._indexes = dict((name, i) for i, name in enumerate(set_info.names))
+        self._digests = {}
+
+    def image_geometry(self, name):
+        """Return the (width, height, offset) of the named image, or None."""
+        i = self._indexes.get(name)
+        if i is None:
+            return None
+        return (int(self.set_info.widths[i]), int(self.set_info.heights[i]), int(self.set_info.offsets[i]))
+
+    def image_digest(self, name):
+        """A digest of the named image's pixels, computed once. Much cheaper than encoding the image."""
+        digest = self._digests.get(name)
+        if digest is None:
+            width, height, offset = self.image_geometry(name)
+            digest = self._digests[name] = self.artwork_binary.get_image_digest(width, height, offset)
+        return digest
+
+
+#-------------------------------------------------------------------------------
+# ArtworkServer
+#-------------------------------------------------------------------------------
+
+class ArtworkServer(ThreadingMixIn, HTTPServer):
+    """Serves the images of every supported artwork file in a directory, encoding them
+    on demand. Each connection gets its own thread; the encoding itself happens in a pool
+    of worker processes, so that it doesn't hold up other requests. Encoded images are
+    kept in an LRU cache, and every response carries an ETag made from the image's pixels.
+
+        GET /                            JSON list of the artwork files
+        GET /<artwork file>/             JSON list of the images in an artwork file
+        GET /<artwork file>/<image>.png  one image, as png, webp or raw (by extension)
+    """
+
+    daemon_threads = True
+    request_queue_size = 128
+
+    DEFAULT_CACHE_BYTES = 64 * 1024 * 1024
+
+    def __init__(self, address, artwork_sets, jobs = 1, compress_level = None, cache_bytes = DEFAULT_CACHE_BYTES):
+        HTTPServer.__init__(self, address, ArtworkRequestHandler)
+        self.artwork_sets = dict((os.path.basename(artwork_set.artwork_file_name), artwork_set) for artwork_set in artwork_sets)
+        self.compress_level = compress_level
+        self.formats = [image_format for image_format in FORMATS if is_format_available(image_format)]
+        self.cache = ImageCache(cache_bytes, lambda entry: len(entry[1]))
+        self.pool = multiprocessing.Pool(jobs, init_encode_worker) if jobs > 1 else None
+
+    def encode(self, artwork_set, name, image_format):
+        """Return (etag, data, error) for one image, from the cache if possible."""
+        key = (artwork_set.artwork_file_name, name, image_format)
+        entry = self.cache.get(key)
+        if entry is not None:
+            return (entry[0], entry[1], None)
+
+        width, height, offset = artwork_set.image_geometry(name)
+        task = (artwork_set.artwork_file_name, width, height, offset, image_format, self.compress_level)
+        if self.pool is not None:
+            data, error = self.pool.apply(encode_artwork_image, (task,))
+        else:
+            data, error = encode_artwork_image(task)
+        if error is not None:
+            return (None, None, error)
+
+        etag = self.etag(artwork_set, name, image_format)
+        self.cache.put(key, (etag, data))
+        return (etag, data, None)
+
+    def etag(self, artwork_set, name, image_format):
+        # Weak, since the bytes also depend on the compress level and the PIL version.
+        return 'W/"%s-%s"' % (artwork_set.image_digest(name)[:20], image_format)
+
+    def server_close(self):
+        HTTPServer.server_close(self)
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+
+
+class ArtworkRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_HEAD(self):
+        self.handle_get(send_body = False)
+
+    def do_GET(self):
+        self.handle_get(send_body = True)
+
+    def handle_get(self, send_body):
+        path = urllib.unquote(self.path.split("?", 1)[0]).decode('utf-8', 'replace')
+        parts = [part for part in path.split("/") if part]
+
+        if len(parts) == 0:
+            self.send_json(sorted(self.server.artwork_sets), send_body)
+            return
+
+        artwork_set = self.server.artwork_sets.get(parts[0])
+        if artwork_set is None:
+            self.send_error(404, "No artwork file named %s is being served." % parts[0])
+            return
+        if len(parts) == 1:
+            self.send_json(artwork_set.set_info.names, send_body)
+            return
+        if len(parts) != 2:
+            self.send_error(404)
+            return
+
+        base_name, extension = os.path.splitext(parts[1])
+        image_format = extension[1:].lower()
+        name = base_name + ".png"
+        if (image_format not in self.server.formats) or (artwork_set.image_geometry(name) is None):
+            self.send_error(404, "No image named %s." % parts[1])
+            return
+
+        # A conditional request for an image the client already has needs no encoding at all.
+        etag = self.server.etag(artwork_set, name, image_format)
+        if_none_match = [tag.strip() for tag in self.headers.get("If-None-Match", "").split(",")]
+        if ("*" in if_none_match) or (etag in if_none_match) or (etag[2:] in if_none_match):
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        etag, data, error = self.server.encode(artwork_set, name, image_format)
+        if error is not None:
+            self.send_error(500, error)
+            return
+        self.send_body(data, CONTENT_TYPES[image_format], send_body, etag)
+
+    def send_json(self, jsonable, send_body):
+        self.send_body(json.dumps(jsonable, indent = 4), "application/json", send_body)
+
+    def send_body(self, data, content_type, send_body, etag = None):
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        if etag is not None:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        if send_body:
+            self.wfile.write(data)
@@ -0,0 +1,141 @@
+#-------------------------------------------------------------------------------
+#
+# iOS .artwork file extractor
+# (c)2008-2011 Dave Peck <code [at] davepeck [dot] org> All Rights Reserved
+#
+# Released under the three-clause BSD license.
+#
+# http://github.com/davepeck/iphone-tidbits/
+#
+#-------------------------------------------------------------------------------
+
+import os
+import json
+from timeit import default_timer
+
+def cpu_time():
+    """User plus system CPU seconds used by this process so far."""
+    times = os.times()
+    return times[0] + times[1]
+
+class Stats(object):
+    """Wall and CPU time, bytes read and written, and pixels handled, per stage (such as
+    "encode" or "write file") and per image.
+
+    Code that can be timed holds a stats attribute which is None unless someone wants
+    the numbers, so that it costs a single test when they don't:
+
+        stats = self.stats
+        if stats is not None:
+            start = stats.start()
+        ...
+        if stats is not None:
+            stats.record("encode", start, pixels = width * height)
+
+    Between begin_image() and end_image(), records are kept for that image; end_image()
+    returns them so that worker processes can send them to the parent, which adds them
+    to its own Stats with add_image()."""
+
+    # Totals are lists of: count, wall seconds, cpu seconds, bytes read, bytes written, pixels
+    COUNT, WALL, CPU, BYTES_READ, BYTES_WRITTEN, PIXELS = range(6)
+
+    def __init__(self):
+        super(Stats, self).__init__()
+        self.started = default_timer()
+        self.stages = {}
+        self.stage_order = []
+        self.images = []
+        self._image = None
+
+    @staticmethod
+    def start():
+        return (default_timer(), cpu_time())
+
+    def _add(self, stages, stage, totals):
+        existing = stages.get(stage)
+        if existing is None:
+            stages[stage] = list(totals)
+        else:
+            for i, value in enumerate(totals):
+                existing[i] += value
+
+    def _add_stage(self, stage, totals):
+        if stage not in self.stages:
+            self.stage_order.append(stage)
+        self._add(self.stages, stage, totals)
+
+    def record(self, stage, start, bytes_read = 0, bytes_written = 0, pixels = 0):
+        """Record one step of stage that began at start (a value returned by start().)"""
+        wall, cpu = Stats.start()
+        totals = (1, wall - start[0], cpu - start[1], bytes_read, bytes_written, pixels)
+        if self._image is not None:
+            if stage not in self._image["stages"]:
+                self._image["stage_order"].append(stage)
+            self._add(self._image["stages"], stage, totals)
+        else:
+            self._add_stage(stage, totals)
+
+    def begin_image(self, name, pixels):
+        self._image = {"name": name, "pixels": pixels, "stages": {}, "stage_order": [], "start": default_timer()}
+
+    def end_image(self):
+        """Stop recording for the current image and return its records."""
+        image = self._image
+        self._image = None
+        image["wall"] = default_timer() - image.pop("start")
+        return image
+
+    def add_image(self, image):
+        """Add the records of one image (from end_image(), possibly in another process.)"""
+        self.images.append(image)
+        for stage in image["stage_order"]:
+            self._add_stage(stage, image["stages"][stage])
+
+    @property
+    def elapsed(self):
+        return default_timer() - self.started
+
+    def jsonable(self):
+        stages = []
+        for stage in self.stage_order:
+            totals = self.stages[stage]
+            stages.append({
+                "stage": stage,
+                "count": totals[Stats.COUNT],
+                "wall": totals[Stats.WALL],
+                "cpu": totals[Stats.CPU],
+                "bytes_read": totals[Stats.BYTES_READ],
+                "bytes_written": totals[Stats.BYTES_WRITTEN],
+                "pixels": totals[Stats.PIXELS],
+            })
+        images = []
+        for image in self.images:
+            images.append({
+                "name": image["name"],
+                "pixels": image["pixels"],
+                "wall": image["wall"],
+                "stages": dict((stage, {"wall": totals[Stats.WALL], "cpu": totals[Stats.CPU]}) for stage, totals in image["stages"].items()),
+            })
+        return {"elapsed": self.elapsed, "stages": stages, "images": images}
+
+    def save_json(self, file_name):
+        f = open(file_name, "w")
+        f.write(json.dumps(self.jsonable(), indent = 4))
+        f.close()
+
+    def print_summary(self, out, slowest_count = 10):
+        elapsed = self.elapsed
+        pixels = sum(image["pixels"] for image in self.images)
+        print >>out, "\nSTATS: %d images, %.1f megapixels in %.3f s (%.2f megapixels/s)" % (len(self.images), pixels / 1e6, elapsed, (pixels / 1e6) / max(elapsed, 1e-9))
+        print >>out, "\n\t%-16s %8s %10s %10s %10s %10s %12s" % ("stage", "count", "wall s", "cpu s", "MB read", "MB written", "Mpixels/s")
+        for stage in self.stage_order:
+            totals = self.stages[stage]
+            rate = ("%12.2f" % ((totals[Stats.PIXELS] / 1e6) / max(totals[Stats.WALL], 1e-9))) if totals[Stats.PIXELS] else "%12s" % "-"
+            print >>out, "\t%-16s %8d %10.3f %10.3f %10.2f %10.2f %s" % (stage, totals[Stats.COUNT], totals[Stats.WALL], totals[Stats.CPU], totals[Stats.BYTES_READ] / 1e6, totals[Stats.BYTES_WRITTEN] / 1e6, rate)
+
+        slowest = sorted(self.images, key = lambda image: image["wall"], reverse = True)[0:slowest_count]
+        if slowest:
+            print >>out, "\n\tslowest images:"
+            for image in slowest:
+                breakdown = ", ".join("%s %.1f ms" % (stage, image["stages"][stage][Stats.WALL] * 1000) for stage in image["stage_order"])
+                print >>out, "\t%8.1f ms  %s  (%s)" % (image["wall"] * 1000, image["name"], breakdown)
@@ -10,10 +10,41 @@
 #-------------------------------------------------------------------------------
 
 import struct
+import numpy
 
 class Struct(object):
-    pass
+    """Base for the binary structures we read. Subclasses list their FIELDS as
+    (name, numpy type code) pairs so that whole arrays of records can be decoded
+    at once, as columns, rather than one Python object per record."""
+    FIELDS = []
     
+    # Pointer fields are 4 bytes in 32-bit binaries. The *64 subclasses below widen them.
+    POINTER_FORMAT = 'L'
+    POINTER_CODE = 'u4'
+    
+    @classmethod
+    def dtype(cls, endian):
+        return numpy.dtype([(name, "%s%s" % (endian, code)) for name, code in cls.FIELDS])
+    
+    @classmethod
+    def read_array(cls, endian, data, offset, count):
+        """Decode count consecutive records at offset into a structured numpy array (a view of data)."""
+        return numpy.frombuffer(data, dtype=cls.dtype(endian), count=count, offset=offset)
+    
+    @classmethod
+    def gather_array(cls, endian, data, offsets):
+        """Decode one record at each of the given offsets into a structured numpy array."""
+        dtype = cls.dtype(endian)
+        offsets = numpy.asarray(offsets, dtype=numpy.intp)
+        data_bytes = numpy.frombuffer(data, dtype=numpy.uint8)
+        record_bytes = data_bytes[offsets[:, numpy.newaxis] + numpy.arange(dtype.itemsize)]
+        return record_bytes.view(dtype).reshape(len(offsets))
+    
+    @classmethod
+    def read_pointer_array(cls, endian, data, offset, count):
+        """Decode count consecutive pointers at offset."""
+        return numpy.frombuffer(data, dtype=numpy.dtype("%s%s" % (endian, cls.POINTER_CODE)), count=count, offset=offset)
+
 
 #-------------------------------------------------------------------------------
 # CFString
@@ -22,6 +53,8 @@ class Struct(object):
 class CFString(Struct):
     """struct __builtin_CFString { const int *isa; int flags; const char *str; long length; }"""
     SIZE = 16
+    FORMAT = 'LLLL'
+    FIELDS = [('objc_class', 'u4'), ('flags', 'u4'), ('pointer', 'u4'), ('length', 'u4')]
     
     # See http://www.opensource.apple.com/source/CF/CF-550.42/CFString.c
     kCFHasLengthByte = 0x04
@@ -33,35 +66,79 @@ class CFString(Struct):
         self.endian = endian
         self.data = data
         self.offset = offset
-        self.objc_class, self.flags, self.pointer, self.length = struct.unpack_from(("%sLLLL" % endian), data, offset)
+        self.objc_class, self.flags, self.pointer, self.length = struct.unpack_from(endian + self.FORMAT, data, offset)
         self.is_little_endian = (endian == "<")
         
     @property
     def string(self):
         """Read the const char* (string) portion of a CFString."""
+        return CFString.decode_string(self.endian, self.data, self.flags, self.pointer, self.length)
+        
+    @staticmethod
+    def decode_string(endian, data, flags, pointer, length):
+        """Decode the characters that a CFString with the given flags, pointer and length refers to."""
         s = None
         
-        if (self.flags & CFString.kCFHasLengthByte):
-            assert ord(self.data[self.pointer]) == self.length, "Invalid length or length byte."
-            offset += 1
+        if (flags & CFString.kCFHasLengthByte):
+            assert ord(data[pointer]) == length, "Invalid length or length byte."
+            pointer += 1
         
-        if (self.flags & CFString.kCFIsUnicode):
-            bytes = self.data[self.pointer:self.pointer+(self.length * 2)]
-            last_byte = self.data[self.pointer+(self.length * 2)]
-            if self.is_little_endian:
+        if (flags & CFString.kCFIsUnicode):
+            bytes = data[pointer:pointer+(length * 2)]
+            last_byte = data[pointer+(length * 2)]
+            if endian == "<":
                 s = bytes.decode('utf-16le')
             else:
                 s = bytes.decode('utf-16be')
         else:
-            bytes = self.data[self.pointer:self.pointer+self.length]
-            last_byte = self.data[self.pointer+self.length]
+            bytes = data[pointer:pointer+length]
+            last_byte = data[pointer+length]
             s = bytes.decode('ascii')
         
-        if (self.flags & CFString.kCFHasNullByte):
+        if (flags & CFString.kCFHasNullByte):
             assert last_byte == '\0', "Something went wrong reading cfstring."
             
         return s
     
+    
+class CFStringArray(object):
+    """A columnar array of CFString records. The characters of each string are only
+    decoded the first time that string is asked for."""
+    
+    def __init__(self, endian, data, records):
+        super(CFStringArray, self).__init__()
+        self.endian = endian
+        self.data = data
+        self.records = records
+        self._strings = [None] * len(records)
+        
+    @staticmethod
+    def read(endian, data, offset, count, cfstring_type = None):
+        """The CFStrings stored consecutively at offset."""
+        cfstring_type = cfstring_type or CFString
+        return CFStringArray(endian, data, cfstring_type.read_array(endian, data, offset, count))
+        
+    @staticmethod
+    def gather(endian, data, offsets, cfstring_type = None):
+        """The CFStrings found at each of the given offsets."""
+        cfstring_type = cfstring_type or CFString
+        return CFStringArray(endian, data, cfstring_type.gather_array(endian, data, offsets))
+        
+    def __len__(self):
+        return len(self.records)
+        
+    def __getitem__(self, i):
+        s = self._strings[i]
+        if s is None:
+            record = self.records[i]
+            s = CFString.decode_string(self.endian, self.data, int(record['flags']), int(record['pointer']), int(record['length']))
+            self._strings[i] = s
+        return s
+        
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+    
         
 #-------------------------------------------------------------------------------
 # NList
@@ -70,11 +147,13 @@ class CFString(Struct):
 class NList(Struct):
     """struct nlist { int32_t n_un; uint8_t n_type; uint8_t n_sect; int16_t n_desc; uint32_t n_value; }"""
     SIZE = 12
+    FORMAT = 'iBBhI'
+    FIELDS = [('n_strx', 'i4'), ('n_type', 'u1'), ('n_sect', 'u1'), ('n_desc', 'i2'), ('n_value', 'u4')]
     N_ARM_THUMB_DEF = 0x0008 # See MachOFileAbstraction.hpp
     
     def __init__(self, endian, data, offset):
         super(Struct, self).__init__()
-        self.n_strx, self.n_type, self.n_sect, self.n_desc, self.n_value = struct.unpack_from(("%siBBhI" % endian), data, offset)
+        self.n_strx, self.n_type, self.n_sect, self.n_desc, self.n_value = struct.unpack_from(endian + self.FORMAT, data, offset)
         
         
 #-------------------------------------------------------------------------------
@@ -83,38 +162,39 @@ class NList(Struct):
 
 class ArtworkSetInformation(Struct):
     SIZE = 36
+    FORMAT = 'LLLLLHHLLL'
+    FIELDS = [('set_name_offset', 'u4'), ('unk1', 'u4'), ('unk2', 'u4'), ('sizes_offset', 'u4'), ('names_offset', 'u4'), ('artwork_count', 'u2'), ('unk3', 'u2'), ('unk4', 'u4'), ('unk5', 'u4'), ('unk6', 'u4')]
 
     def __init__(self, endian, data, offset):
         super(ArtworkSetInformation, self).__init__()
         # sizes_offset points directly to an array of ArtworkSizeInformation structs
         # names_offset is the address of an array of pointers to cfstrings. (yikes.)
-        self.set_name_offset, unk1, unk2, self.sizes_offset, self.names_offset, self.artwork_count, unk3, unk4, unk5, unk6 = struct.unpack_from(("%sLLLLLHHLLL" % endian), data, offset)
+        self.set_name_offset, unk1, unk2, self.sizes_offset, self.names_offset, self.artwork_count, unk3, unk4, unk5, unk6 = struct.unpack_from(endian + self.FORMAT, data, offset)
         self.endian = endian
         self.data = data
         self.offset = offset
     
     @property
     def name(self):
-        return CFString(self.endian, self.data, self.set_name_offset).string
+        return self.CFSTRING_TYPE(self.endian, self.data, self.set_name_offset).string
     
     def read_offset(self, offset):
         """Dereference an address found at `offset`"""
-        return struct.unpack_from('%sL' % self.endian, self.data, offset)[0]
+        return struct.unpack_from(self.endian + self.POINTER_FORMAT, self.data, offset)[0]
+    
+    def read_artworks(self):
+        """Return (names, sizes) for all artwork in the set: names is a CFStringArray and sizes
+        an ArtworkSizeInformation array with offset, width and height columns."""
+        sizes = self.SIZE_INFORMATION_TYPE.read_array(self.endian, self.data, self.sizes_offset, self.artwork_count)
+        name_pointers = self.read_pointer_array(self.endian, self.data, self.names_offset, self.artwork_count)
+        names = CFStringArray.gather(self.endian, self.data, name_pointers, self.CFSTRING_TYPE)
+        return (names, sizes)
     
     def iter_artworks(self):
-        size_offset = self.sizes_offset
-        name_offset = self.names_offset
-
-        # Walk through the artwork and gather information.
+        names, sizes = self.read_artworks()
+        sizes = sizes.view(numpy.recarray)
         for artwork_i in range(self.artwork_count):
-            ai = ArtworkSizeInformation(self.endian, self.data, size_offset)
-            name_pointer = self.read_offset(name_offset)
-            name_cfstring = CFString(self.endian, self.data, name_pointer)
-            
-            size_offset += ArtworkSizeInformation.SIZE
-            name_offset += 4
-            
-            yield (name_cfstring.string, ai)
+            yield (names[artwork_i], sizes[artwork_i])
             
     
 #-------------------------------------------------------------------------------
@@ -124,6 +204,56 @@ class ArtworkSetInformation(Struct):
 class ArtworkSizeInformation(Struct):
     """Appears to be struct { unsigned long offset_into_artwork_file; unsigned int width; unsigned int height; }"""
     SIZE = 8
+    FORMAT = 'LHH'
+    FIELDS = [('offset', 'u4'), ('width', 'u2'), ('height', 'u2')]
+    
     def __init__(self, endian, data, offset):
         super(ArtworkSizeInformation, self).__init__()
-        self.offset, self.width, self.height = struct.unpack_from(("%sLHH" % endian), data, offset)
+        self.offset, self.width, self.height = struct.unpack_from(endian + self.FORMAT, data, offset)
+
+ArtworkSetInformation.CFSTRING_TYPE = CFString
+ArtworkSetInformation.SIZE_INFORMATION_TYPE = ArtworkSizeInformation
+
+
+#-------------------------------------------------------------------------------
+# 64-bit layouts
+#-------------------------------------------------------------------------------
+
+class CFString64(CFString):
+    """struct __builtin_CFString, as laid out in 64-bit binaries (flags is padded to pointer alignment.)"""
+    SIZE = 32
+    FORMAT = 'QI4xQQ'
+    FIELDS = [('objc_class', 'u8'), ('flags', 'u4'), ('padding', 'V4'), ('pointer', 'u8'), ('length', 'u8')]
+    POINTER_FORMAT = 'Q'
+    POINTER_CODE = 'u8'
+    
+
+class NList64(NList):
+    """struct nlist_64 { uint32_t n_strx; uint8_t n_type; uint8_t n_sect; uint16_t n_desc; uint64_t n_value; }"""
+    SIZE = 16
+    FORMAT = 'iBBhQ'
+    FIELDS = [('n_strx', 'i4'), ('n_type', 'u1'), ('n_sect', 'u1'), ('n_desc', 'i2'), ('n_value', 'u8')]
+    POINTER_FORMAT = 'Q'
+    POINTER_CODE = 'u8'
+
+
+# The artwork structures below are the 32-bit ones with every long widened to
+# a pointer-sized field. Nobody has checked them against a 64-bit UIKit yet, so
+# UIKitBinaryFile refuses 64-bit slices; only the fixtures build them.
+
+class ArtworkSizeInformation64(ArtworkSizeInformation):
+    SIZE = 16
+    FORMAT = 'QHH4x'
+    FIELDS = [('offset', 'u8'), ('width', 'u2'), ('height', 'u2'), ('padding', 'V4')]
+    POINTER_FORMAT = 'Q'
+    POINTER_CODE = 'u8'
+
+
+class ArtworkSetInformation64(ArtworkSetInformation):
+    SIZE = 72
+    FORMAT = 'QQQQQHH4xQQQ'
+    FIELDS = [('set_name_offset', 'u8'), ('unk1', 'u8'), ('unk2', 'u8'), ('sizes_offset', 'u8'), ('names_offset', 'u8'), ('artwork_count', 'u2'), ('unk3', 'u2'), ('padding', 'V4'), ('unk4', 'u8'), ('unk5', 'u8'), ('unk6', 'u8')]
+    POINTER_FORMAT = 'Q'
+    POINTER_CODE = 'u8'
+    CFSTRING_TYPE = CFString64
+    SIZE_INFORMATION_TYPE = ArtworkSizeInformation64
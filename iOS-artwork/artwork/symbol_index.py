@@ -0,0 +1,91 @@
+#-------------------------------------------------------------------------------
+#
+# iOS .artwork file extractor
+# (c)2008-2011 Dave Peck <code [at] davepeck [dot] org> All Rights Reserved
+# 
+# Released under the three-clause BSD license.
+#
+# http://github.com/davepeck/iphone-tidbits/
+#
+#-------------------------------------------------------------------------------
+
+import re
+import bisect
+
+import numpy
+
+from .structs import NList
+from .util import load_cache, save_cache
+
+class SymbolIndex(object):
+    """Maps the symbol names of a Mach-O symbol table to their addresses. Addresses of
+    thumb functions already have their low bit set."""
+
+    def __init__(self, symbols):
+        super(SymbolIndex, self).__init__()
+        self.symbols = symbols
+        self._sorted_names = None
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __contains__(self, name):
+        return name in self.symbols
+
+    def __getitem__(self, name):
+        return self.symbols[name]
+
+    def get(self, name, default = None):
+        return self.symbols.get(name, default)
+
+    @property
+    def sorted_names(self):
+        if self._sorted_names is None:
+            self._sorted_names = sorted(self.symbols)
+        return self._sorted_names
+
+    def iter_prefix(self, prefix):
+        """Yield (name, address) for every symbol starting with prefix, in name order."""
+        names = self.sorted_names
+        for i in range(bisect.bisect_left(names, prefix), len(names)):
+            name = names[i]
+            if not name.startswith(prefix):
+                break
+            yield (name, self.symbols[name])
+
+    def iter_matching(self, pattern):
+        """Yield (name, address) for every symbol matching the regular expression pattern, in name order."""
+        regex = re.compile(pattern)
+        for name in self.sorted_names:
+            if regex.search(name) is not None:
+                yield (name, self.symbols[name])
+
+    @staticmethod
+    def from_symbol_table(nlist_type, endian, data, symbols_addr, nsyms, strings_addr, strings_size):
+        """Decode a whole nlist (or nlist_64) array and its string table at once. As with 
+        the linker, the first definition of a name wins."""
+        nlists = nlist_type.read_array(endian, data, symbols_addr, nsyms)
+        addresses = nlists['n_value'].astype(numpy.uint64)
+        addresses |= ((nlists['n_desc'] & NList.N_ARM_THUMB_DEF) != 0)
+
+        strings = data[strings_addr:strings_addr + strings_size]
+        symbols = {}
+        for strx, address in zip(nlists['n_strx'].tolist(), addresses.tolist()):
+            if strx == 0:
+                continue
+            name = strings[strx:strings.find(b'\0', strx)].decode('ascii')
+            if name not in symbols:
+                symbols[name] = address
+        return SymbolIndex(symbols)
+
+    @staticmethod
+    def load(cache_file_name, key):
+        """Return the index cached in cache_file_name if it was saved with the same key, or None."""
+        symbols = load_cache(cache_file_name, key)
+        if symbols is None:
+            return None
+        return SymbolIndex(symbols)
+
+    def save(self, cache_file_name, key):
+        """Write the index to cache_file_name. A cache that can't be written is silently skipped."""
+        save_cache(cache_file_name, key, self.symbols)
@@ -15,8 +15,8 @@ from .structs import ArtworkSetInformation
 class UIKitBinaryFile(MachOBinaryFile):
     """Represents the UIKit framework binary, with special tools to look for artwork."""
 
-    def __init__(self, filename):
-        super(MachOBinaryFile, self).__init__(filename)
+    def __init__(self, filename, arch = None):
+        super(UIKitBinaryFile, self).__init__(filename, arch)
         
     @property
     def images_offset(self):
@@ -44,18 +44,27 @@ class UIKitBinaryFile(MachOBinaryFile):
         # TODO: this doesn't work? shared_image_sets_offset = self.find_symbol("___sharedImageSetsCount")
         return 2
 
+    @property
+    def artwork_set_information_type(self):
+        # The 64-bit artwork tables haven't been checked against a real UIKit, and their
+        # pointers would have to be translated through their segment's vmaddr/fileoff
+        # before they can be used as offsets into the slice. Refuse them until then.
+        if self.is_64_bit:
+            raise ValueError("%s: 64-bit slices (%s) are not yet supported; pick a 32-bit architecture such as armv7 or i386" % (self.filename, self.default_header.arch))
+        return ArtworkSetInformation
+
     def read_artwork_set_information(self, offset):
-        return ArtworkSetInformation(self.default_endian, self.data, offset)
+        return self.artwork_set_information_type(self.default_endian, self.slice_data, offset)
 
     def iter_shared_iphone_image_sets(self):
         offset = self.shared_iphone_image_sets_offset
         for artwork_set_i in range(self.shared_image_sets_count):
             yield self.read_artwork_set_information(offset)
-            offset += ArtworkSetInformation.SIZE
+            offset += self.artwork_set_information_type.SIZE
 
     def iter_shared_ipad_image_sets(self):
         offset = self.shared_ipad_image_sets_offset
         for artwork_set_i in range(self.shared_image_sets_count):
             yield self.read_artwork_set_information(offset)
-            offset += ArtworkSetInformation.SIZE
+            offset += self.artwork_set_information_type.SIZE
 
@@ -9,6 +9,92 @@
 #
 #-------------------------------------------------------------------------------
 
+import os
+import shutil
+import numpy
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+def file_extension(file_name):
+    """Return the extension of file_name, without the leading dot."""
+    return os.path.splitext(file_name)[1][1:]
+
+# Linux ioctl that makes a file share another's blocks, copy-on-write (btrfs, xfs...)
+FICLONE = 0x40049409
+
+def clone_file(source_file_name, destination_file_name):
+    """Copy a file as cheaply as the filesystem allows: a copy-on-write clone if possible,
+    then an in-kernel copy_file_range, and finally a plain chunked copy."""
+    source = open(source_file_name, "rb")
+    try:
+        destination = open(destination_file_name, "wb")
+        try:
+            if fcntl is not None:
+                try:
+                    fcntl.ioctl(destination.fileno(), FICLONE, source.fileno())
+                    return
+                except (IOError, OSError):
+                    pass
+            copy_file_range = getattr(os, "copy_file_range", None)
+            if copy_file_range is not None:
+                try:
+                    remaining = os.fstat(source.fileno()).st_size
+                    while remaining > 0:
+                        copied = copy_file_range(source.fileno(), destination.fileno(), remaining)
+                        if copied == 0:
+                            break
+                        remaining -= copied
+                    if remaining == 0:
+                        return
+                except OSError:
+                    pass
+                source.seek(0)
+                destination.seek(0)
+                destination.truncate()
+            shutil.copyfileobj(source, destination, 1 << 20)
+        finally:
+            destination.close()
+    finally:
+        source.close()
+
+def load_cache(cache_file_name, key):
+    """Return the value pickled into cache_file_name by save_cache() with the same key, or None."""
+    try:
+        cache_file = open(cache_file_name, "rb")
+        try:
+            cached_key, value = pickle.load(cache_file)
+        finally:
+            cache_file.close()
+    except Exception:
+        return None
+    if cached_key != key:
+        return None
+    return value
+
+def save_cache(cache_file_name, key, value):
+    """Pickle value, with key, into cache_file_name. A cache that can't be written is silently skipped."""
+    temporary_file_name = "%s.%d.tmp" % (cache_file_name, os.getpid())
+    try:
+        cache_file = open(temporary_file_name, "wb")
+        try:
+            pickle.dump((key, value), cache_file, pickle.HIGHEST_PROTOCOL)
+        finally:
+            cache_file.close()
+        os.rename(temporary_file_name, cache_file_name)
+    except (IOError, OSError):
+        try:
+            os.remove(temporary_file_name)
+        except OSError:
+            pass
+
 def flatten(thing):
     """Take arbitrarily nested lists or tuples and flatten them."""
     if (type(thing) == list) or (type(thing) == tuple):
@@ -19,32 +105,88 @@ def flatten(thing):
         yield thing
         
         
-class KnuthMorrisPratt(object):
-    """Implement a search algorithm that works over lists."""
+class MultiPatternSearch(object):
+    """Find every occurrence of many byte strings in a single pass over the haystack.
+    
+    Patterns that are 1, 2, 4 or 8 bytes long (the size of ints and longs) are
+    matched by reading the haystack as words at each byte alignment and looking
+    every word up in the sorted set of patterns. Patterns of any other length
+    fall back to a native find() loop each."""
+    
+    WORD_SIZES = (1, 2, 4, 8)
+    
+    def __init__(self, patterns):
+        super(MultiPatternSearch, self).__init__()
+        self.patterns = list(set(patterns))
+        self._patterns_by_length = {}
+        for pattern in self.patterns:
+            self._patterns_by_length.setdefault(len(pattern), []).append(pattern)
+            
     @staticmethod
-    def build_kmp_table(needle):
-        m = len(needle)
-        pi = [0] * m
-        k = 0
-        for q in range(1, m):
-            while k > 0 and needle[k] != needle[q]:
-                k = pi[k - 1]
-            if needle[k] == needle[q]:
-                k = k + 1
-            pi[q] = k
-        return pi
-
+    def _find_words(haystack, patterns, word_size):
+        """Return (offsets, words) arrays for every word-sized pattern occurrence, in offset order."""
+        dtype = numpy.dtype('<u%d' % word_size)
+        pattern_words = numpy.unique(numpy.frombuffer(b"".join(patterns), dtype=dtype))
+        
+        # Cheap pre-filter on the low byte(s) before the binary search.
+        filter_dtype = numpy.dtype('<u%d' % min(word_size, 2))
+        word_filter = numpy.zeros(1 << (8 * filter_dtype.itemsize), dtype=bool)
+        word_filter[pattern_words.astype(filter_dtype)] = True
+        
+        all_offsets = []
+        all_words = []
+        for alignment in range(word_size):
+            count = (len(haystack) - alignment) // word_size
+            if count <= 0:
+                continue
+            words = numpy.frombuffer(haystack, dtype=dtype, count=count, offset=alignment)
+            candidates = numpy.nonzero(word_filter[words.astype(filter_dtype)])[0]
+            candidate_words = words[candidates]
+            positions = numpy.searchsorted(pattern_words, candidate_words)
+            positions[positions == len(pattern_words)] = 0
+            hits = numpy.nonzero(pattern_words[positions] == candidate_words)[0]
+            all_offsets.append(alignment + (candidates[hits] * word_size))
+            all_words.append(candidate_words[hits])
+            
+        if len(all_offsets) == 0:
+            return (numpy.zeros(0, dtype=numpy.intp), numpy.zeros(0, dtype=dtype))
+        offsets = numpy.concatenate(all_offsets)
+        words = numpy.concatenate(all_words)
+        order = numpy.argsort(offsets, kind='mergesort')
+        return (offsets[order], words[order])
+    
     @staticmethod
-    def find(needle, haystack, starting_at = 0):
-        n = len(haystack)
-        m = len(needle)
-        pi = KnuthMorrisPratt.build_kmp_table(needle)
-        q = 0
-        for i in range(starting_at, n):
-            while q > 0 and needle[q] != haystack[i]:
-                q = pi[q - 1]
-            if needle[q] == haystack[i]:
-                q = q + 1
-            if q == m:
-                return i - m + 1
-        return -1    
+    def _find_pattern(haystack, pattern):
+        occurences = []
+        occurence = haystack.find(pattern)
+        while occurence != -1:
+            occurences.append(occurence)
+            occurence = haystack.find(pattern, occurence + 1)
+        return occurences
+    
+    def find_all(self, haystack, overlapping = False):
+        """Return a dictionary mapping each pattern to the sorted list of offsets at which it occurs.
+        Unless overlapping is set, occurences of a pattern that overlap its previous occurence are skipped."""
+        occurences = {}
+        for length, patterns in self._patterns_by_length.items():
+            if length in MultiPatternSearch.WORD_SIZES:
+                offsets, words = MultiPatternSearch._find_words(haystack, patterns, length)
+                dtype = words.dtype
+                for pattern in patterns:
+                    word = numpy.frombuffer(pattern, dtype=dtype)[0]
+                    occurences[pattern] = offsets[words == word].tolist()
+            else:
+                for pattern in patterns:
+                    occurences[pattern] = MultiPatternSearch._find_pattern(haystack, pattern)
+        
+        if not overlapping:
+            for pattern, offsets in occurences.items():
+                kept = []
+                next_allowed = 0
+                for offset in offsets:
+                    if offset >= next_allowed:
+                        kept.append(offset)
+                        next_allowed = offset + len(pattern)
+                occurences[pattern] = kept
+                
+        return occurences
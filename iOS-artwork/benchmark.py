@@ -0,0 +1,257 @@
+#!/usr/bin/env python
+
+#-------------------------------------------------------------------------------
+#
+# iOS .artwork file extractor
+# (c)2008-2011 Dave Peck <code [at] davepeck [dot] org> All Rights Reserved
+#
+# Released under the three-clause BSD license.
+#
+# http://github.com/davepeck/iphone-tidbits/
+#
+#-------------------------------------------------------------------------------
+
+# benchmark.py
+#
+# Times the expensive parts of the tool against synthetic files, so that no
+# iOS SDK is needed. The .artwork files are filled with random pixels laid out
+# exactly as a supported_artwork_files/*.json file says, and the Mach-O files
+# are small UIKit look-alikes with a big symbol table.
+#
+# Run it as:
+#
+#   ./benchmark.py -o results.json
+#
+# and compare two runs (say, before and after a change) with:
+#
+#   ./benchmark.py -o new.json --compare old.json
+#
+# Every timing is the best of a few runs. See ./benchmark.py --help for the
+# other options.
+
+import os
+import sys
+import json
+import shutil
+import platform
+import tempfile
+import subprocess
+import multiprocessing
+from timeit import default_timer
+from optparse import OptionParser
+
+from artwork.artwork_file import ArtworkBinaryFile, WritableArtworkBinaryFile
+from artwork.binary_file import BinaryFile
+from artwork.catalog import get_default_catalog
+from artwork.fixtures import write_artwork_file, build_macho, write_file
+from artwork.macho_file import MachOBinaryFile
+from artwork.util import clone_file
+
+def script_directory():
+    return os.path.dirname(os.path.realpath(__file__))
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd = script_directory(), stderr = open(os.devnull, "w")).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+class Benchmark(object):
+    """Collects timings. Each one is recorded with its best, and all, run times in seconds."""
+
+    def __init__(self, repeat):
+        super(Benchmark, self).__init__()
+        self.repeat = repeat
+        self.results = []
+
+    def time(self, name, function, setup = None, jobs = None, **extra):
+        """Time function() self.repeat times, calling setup() (untimed) before each run."""
+        runs = []
+        for run_i in range(self.repeat):
+            if setup is not None:
+                setup()
+            start = default_timer()
+            function()
+            runs.append(default_timer() - start)
+        result = {"name": name, "jobs": jobs, "seconds": min(runs), "runs": runs}
+        result.update(extra)
+        self.results.append(result)
+        print "\t%-40s %10.4f s" % (result_label(result), result["seconds"])
+        return result
+
+def result_label(result):
+    if result["jobs"] is None:
+        return result["name"]
+    return "%s (-j %d)" % (result["name"], result["jobs"])
+
+def pick_set_info(catalog, name):
+    """The largest supported artwork file with the given basename."""
+    keys = [key for key in catalog.keys() if key[0] == name]
+    if len(keys) == 0:
+        return None
+    return catalog.get_set_info(*max(keys, key = lambda key: key[1]))
+
+#-------------------------------------------------------------------------------
+# The benchmarks
+#-------------------------------------------------------------------------------
+
+def benchmark_artwork(benchmark, set_info, work_directory):
+    template_directory = os.path.join(work_directory, "template")
+    artwork_file_name = os.path.join(work_directory, set_info.name)
+    template_file_name = os.path.join(template_directory, set_info.name)
+    os.mkdir(template_directory)
+
+    benchmark.time("generate artwork fixture", lambda: write_artwork_file(set_info, artwork_file_name, seed = 0))
+    write_artwork_file(set_info, template_file_name, seed = 1)
+
+    image_infos = list(set_info.iter_images())
+    artwork_binary = ArtworkBinaryFile(artwork_file_name)
+    pixel_count = sum(image_info.width * image_info.height for image_info in image_infos)
+
+    def decode_all():
+        for image_info in image_infos:
+            artwork_binary.get_pil_image(image_info.width, image_info.height, image_info.offset)
+    benchmark.time("get_pil_image", decode_all, images = len(image_infos), pixels = pixel_count)
+
+    pil_images = [artwork_binary.get_pil_image(image_info.width, image_info.height, image_info.offset) for image_info in image_infos]
+    write_file_name = os.path.join(work_directory, "write.artwork")
+    writable = []
+    def setup_write():
+        # A fresh copy of the other fixture, so that every image really is written.
+        if writable:
+            writable.pop().delete()
+        clone_file(template_file_name, write_file_name)
+        writable.append(WritableArtworkBinaryFile(write_file_name))
+        writable[0].open()
+    def write_all():
+        for image_info, pil_image in zip(image_infos, pil_images):
+            writable[0].write_pil_image(image_info.width, image_info.height, image_info.offset, pil_image)
+    benchmark.time("write_pil_image", write_all, setup_write, images = len(image_infos), pixels = pixel_count)
+    writable.pop().delete()
+
+    binary = BinaryFile(artwork_file_name)
+    benchmark.time("find_all (2 byte pattern)", lambda: binary.find_all(b"\xff\x00"), bytes = binary.data_length)
+    patterns = [os.urandom(4) for pattern_i in range(16)]
+    benchmark.time("find_all_of (16 patterns)", lambda: binary.find_all_of(patterns), bytes = binary.data_length)
+
+    return (artwork_file_name, template_file_name)
+
+def benchmark_macho(benchmark, set_infos, work_directory, symbol_count):
+    for is_64_bit in (False, True):
+        bits = 64 if is_64_bit else 32
+        macho_file_name = os.path.join(work_directory, "UIKit%d" % bits)
+        write_file(macho_file_name, build_macho(set_infos, set_infos, is_64_bit, filler_symbol_count = symbol_count))
+        names = ["_filler_function_%d" % symbol_i for symbol_i in range(0, symbol_count, max(1, symbol_count // 1000))]
+
+        def remove_cache():
+            macho_binary = MachOBinaryFile(macho_file_name)
+            for cache_file_name in (macho_binary.symbol_cache_file_name, macho_binary.header_cache_file_name):
+                if os.path.exists(cache_file_name):
+                    os.remove(cache_file_name)
+        benchmark.time("find_symbol, first (%d-bit)" % bits, lambda: MachOBinaryFile(macho_file_name).find_symbol(names[0]), remove_cache, symbols = symbol_count)
+        benchmark.time("find_symbol, first, cached (%d-bit)" % bits, lambda: MachOBinaryFile(macho_file_name).find_symbol(names[0]), symbols = symbol_count)
+        macho_binary = MachOBinaryFile(macho_file_name)
+        macho_binary.find_symbol(names[0])
+        def find_each():
+            for name in names:
+                macho_binary.find_symbol(name)
+        benchmark.time("find_symbol x %d (%d-bit)" % (len(names), bits), find_each, symbols = symbol_count)
+        benchmark.time("find_all in Mach-O (%d-bit)" % bits, lambda: BinaryFile(macho_file_name).find_all(b"_filler_function_1"), bytes = os.path.getsize(macho_file_name))
+
+def benchmark_commands(benchmark, artwork_file_name, template_file_name, work_directory, max_jobs):
+    tool = [sys.executable, os.path.join(script_directory(), "iOS-artwork.py")]
+    export_directory = os.path.join(work_directory, "export")
+    create_file_name = os.path.join(work_directory, "created.artwork")
+    quiet = open(os.devnull, "w")
+
+    def run(arguments):
+        subprocess.check_call(tool + arguments, stdout = quiet)
+    def clear_export_directory():
+        if os.path.exists(export_directory):
+            shutil.rmtree(export_directory)
+        os.mkdir(export_directory)
+    def remove_create_file():
+        if os.path.exists(create_file_name):
+            os.remove(create_file_name)
+
+    for jobs in range(1, max_jobs + 1):
+        benchmark.time("export", lambda: run(["export", "-a", artwork_file_name, "-d", export_directory, "-j", str(jobs)]), clear_export_directory, jobs = jobs)
+    for jobs in range(1, max_jobs + 1):
+        # Import the images exported from one fixture into a copy of the other, so every image is written.
+        benchmark.time("create", lambda: run(["create", "-a", template_file_name, "-d", export_directory, "-c", create_file_name, "-j", str(jobs)]), remove_create_file, jobs = jobs)
+    remove_create_file()
+
+def compare(results, baseline_file_name):
+    f = open(baseline_file_name, "r")
+    baseline = json.loads(f.read())
+    f.close()
+    baseline_seconds = dict((result_label(result), result["seconds"]) for result in baseline["results"])
+
+    print "\nCompared with %s (revision %s):" % (baseline_file_name, baseline.get("revision"))
+    for setting in ("artwork", "symbol_count", "python", "platform"):
+        if baseline.get(setting) != results.get(setting):
+            print "\t(Careful: the %s differs, so the timings may not be comparable.)" % setting.replace("_", " ")
+    for result in results["results"]:
+        label = result_label(result)
+        if label in baseline_seconds:
+            print "\t%-40s %10.4f s -> %10.4f s  (%.2fx)" % (label, baseline_seconds[label], result["seconds"], baseline_seconds[label] / max(result["seconds"], 1e-9))
+
+def main(argv):
+    parser = OptionParser(usage = "%prog [options]")
+    parser.add_option("-o", "--output", dest="output_file_name", help="Write the results to this JSON file.", default = None)
+    parser.add_option("--compare", dest="baseline_file_name", help="Compare the results with an earlier JSON results file.", default = None)
+    parser.add_option("-a", "--artwork", dest="artwork_name", help="Benchmark the layout of this supported artwork file. (Default is Shared~iphone.artwork.)", default = "Shared~iphone.artwork")
+    parser.add_option("-j", "--jobs", dest="max_jobs", type="int", help="Time export and create with 1 up to this many processes. (Default is the number of CPUs, at most 4.)", default = min(4, multiprocessing.cpu_count()))
+    parser.add_option("-r", "--repeat", dest="repeat", type="int", help="Run each benchmark this many times and keep the best. (Default is 3.)", default = 3)
+    parser.add_option("-s", "--symbols", dest="symbol_count", type="int", help="Give the synthetic Mach-O files this many symbols. (Default is 100000.)", default = 100000)
+    parser.add_option("-w", "--work-directory", dest="work_directory", help="Create the synthetic files here rather than in a temporary directory.", default = None)
+    (options, arguments) = parser.parse_args()
+
+    if (len(arguments) != 0) or (options.max_jobs < 1) or (options.repeat < 1) or (options.symbol_count < 1):
+        parser.print_help()
+        sys.exit(-1)
+
+    catalog = get_default_catalog()
+    set_info = pick_set_info(catalog, options.artwork_name)
+    if set_info is None:
+        print "\nNo supported artwork file is named %s.\n" % options.artwork_name
+        sys.exit(-1)
+
+    if options.work_directory is not None:
+        work_directory = tempfile.mkdtemp(dir = os.path.abspath(options.work_directory))
+    else:
+        work_directory = tempfile.mkdtemp()
+
+    print "\nBenchmarking with the layout of %s version %s (%d images, %d bytes)..." % (set_info.name, set_info.version, set_info.image_count, set_info.byte_size)
+    benchmark = Benchmark(options.repeat)
+    try:
+        artwork_file_name, template_file_name = benchmark_artwork(benchmark, set_info, work_directory)
+        macho_set_infos = [catalog.get_set_info(*key) for key in catalog.keys()[0:2]]
+        benchmark_macho(benchmark, macho_set_infos, work_directory, options.symbol_count)
+        benchmark_commands(benchmark, artwork_file_name, template_file_name, work_directory, options.max_jobs)
+    finally:
+        shutil.rmtree(work_directory, ignore_errors = True)
+
+    results = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": multiprocessing.cpu_count(),
+        "artwork": {"name": set_info.name, "version": set_info.version, "byte_size": set_info.byte_size, "image_count": set_info.image_count},
+        "repeat": options.repeat,
+        "symbol_count": options.symbol_count,
+        "results": benchmark.results,
+    }
+    if options.output_file_name is not None:
+        f = open(options.output_file_name, "w")
+        f.write(json.dumps(results, indent = 4, sort_keys = True))
+        f.close()
+        print "\nWrote the results to %s" % options.output_file_name
+
+    if options.baseline_file_name is not None:
+        compare(results, options.baseline_file_name)
+
+    print "\nDONE BENCHMARKING!"
+
+if __name__ == "__main__":
+    main(sys.argv)
@@ -22,7 +22,25 @@
 #
 # More generally, use:
 #
-#   ./generate-from-macho-binary.py <macho-binary-file> <output-directory-file> <ios-version-number>
+#   ./generate-from-macho-binary.py <macho-binary-file> <output-directory-file> <ios-version-number> [<arch>]
+#
+# Universal (fat) binaries can be used as they are. By default the first
+# architecture in the file is read; pass e.g. armv7 or i386 to pick another
+# one. Only 32-bit slices can be read for now: the layout of the 64-bit
+# artwork tables hasn't been checked against a real UIKit.
+#
+# To regenerate everything at once, give the output directory with -o and
+# then any number of binary and version pairs, and spread them over several
+# processes with -j:
+#
+#   ./generate-from-macho-binary.py -o /output/directory/ -j 4 /path/to/4.1/UIKit 4.1.0 /path/to/4.2/UIKit 4.2.1
+#
+# or list them, one "<macho-binary-file> <ios-version-number> [<arch>]" per
+# line, in a file:
+#
+#   ./generate-from-macho-binary.py -o /output/directory/ -j 4 --list binaries.txt
+#
+# The time each binary took is reported at the end.
 #
 # In general, you shouldn't have to run this. I'll run it when new versions of the
 # OS show up. 
@@ -30,51 +48,85 @@
 # This code works by reading the mach-o header and symbol table from the UIKit
 # binary, and then looking for special unexported symbols known to reference
 # the names and size/offset information.  To use it, you must have the python
-# macholib and PIL installed.
+# macholib and PIL installed. The headers and symbol table of each binary are
+# cached next to it (in .headers and .symbols files), so running it again on
+# the same binaries is quick.
 
 import os
 import sys
-import json
-
-from artwork.uikit_file import UIKitBinaryFile
-        
-def process_artwork_set(artwork_set, uikit_directory_name, output_directory_name, version_string):
-    """Generate a json file for a single artwork set found in the mach-o binary."""
-    print "Found artwork set named %s" % artwork_set.name
+from timeit import default_timer
+from optparse import OptionParser
 
-    images_jsonable = []
-    for artwork_name, artwork_size in artwork_set.iter_artworks():
-        images_jsonable.append((artwork_name, artwork_size.width, artwork_size.height, artwork_size.offset))
+from artwork.generator import generate_from_binary
+from artwork.jobs import run_jobs
 
-    artwork_set_file_name = os.path.join(uikit_directory_name, "%s.artwork" % artwork_set.name)
-    artwork_set_file_size = os.path.getsize(artwork_set_file_name)
-
-    full_jsonable = {
-        "name": os.path.basename(artwork_set_file_name),
-        "version": version_string,
-        "byte_size": artwork_set_file_size,
-        "images": images_jsonable,
-    }
-    full_json = json.dumps(full_jsonable, indent = 4)
-    
-    images_file_name = os.path.join(output_directory_name, "%s.artwork-%d.json" % (artwork_set.name, artwork_set_file_size))
-    images_file = open(images_file_name, "w")
-    images_file.write(full_json)
-    images_file.close()
+def read_binary_list(list_file_name):
+    """Read "<macho-binary-file> <ios-version-number> [<arch>]" lines, skipping blank lines and # comments."""
+    binaries = []
+    f = open(list_file_name, "r")
+    for line in f:
+        fields = line.split("#", 1)[0].split()
+        if len(fields) == 0:
+            continue
+        if len(fields) not in (2, 3):
+            raise ValueError("Can't understand the line %r of %s" % (line.strip(), list_file_name))
+        binaries.append((fields[0], fields[1], fields[2] if len(fields) == 3 else None))
+    f.close()
+    return binaries
 
 def main():
     """Read command line options and extract image information. Currently only supports the UIKit binary."""
-    uikit_file_name = os.path.abspath(sys.argv[1])
-    uikit_directory_name = os.path.dirname(uikit_file_name)
-    uikit = UIKitBinaryFile(uikit_file_name)
+    parser = OptionParser(usage = """%prog <macho-binary-file> <output-directory> <ios-version-number> [<arch>]
+       %prog -o <output-directory> [-j jobs] [--arch arch] [--list binaries.txt] [<macho-binary-file> <ios-version-number> ...]""")
+    parser.add_option("-o", "--output", dest="output_directory_name", help="Write the JSON files to this directory, and read binary and version pairs from the arguments.", default = None)
+    parser.add_option("-l", "--list", dest="list_file_name", help="Also read binaries from this file, one \"binary version [arch]\" per line.", default = None)
+    parser.add_option("--arch", dest="arch", help="Read this architecture of every binary that doesn't name its own.", default = None)
+    parser.add_option("-j", "--jobs", dest="jobs", type="int", help="Process this many binaries at once. (Default is 1.)", default = 1)
+    (options, arguments) = parser.parse_args()
+    
+    if options.output_directory_name is None:
+        # The original form: one binary, then the output directory and the version.
+        if (len(arguments) not in (3, 4)) or (options.list_file_name is not None):
+            parser.print_help()
+            sys.exit(-1)
+        binaries = [(arguments[0], arguments[2], arguments[3] if len(arguments) > 3 else options.arch)]
+        output_directory_name = arguments[1]
+    else:
+        if len(arguments) % 2 != 0:
+            parser.print_help()
+            sys.exit(-1)
+        binaries = [(arguments[i], arguments[i + 1], options.arch) for i in range(0, len(arguments), 2)]
+        if options.list_file_name is not None:
+            binaries += [(binary, version, arch or options.arch) for binary, version, arch in read_binary_list(options.list_file_name)]
+        output_directory_name = options.output_directory_name
+    
+    if (len(binaries) == 0) or (options.jobs < 1):
+        parser.print_help()
+        sys.exit(-1)
+    
+    output_directory_name = os.path.abspath(output_directory_name)
+    tasks = [(os.path.abspath(binary), version, arch, output_directory_name) for binary, version, arch in binaries]
+    
+    start = default_timer()
+    failures = 0
+    reports = []
+    for uikit_file_name, version_string, written, timings, error in run_jobs(generate_from_binary, tasks, min(options.jobs, len(tasks))):
+        print "%s (%s):" % (uikit_file_name, version_string)
+        for images_file_name, image_count in written:
+            print "\twrote %s (%d images)" % (images_file_name, image_count)
+        if error is not None:
+            print "\tFAILED: %s" % error
+            failures += 1
+        reports.append((uikit_file_name, version_string, timings))
     
-    output_directory_name = os.path.abspath(sys.argv[2])
-    version_string = sys.argv[3]
+    print "\nTook %.3f s:" % (default_timer() - start)
+    for uikit_file_name, version_string, timings in reports:
+        breakdown = ", ".join("%s %.3f s" % timing for timing in timings)
+        print "\t%8.3f s  %s (%s)  (%s)" % (sum(seconds for stage, seconds in timings), uikit_file_name, version_string, breakdown)
     
-    for artwork_set in uikit.iter_shared_iphone_image_sets():
-        process_artwork_set(artwork_set, uikit_directory_name, output_directory_name, version_string)
-    for artwork_set in uikit.iter_shared_ipad_image_sets():
-        process_artwork_set(artwork_set, uikit_directory_name, output_directory_name, version_string)
+    if failures != 0:
+        print "\nFAIL. %d of %d binaries could not be read." % (failures, len(tasks))
+        sys.exit(-1)
     
 if __name__ == "__main__":
     main()
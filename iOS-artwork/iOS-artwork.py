@@ -14,8 +14,8 @@
 # iOS-artwork.py
 #
 # This script makes it easy to extract images from the .artwork files found
-# in the iOS SDK. To use it, you must have python and the Python Imaging Libraries
-# (PIL) installed.
+# in the iOS SDK. To use it, you must have python, numpy and the Python Imaging
+# Libraries (PIL) installed.
 #
 # Run it as:
 #
@@ -30,132 +30,492 @@
 import os
 import sys
 import json
+import zipfile
+import itertools
 from optparse import OptionParser
 
-import PIL.Image
-
 from artwork.artwork_file import ArtworkBinaryFile, WritableArtworkBinaryFile
+from artwork.catalog import get_default_catalog
+from artwork.manifest import ExportManifest, artwork_identity
+from artwork.archive import ArchiveWriter
+from artwork.dedup import ContentStore, DedupManifest
+from artwork.bundle import diff_artwork, write_bundle, apply_bundle, bundle_target
+from artwork.infer import closest_set_info, infer_layout
+from artwork.atlas import pack_atlases, render_atlas
+from artwork.formats import FORMATS, DEFAULT_FORMAT, is_format_available, export_name, scaled_export_name
+from artwork.server import ServedArtworkSet, ArtworkServer
+from artwork.stats import Stats
+from artwork.jobs import run_jobs, init_export_worker, export_image, export_scaled_image, encode_image, init_batch_export_worker, batch_export_image, init_create_worker, import_image, split_overlapping
     
-COMMANDS = ["export", "create"]
-
-class ArtworkInfo(object):
-    def __init__(self, jsonable):
-        super(ArtworkInfo, self).__init__()
-        self.name = jsonable[0]
-        self.width = jsonable[1]
-        self.height = jsonable[2]
-        self.offset = jsonable[3]
-
-class ArtworkSetInfo(object):
-    def __init__(self, jsonable):
-        super(ArtworkSetInfo, self).__init__()
-        self.name = jsonable["name"]
-        self.version = jsonable["version"]
-        self.byte_size = jsonable["byte_size"]
-        self.images = jsonable["images"]
-        
-    @property
-    def image_count(self):
-        return len(self.images)
-        
-    def iter_images(self):
-        for jsonable in self.images:
-            yield ArtworkInfo(jsonable)
+COMMANDS = ["export", "export-all", "create", "diff", "patch", "infer", "serve"]
 
 def usage(parser):
     parser.print_help()
     sys.exit(-1)
 
-def bail(message):
-    print "\n%s\n" % message
+def bail(message, out = None):
+    print >>(out or sys.stdout), "\n%s\n" % message
     sys.exit(-1)
 
-def script_directory():
-    return os.path.dirname(os.path.realpath(__file__))
-
-def supported_artwork_files_directory():
-    return os.path.join(script_directory(), "supported_artwork_files")
-
-def supported_artwork_json_file_name(artwork_file_name):
-    artwork_file_size = os.path.getsize(artwork_file_name)
-    artwork_file_basename = os.path.basename(artwork_file_name)
-    return os.path.join(supported_artwork_files_directory(), "%s-%d.json" % (artwork_file_basename, artwork_file_size))
-
 def is_artwork_file_supported(artwork_file_name):
-    supported_artwork = supported_artwork_json_file_name(artwork_file_name)
-    return os.path.exists(supported_artwork)
+    return get_default_catalog().find(artwork_file_name) is not None
 
 def get_artwork_set_info(artwork_file_name):
-    f = open(supported_artwork_json_file_name(artwork_file_name), "r")
-    jsonable = json.loads(f.read())
-    f.close()
-    return ArtworkSetInfo(jsonable)
+    return get_default_catalog().find(artwork_file_name)
 
-def file_extension(file_name):
-    return os.path.splitext(file_name)[1][1:]
-    
-def action_export(artwork_file_name, directory):
+def action_export(artwork_file_name, directory, jobs, incremental, image_format, compress_level, stats = None, dedup = False, scales = None, compact = False):
     set_info = get_artwork_set_info(artwork_file_name)
-    artwork_binary = ArtworkBinaryFile(artwork_file_name)
     
     print "\nExporting %d images from %s (version %s)..." % (set_info.image_count, set_info.name, set_info.version)
     
+    image_infos = list(set_info.iter_images())
+    
+    if scales is not None:
+        failures = export_scaled(artwork_file_name, set_info, directory, jobs, scales, image_format, compress_level, stats, compact)
+        if failures != 0:
+            bail("FAIL. %d of %d images could not be exported." % (failures, set_info.image_count))
+        print "\nDONE EXPORTING!"
+        return
+    
+    if dedup:
+        occurrences = [(artwork_file_name, image_info, os.path.join(directory, export_name(image_info.name, image_format))) for image_info in image_infos]
+        failures = export_deduplicated(occurrences, directory, jobs, image_format, compress_level, stats, compact)
+        if failures != 0:
+            bail("FAIL. %d of %d images could not be exported." % (failures, set_info.image_count))
+        print "\nDONE EXPORTING!"
+        return
+    
+    #
+    # With --incremental, skip the images whose exported files are up to date
+    #
+    if incremental:
+        if stats is not None:
+            start = stats.start()
+        artwork_binary = ArtworkBinaryFile(artwork_file_name)
+        artwork = artwork_identity(artwork_file_name, set_info)
+        options = {"format": image_format, "compress_level": compress_level, "compact": compact}
+        manifest = ExportManifest.load(directory)
+        if (manifest.options is not None) and (manifest.options != options):
+            # Written with other settings; every image has to be exported again.
+            manifest.images = {}
+        stale_image_infos = [image_info for image_info in image_infos if not manifest.is_current(artwork_binary, image_info, os.path.join(directory, export_name(image_info.name, image_format)), artwork)]
+        if stats is not None:
+            stats.record("check manifest", start)
+        print "\t%d images are already up to date." % (len(image_infos) - len(stale_image_infos))
+        image_infos_by_name = dict((image_info.name, image_info) for image_info in image_infos)
+        image_infos = stale_image_infos
+    
+    tasks = [(image_info.name, image_info.width, image_info.height, image_info.offset, os.path.join(directory, export_name(image_info.name, image_format))) for image_info in image_infos]
+    
+    failures = 0
+    for name, export_file_name, error, image_stats in run_jobs(export_image, tasks, jobs, init_export_worker, (artwork_file_name, image_format, compress_level, stats is not None, compact)):
+        if image_stats is not None:
+            stats.add_image(image_stats)
+        if error is None:
+            print "\texported %s" % export_file_name
+            if incremental:
+                manifest.record(artwork_binary, image_infos_by_name[name], export_file_name)
+        else:
+            print "\tFAILED to export %s: %s" % (export_file_name, error)
+            failures += 1
+            if incremental:
+                manifest.forget(name)
+    
+    if incremental:
+        manifest.artwork = artwork
+        manifest.options = options
+        manifest.images = dict((name, entry) for name, entry in manifest.images.items() if name in image_infos_by_name)
+        manifest.save()
+    
+    if failures != 0:
+        bail("FAIL. %d of %d images could not be exported." % (failures, set_info.image_count))
+        
+    print "\nDONE EXPORTING!"
+    
+def export_scaled(artwork_file_name, set_info, directory, jobs, scales, image_format, compress_level, stats = None, compact = False):
+    """Export every image of set_info at each of scales, decoding it only once. The files
+    are named after the pixels per point of each scale, following the @2x convention:
+    at scale 0.5, an @2x artwork file's images come out at 1x. Returns the failure count."""
+    tasks = []
     for image_info in set_info.iter_images():
-        pil_image = artwork_binary.get_pil_image(image_info.width, image_info.height, image_info.offset)
-        export_file_name = os.path.join(directory, image_info.name)
-        pil_image.save(export_file_name, file_extension(export_file_name))
-        print "\texported %s" % export_file_name
+        scaled_export_file_names = [(scale, os.path.join(directory, scaled_export_name(image_info.name, image_format, set_info.pixels_per_point * scale))) for scale in scales]
+        tasks.append((image_info.name, image_info.width, image_info.height, image_info.offset, scaled_export_file_names))
+    
+    failures = 0
+    for name, export_file_names, error, image_stats in run_jobs(export_scaled_image, tasks, jobs, init_export_worker, (artwork_file_name, image_format, compress_level, stats is not None, compact)):
+        if image_stats is not None:
+            stats.add_image(image_stats)
+        if error is None:
+            for export_file_name in export_file_names:
+                print "\texported %s" % export_file_name
+        else:
+            print "\tFAILED to export %s: %s" % (", ".join(export_file_names), error)
+            failures += 1
+    return failures
+    
+def export_deduplicated(occurrences, directory, jobs, image_format, compress_level, stats = None, compact = False):
+    """Export occurrences, a list of (artwork_file_name, image_info, export_file_name), into
+    directory. Each image's pixels are hashed straight from its artwork file; only the first
+    image with a given digest is decoded and encoded, into a content-addressed store below
+    directory, and every image is then hardlinked to its stored copy. Returns the number of
+    images that could not be exported."""
+    store = ContentStore(os.path.join(directory, ContentStore.DIRECTORY_NAME), image_format, compress_level, compact)
+    manifest = DedupManifest.load(directory)
+    
+    if stats is not None:
+        start = stats.start()
+    artwork_binaries = {}
+    digests = []
+    distinct = {}
+    bytes_read = 0
+    for artwork_file_name, image_info, export_file_name in occurrences:
+        artwork_binary = artwork_binaries.get(artwork_file_name)
+        if artwork_binary is None:
+            artwork_binary = artwork_binaries[artwork_file_name] = ArtworkBinaryFile(artwork_file_name)
+        digest = artwork_binary.get_image_digest(image_info.width, image_info.height, image_info.offset)
+        digests.append(digest)
+        distinct.setdefault(digest, (artwork_file_name, image_info))
+        bytes_read += 4 * image_info.width * image_info.height
+    if stats is not None:
+        stats.record("hash", start, bytes_read = bytes_read, pixels = bytes_read // 4)
+    
+    tasks = []
+    digests_by_temporary_file_name = {}
+    for digest, (artwork_file_name, image_info) in distinct.items():
+        if not store.has(digest):
+            temporary_file_name = store.temporary_file_name(digest)
+            digests_by_temporary_file_name[temporary_file_name] = digest
+            tasks.append((artwork_file_name, image_info.name, image_info.width, image_info.height, image_info.offset, temporary_file_name))
+    tasks.sort(key = lambda task: task[2] * task[3], reverse = True)
+    
+    print "\n\t%d images, %d of them distinct, %d of those already stored." % (len(occurrences), len(distinct), len(distinct) - len(tasks))
+    
+    failed_digests = set()
+    for artwork_file_name, name, temporary_file_name, error, image_stats in run_jobs(batch_export_image, tasks, jobs, init_batch_export_worker, (image_format, compress_level, stats is not None, compact)):
+        if image_stats is not None:
+            stats.add_image(image_stats)
+        digest = digests_by_temporary_file_name[temporary_file_name]
+        if error is None:
+            store.add(digest, temporary_file_name)
+        else:
+            print "\tFAILED to export %s from %s: %s" % (name, artwork_file_name, error)
+            failed_digests.add(digest)
+            if os.path.exists(temporary_file_name):
+                os.remove(temporary_file_name)
+    
+    if stats is not None:
+        start = stats.start()
+    failures = 0
+    for (artwork_file_name, image_info, export_file_name), digest in zip(occurrences, digests):
+        if digest in failed_digests:
+            failures += 1
+            continue
+        linked = store.link(digest, export_file_name)
+        manifest.record(export_file_name, store.object_file_name(digest), linked)
+        if linked:
+            print "\texported %s" % export_file_name
+        else:
+            print "\trecorded %s (the filesystem can't hardlink it)" % export_file_name
+    manifest.save()
+    if stats is not None:
+        stats.record("link", start)
+    
+    return failures
+    
+def action_export_archive(artwork_file_name, archive_file_name, jobs, image_format, compress_level, stats = None, compact = False):
+    set_info = get_artwork_set_info(artwork_file_name)
+    archive = ArchiveWriter(archive_file_name)
+    
+    # When the archive goes to stdout, progress has to go somewhere else.
+    out = sys.stderr if archive.is_stdout else sys.stdout
+    
+    print >>out, "\nExporting %d images from %s (version %s) into %s..." % (set_info.image_count, set_info.name, set_info.version, archive_file_name)
+    
+    tasks = [(export_name(image_info.name, image_format), image_info.width, image_info.height, image_info.offset) for image_info in set_info.iter_images()]
+    
+    failures = 0
+    for name, data, error, image_stats in run_jobs(encode_image, tasks, jobs, init_export_worker, (artwork_file_name, image_format, compress_level, stats is not None, compact)):
+        if image_stats is not None:
+            stats.add_image(image_stats)
+        if error is None:
+            if stats is not None:
+                start = stats.start()
+            archive.add(name, data)
+            if stats is not None:
+                stats.record("write archive", start, bytes_written = len(data))
+            print >>out, "\texported %s" % name
+        else:
+            print >>out, "\tFAILED to export %s: %s" % (name, error)
+            failures += 1
+    
+    archive.close()
+    
+    if failures != 0:
+        bail("FAIL. %d of %d images could not be exported." % (failures, set_info.image_count), out)
         
+    print >>out, "\nDONE EXPORTING!"
+    
+def action_export_atlas(artwork_file_name, directory):
+    set_info = get_artwork_set_info(artwork_file_name)
+    artwork_binary = ArtworkBinaryFile(artwork_file_name)
+    
+    print "\nPacking %d images from %s (version %s) into texture atlases..." % (set_info.image_count, set_info.name, set_info.version)
+    
+    image_infos_by_name = dict((image_info.name, image_info) for image_info in set_info.iter_images())
+    atlases = pack_atlases(image_infos_by_name.values())
+    
+    base_name = os.path.splitext(set_info.name)[0]
+    index = {"name": set_info.name, "version": set_info.version, "atlases": []}
+    for atlas_i, atlas in enumerate(atlases):
+        atlas_file_name = "%s-atlas-%d.png" % (base_name, atlas_i)
+        pil_image = render_atlas(artwork_binary, atlas, image_infos_by_name)
+        pil_image.save(os.path.join(directory, atlas_file_name), "png")
+        index["atlases"].append(atlas.jsonable(atlas_file_name))
+        print "\texported %s (%d x %d, %d images)" % (atlas_file_name, atlas.width, atlas.height, len(atlas.placements))
+    
+    index_file_name = os.path.join(directory, "%s-atlas.json" % base_name)
+    f = open(index_file_name, "w")
+    f.write(json.dumps(index, indent = 4))
+    f.close()
+    print "\texported %s" % index_file_name
+    
     print "\nDONE EXPORTING!"
     
-def action_create(artwork_file_name, directory, create_file_name):
+def find_artwork_files(sdk_root):
+    """Walk sdk_root, returning the (artwork_file_name, set_info) of every supported
+    .artwork file, and the names of the unsupported ones, in a stable order."""
+    supported = []
+    unsupported = []
+    for directory, directory_names, file_names in os.walk(sdk_root):
+        directory_names.sort()
+        for file_name in sorted(file_names):
+            if not file_name.endswith(".artwork"):
+                continue
+            artwork_file_name = os.path.join(directory, file_name)
+            set_info = get_artwork_set_info(artwork_file_name)
+            if set_info is None:
+                unsupported.append(artwork_file_name)
+            else:
+                supported.append((artwork_file_name, set_info))
+    return (supported, unsupported)
+    
+def export_all_images(occurrences, jobs, image_format, compress_level, stats = None, compact = False):
+    """Export occurrences, a list of (artwork_file_name, image_info, export_file_name), biggest
+    images first, so that the slowest ones don't end up alone at the end of the run. Returns
+    the number of images that could not be exported."""
+    tasks = [(artwork_file_name, image_info.name, image_info.width, image_info.height, image_info.offset, export_file_name) for artwork_file_name, image_info, export_file_name in occurrences]
+    tasks.sort(key = lambda task: task[2] * task[3], reverse = True)
+    
+    failures = 0
+    for artwork_file_name, name, export_file_name, error, image_stats in run_jobs(batch_export_image, tasks, jobs, init_batch_export_worker, (image_format, compress_level, stats is not None, compact)):
+        if image_stats is not None:
+            stats.add_image(image_stats)
+        if error is None:
+            print "\texported %s" % export_file_name
+        else:
+            print "\tFAILED to export %s: %s" % (export_file_name, error)
+            failures += 1
+    return failures
+    
+def action_export_all(sdk_root, out_directory, jobs, image_format, compress_level, stats = None, dedup = False, compact = False):
+    print "\nLooking for artwork files in %s..." % sdk_root
+    if stats is not None:
+        start = stats.start()
+    supported, unsupported = find_artwork_files(sdk_root)
+    if stats is not None:
+        stats.record("find artwork", start)
+    
+    #
+    # Every image of every file goes into one pool.
+    #
+    occurrences = []
+    for artwork_file_name, set_info in supported:
+        directory = os.path.join(out_directory, os.path.splitext(os.path.relpath(artwork_file_name, sdk_root))[0])
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        print "\t%s: %d images from %s (version %s) into %s" % (artwork_file_name, set_info.image_count, set_info.name, set_info.version, directory)
+        for image_info in set_info.iter_images():
+            occurrences.append((artwork_file_name, image_info, os.path.join(directory, export_name(image_info.name, image_format))))
+    
+    print "\nExporting %d images from %d artwork files..." % (len(occurrences), len(supported))
+    
+    if dedup:
+        failures = export_deduplicated(occurrences, out_directory, jobs, image_format, compress_level, stats, compact)
+    else:
+        failures = export_all_images(occurrences, jobs, image_format, compress_level, stats, compact)
+    
+    if len(unsupported) != 0:
+        print "\nSkipped %d artwork files that are not currently supported:\n\t%s" % (len(unsupported), "\n\t".join(unsupported))
+    
+    if failures != 0:
+        bail("FAIL. %d of %d images could not be exported." % (failures, len(occurrences)))
+    
+    print "\nDONE EXPORTING!"
+    
+def action_create(artwork_file_name, directory, create_file_name, jobs, stats = None):
     set_info = get_artwork_set_info(artwork_file_name)
     artwork_binary = ArtworkBinaryFile(artwork_file_name)
     create_binary = WritableArtworkBinaryFile(create_file_name, artwork_binary)
+    if stats is not None:
+        start = stats.start()
     create_binary.open()
+    if stats is not None:
+        stats.record("copy template", start, bytes_written = create_binary.data_length)
     
     print "\nCreating a new file named %s by importing %d images...\n\t(Using %s version %s as a template.)" % (create_file_name, set_info.image_count, set_info.name, set_info.version)
     
-    for image_info in set_info.iter_images():
-        #
-        # Grab the image from disk
-        #
-        pil_image_name = os.path.join(directory, image_info.name)
-        if not os.path.exists(pil_image_name):
-            create_binary.delete()
-            bail("FAIL. An image named %s was not found in directory %s" % (image_info.name, directory))
-            
-        #
-        # Validate the image
-        #
-        try:
-            pil_image = PIL.Image.open(pil_image_name)
-        except IOError:
-            create_binary.delete()
-            bail("FAIL. The image file named %s was invalid or could not be read." % pil_image_name)
-        
-        actual_width, actual_height = pil_image.size
-        if (actual_width != image_info.width) or (actual_height != image_info.height):
-            create_binary.delete()
-            bail("FAIL. The image file named %s should be %d x %d in size, but is actually %d x %d." % (pil_image_name, image_info.width, image_info.height, actual_width, actual_height))
-        
-        try:
-            if (pil_image.mode != 'RGBA') and (pil_image.mode != 'RGB'):
-                pil_image = pil_image.convert('RGBA')
-        except:
-            create_binary.delete()
-            bail("FAIL. The image file named %s could not be converted to a usable format." % pil_image_name)
-        
-        #
-        # Write it
-        #
-        create_binary.write_pil_image(image_info.width, image_info.height, image_info.offset, pil_image)
-        print "\timported %s" % image_info.name
+    #
+    # The new file starts out as a copy of the template. If the import directory is an
+    # incremental export of that same template, its untouched images are already in place.
+    #
+    image_infos = list(set_info.iter_images())
+    if stats is not None:
+        start = stats.start()
+    manifest = ExportManifest.load(directory)
+    if manifest.artwork is not None:
+        artwork = artwork_identity(artwork_file_name, set_info)
+        image_infos = [image_info for image_info in image_infos if not manifest.is_current(artwork_binary, image_info, os.path.join(directory, image_info.name), artwork)]
+    if stats is not None:
+        stats.record("check manifest", start)
+    unchanged = set_info.image_count - len(image_infos)
+    
+    #
+    # Read, validate and write every other image, collecting all the problems. Images
+    # that share bytes with others are written last, one at a time in catalog order,
+    # so that the result doesn't depend on which worker finishes first.
+    #
+    independent_image_infos, overlapping_image_infos = split_overlapping(image_infos)
+    results = []
+    for pass_image_infos, pass_jobs in [(independent_image_infos, jobs), (overlapping_image_infos, 1)]:
+        tasks = [(image_info.name, image_info.width, image_info.height, image_info.offset, os.path.join(directory, image_info.name)) for image_info in pass_image_infos]
+        if len(tasks) != 0:
+            results = itertools.chain(results, run_jobs(import_image, tasks, pass_jobs, init_create_worker, (create_file_name, stats is not None)))
+    
+    errors = []
+    for name, error, written, image_stats in results:
+        if image_stats is not None:
+            stats.add_image(image_stats)
+        if error is not None:
+            print "\tFAILED to import %s" % name
+            errors.append(error)
+        elif written:
+            print "\timported %s" % name
+        else:
+            unchanged += 1
     
+    if len(errors) != 0:
+        create_binary.delete()
+        bail("FAIL. %d of %d images could not be imported:\n\n\t%s" % (len(errors), set_info.image_count, "\n\t".join(errors)))
+    
+    if stats is not None:
+        start = stats.start()
     create_binary.close()
+    if stats is not None:
+        stats.record("flush", start)
     
+    print "\n\t%d images were identical to the template and were left as they are." % unchanged
     print "\nDONE CREATING!"
     
+def action_diff(artwork_file_name, to_artwork_file_name, bundle_file_name):
+    set_info = get_artwork_set_info(artwork_file_name)
+    to_set_info = get_artwork_set_info(to_artwork_file_name)
+    artwork_binary = ArtworkBinaryFile(artwork_file_name)
+    to_artwork_binary = ArtworkBinaryFile(to_artwork_file_name)
+    
+    print "\nComparing %d images from %s (version %s) with %d images from %s (version %s)..." % (set_info.image_count, set_info.name, set_info.version, to_set_info.image_count, to_set_info.name, to_set_info.version)
+    
+    diff = diff_artwork(artwork_binary, set_info, to_artwork_binary, to_set_info)
+    for image_info in diff.changed:
+        print "\tchanged %s" % image_info.name
+    for image_info in diff.added:
+        print "\tadded %s" % image_info.name
+    for name in diff.removed:
+        print "\tremoved %s" % name
+    print "\n\t%d images changed, %d were added, %d were removed and %d are unchanged." % (len(diff.changed), len(diff.added), len(diff.removed), diff.unchanged_count)
+    
+    if bundle_file_name is not None:
+        write_bundle(bundle_file_name, diff, artwork_binary, to_artwork_binary)
+        print "\tWrote the %d changed and added images to %s" % (len(diff.changed) + len(diff.added), bundle_file_name)
+    
+    print "\nDONE DIFFING!"
+    
+def action_patch(artwork_file_name, bundle_file_name, create_file_name):
+    set_info = get_artwork_set_info(artwork_file_name)
+    
+    try:
+        to_name, to_byte_size = bundle_target(bundle_file_name)
+    except (ValueError, IOError, zipfile.BadZipfile), e:
+        bail("Sorry, but %s can't be read: %s" % (bundle_file_name, e))
+    to_set_info = get_default_catalog().get_set_info(to_name, to_byte_size)
+    if to_set_info is None:
+        bail("Sorry, but the bundle makes a %s of %d bytes, which is not currently supported by this software." % (to_name, to_byte_size))
+    
+    print "\nCreating a new file named %s by patching %s (version %s) into %s (version %s)..." % (create_file_name, set_info.name, set_info.version, to_set_info.name, to_set_info.version)
+    
+    try:
+        manifest = apply_bundle(bundle_file_name, artwork_file_name, set_info, to_set_info, create_file_name)
+    except (ValueError, KeyError, zipfile.BadZipfile), e:
+        bail("FAIL. The bundle could not be applied: %s" % e)
+    
+    print "\t%d images were written from the bundle, %d were removed." % (len(manifest["images"]), len(manifest["removed"]))
+    print "\nDONE PATCHING!"
+    
+def action_infer(artwork_file_name, directory, version):
+    basename = os.path.basename(artwork_file_name)
+    byte_size = os.path.getsize(artwork_file_name)
+    reference_set_info = closest_set_info(get_default_catalog(), basename, byte_size)
+    if reference_set_info is None:
+        bail("Sorry, but no supported artwork file is named %s, so there is nothing to infer its layout from." % basename)
+    
+    print "\nInferring the layout of %s (%d bytes) from %s version %s (%d bytes, %d images)..." % (artwork_file_name, byte_size, reference_set_info.name, reference_set_info.version, reference_set_info.byte_size, reference_set_info.image_count)
+    
+    layout = infer_layout(ArtworkBinaryFile(artwork_file_name), reference_set_info, version)
+    for name in layout.missing:
+        print "\tmissing %s" % name
+    for names, offsets in layout.unresolved:
+        print "\tunresolved %s at offsets %s" % (", ".join(names), ", ".join(str(offset) for offset in offsets))
+    for offset, length in layout.unknown_blocks:
+        print "\tunknown %d bytes at offset %d" % (length, offset)
+    unresolved_count = sum(len(names) for names, offsets in layout.unresolved)
+    print "\n\t%d of %d images were placed, %d are missing, %d are unresolved and %d blocks are unknown." % (layout.set_info.image_count, reference_set_info.image_count, len(layout.missing), unresolved_count, len(layout.unknown_blocks))
+    
+    json_file_name = layout.save_json(directory)
+    print "\tWrote the proposed layout to %s" % json_file_name
+    if layout.unresolved:
+        print "\tThe unresolved images are the same size and could be in any order; add the ones that are there by hand."
+    if layout.unknown_blocks:
+        print "\tThe unknown blocks are probably new or resized images; add them by hand."
+    print "\tCheck it (export with it, and look at the images) before copying it into supported_artwork_files."
+    
+    print "\nDONE INFERRING!"
+    
+def action_serve(directory, host, port, jobs, compress_level):
+    artwork_sets = []
+    for file_name in sorted(os.listdir(directory)):
+        artwork_file_name = os.path.join(directory, file_name)
+        if not file_name.endswith(".artwork"):
+            continue
+        set_info = get_artwork_set_info(artwork_file_name)
+        if set_info is None:
+            print "\tskipping %s, which is not currently supported" % file_name
+            continue
+        artwork_sets.append(ServedArtworkSet(artwork_file_name, set_info))
+        print "\tserving %s (%s version %s, %d images)" % (file_name, set_info.name, set_info.version, set_info.image_count)
+    
+    if len(artwork_sets) == 0:
+        bail("No supported artwork files were found in %s." % directory)
+    
+    server = ArtworkServer((host, port), artwork_sets, jobs, compress_level)
+    print "\nServing on http://%s:%d/ (press Ctrl-C to stop)..." % (host, server.server_port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    
+    print "\nDONE SERVING!"
+    
 def main(argv):
     #
     # Set up command-line options parser
@@ -164,24 +524,134 @@ def main(argv):
 
     export 
         -a artwork_file.artwork 
-        -d export_directory
+        -d export_directory | --archive archive_file
+        [-j jobs]
+        [--incremental | --dedup | --scales scale,...]
+        [--format png|webp|raw]
+        [--compress-level 0-9]
+        [--compact]
+        [--stats] [--stats-json stats_file.json]
     
         Exports the contents of artwork_file.artwork as a set
-        of images in the export_directory
+        of images in the export_directory, optionally using
+        several processes at once. Images are PNG files unless
+        another --format is given; raw files hold the stored
+        premultiplied BGRA pixels behind a small header. The
+        --compress-level trades export speed (0) for smaller
+        files (9). Images are saved as RGBA unless --compact
+        is given; then opaque images are saved as RGB (or L
+        if grayscale) and grayscale images as LA. With
+        --incremental, images that are unchanged since the
+        last incremental export to export_directory are
+        skipped. With --archive, the
+        images are written into a single .zip or .tar file
+        instead (use - to write a tar stream to stdout.) With
+        --atlas, the images are packed into a few large sprite
+        sheets, described by a JSON index. With --dedup, images
+        with identical pixels are encoded only once, into a
+        store in export_directory, and hardlinked from there.
+        With --scales (such as 1,0.5), every image is also
+        exported resized by each scale, from the same decoded
+        pixels, and named following the @2x convention.
+    
+    export-all
+        --sdk-root sdk_directory
+        --out export_directory
+        [-j jobs]
+        [--dedup]
+        [--format png|webp|raw]
+        [--compress-level 0-9]
+        [--compact]
+        [--stats] [--stats-json stats_file.json]
+        
+        Exports every supported artwork file found anywhere in
+        sdk_directory, each into its own directory below
+        export_directory (mirroring where it was found), in a
+        single run that shares its processes between all the
+        files. Unsupported artwork files are listed at the end.
     
     create  
         -a original_artwork_file.artwork 
         -d import_directory 
         -c created_artwork_file.artwork
+        [-j jobs]
+        [--stats] [--stats-json stats_file.json]
          
         Imports the images found in import_directory into a new
         artwork file named created_artwork_file.artwork. Uses
         the original file for sizing and other information, but
         never writes to the original file.
+    
+        For both commands, --stats prints how long each stage
+        (reading pixels, converting them, encoding, writing...)
+        took, and which images were slowest; --stats-json
+        writes the same numbers, per image, to a JSON file.
+    
+    diff
+        -a artwork_file.artwork
+        --to other_artwork_file.artwork
+        [--bundle bundle_file.zip]
+        
+        Pairs the images of two artwork files (typically the
+        same file from two iOS versions) by name, and lists
+        the ones that were changed, added or removed. With
+        --bundle, the pixels of the changed and added images
+        are saved in a patch bundle.
+    
+    patch
+        -a artwork_file.artwork
+        --bundle bundle_file.zip
+        -c created_artwork_file.artwork
+        
+        Applies a patch bundle made by diff to the artwork file
+        it was made from, creating a copy of the other artwork
+        file named created_artwork_file.artwork.
+    
+    infer
+        -a unsupported_artwork_file.artwork
+        -d json_directory
+        [--ios-version version]
+        
+        Guesses where the images of the closest supported
+        artwork file with the same name are in an artwork file
+        that is not supported (typically one from a newer
+        point release), and writes the proposed layout to a
+        JSON file in json_directory. Images that weren't found,
+        images of the same size whose order is unresolved, and
+        blocks that no image explains, are listed.
+    
+    serve
+        -d artwork_directory
+        [--host host] [--port port]
+        [-j jobs]
+        [--compress-level 0-9]
+        
+        Serves the images of every supported artwork file in
+        artwork_directory over HTTP, at /<artwork file>/<image>,
+        encoding them on demand. Ask for <image>.png, .webp or
+        .raw to choose the format.
     """)
     parser.add_option("-a", "--artwork", dest="artwork_file_name", help="Specify the input artwork file name. (Read-only.)", default = None)
     parser.add_option("-d", "--directory", dest="directory", help="Specify the directory to export images to/import images from.", default = None)
     parser.add_option("-c", "--create", dest="create_file_name", help="Specify the output artwork file name. (Write-only.)", default = None)
+    parser.add_option("--sdk-root", dest="sdk_root", help="Specify the directory to search for artwork files to export. (export-all only.)", default = None)
+    parser.add_option("--out", dest="out_directory", help="Specify the directory to export all artwork files to. (export-all only.)", default = None)
+    parser.add_option("--to", dest="to_artwork_file_name", help="Specify the artwork file to compare with. (diff only.)", default = None)
+    parser.add_option("--bundle", dest="bundle_file_name", help="Specify the patch bundle to write (diff) or apply (patch.)", default = None)
+    parser.add_option("--ios-version", dest="ios_version", help="Specify the iOS version to record in the inferred layout. (infer only.)", default = None)
+    parser.add_option("--archive", dest="archive_file_name", help="Export into a .zip or .tar archive, or - for a tar stream on stdout.", default = None)
+    parser.add_option("--atlas", dest="atlas", action="store_true", help="Export texture atlases and a JSON index instead of one image per file.", default = False)
+    parser.add_option("-i", "--incremental", dest="incremental", action="store_true", help="Only export images that changed since the last incremental export.", default = False)
+    parser.add_option("--dedup", dest="dedup", action="store_true", help="Encode each distinct image only once, and hardlink the others to it.", default = False)
+    parser.add_option("--scales", dest="scales", help="Export each image at every one of these comma-separated scales, such as 1,0.5. (export only.)", default = None)
+    parser.add_option("--format", dest="image_format", choices=FORMATS, help="Specify the export format: png, webp or raw. (Default is png.)", default = DEFAULT_FORMAT)
+    parser.add_option("--compact", dest="compact", action="store_true", help="Save opaque images as RGB (or L), and grayscale ones as LA, instead of RGBA.", default = False)
+    parser.add_option("--compress-level", dest="compress_level", type="int", help="Specify the png or webp compression effort, from 0 (fastest) to 9 (smallest.)", default = None)
+    parser.add_option("--host", dest="host", help="Specify the address to serve on. (Default is 127.0.0.1.)", default = "127.0.0.1")
+    parser.add_option("--port", dest="port", type="int", help="Specify the port to serve on. (Default is 8000.)", default = 8000)
+    parser.add_option("-j", "--jobs", dest="jobs", type="int", help="Specify the number of processes to use. (Default is 1.)", default = 1)
+    parser.add_option("--stats", dest="stats", action="store_true", help="Print timings for each stage and the slowest images.", default = False)
+    parser.add_option("--stats-json", dest="stats_json_file_name", help="Write timings for each stage and image to a JSON file.", default = None)
 
     #
     # Parse
@@ -191,40 +661,164 @@ def main(argv):
     #
     # Validate
     #
-    if (len(arguments) != 1) or (options.artwork_file_name is None) or (options.directory is None):
+    if len(arguments) != 1:
         usage(parser)
         
     command = arguments[0].lower()
     if command not in COMMANDS:
         usage(parser)
         
-    if (command == "create") and (options.create_file_name is None):
+    if (command in ["export", "create", "diff", "patch", "infer"]) != (options.artwork_file_name is not None):
         usage(parser)
         
-    abs_artwork_file_name = os.path.abspath(options.artwork_file_name)
+    if (command == "diff") != (options.to_artwork_file_name is not None):
+        usage(parser)
+        
+    if (options.bundle_file_name is not None) and (command not in ["diff", "patch"]):
+        usage(parser)
+        
+    if (options.ios_version is not None) and (command != "infer"):
+        usage(parser)
+        
+    if command in ["diff", "patch"]:
+        if (options.directory is not None) or ((command == "patch") and (options.bundle_file_name is None)):
+            usage(parser)
+    elif command == "export-all":
+        if (options.sdk_root is None) or (options.out_directory is None) or (options.directory is not None) or options.incremental or options.atlas or (options.archive_file_name is not None):
+            usage(parser)
+    elif (options.sdk_root is not None) or (options.out_directory is not None):
+        usage(parser)
+    elif (command == "export") and (options.archive_file_name is not None):
+        if (options.directory is not None) or options.incremental or not ArchiveWriter.is_supported(options.archive_file_name):
+            usage(parser)
+    elif options.directory is None:
+        usage(parser)
+        
+    if options.atlas and ((command != "export") or options.incremental or (options.archive_file_name is not None)):
+        usage(parser)
+        
+    if options.dedup and ((command not in ["export", "export-all"]) or options.incremental or options.atlas or (options.archive_file_name is not None)):
+        usage(parser)
+        
+    scales = None
+    if options.scales is not None:
+        try:
+            scales = [float(scale) for scale in options.scales.split(",")]
+        except ValueError:
+            usage(parser)
+        if (command != "export") or options.incremental or options.dedup or options.atlas or (options.archive_file_name is not None):
+            usage(parser)
+        if any(scale <= 0 for scale in scales) or (len(set(scales)) != len(scales)):
+            usage(parser)
+        
+    if (command in ["create", "patch"]) != (options.create_file_name is not None):
+        usage(parser)
+        
+    if (options.image_format != DEFAULT_FORMAT) and ((command not in ["export", "export-all"]) or options.atlas):
+        usage(parser)
+        
+    if options.compact and ((command not in ["export", "export-all"]) or options.atlas or (options.image_format == "raw")):
+        usage(parser)
+        
+    if (options.compress_level is not None) and ((command in ["create", "diff", "patch", "infer"]) or not (0 <= options.compress_level <= 9)):
+        usage(parser)
+        
+    if options.jobs < 1:
+        usage(parser)
+        
+    collect_stats = options.stats or (options.stats_json_file_name is not None)
+    if collect_stats and ((command in ["diff", "patch", "infer", "serve"]) or options.atlas):
+        usage(parser)
+        
+    if not is_format_available(options.image_format):
+        bail("Sorry, but your Python Imaging Library can't write %s images." % options.image_format)
+        
+    stats = Stats() if collect_stats else None
     
-    if not os.path.exists(abs_artwork_file_name):
-        bail("No artwork file named %s was found." % options.artwork_file_name)
+    if options.artwork_file_name is not None:
+        abs_artwork_file_name = os.path.abspath(options.artwork_file_name)
         
-    if not is_artwork_file_supported(abs_artwork_file_name):
-        bail("Sorry, but the artwork file %s is not currently supported by this software." % options.artwork_file_name)
+        if not os.path.exists(abs_artwork_file_name):
+            bail("No artwork file named %s was found." % options.artwork_file_name)
+            
+        if stats is not None:
+            start = stats.start()
+        supported = is_artwork_file_supported(abs_artwork_file_name)
+        if stats is not None:
+            stats.record("catalog", start)
+        if (command == "infer") and supported:
+            bail("The artwork file %s is already supported by this software; there is nothing to infer." % options.artwork_file_name)
+        if (command != "infer") and not supported:
+            bail("Sorry, but the artwork file %s is not currently supported by this software. (The infer command can propose a layout for it.)" % options.artwork_file_name)
     
-    abs_directory = os.path.abspath(options.directory)
+    if options.directory is not None:
+        abs_directory = os.path.abspath(options.directory)
+        
+        if not os.path.exists(abs_directory):
+            bail("No directory named %s was found." % options.directory)
+    
+    if command == "export-all":
+        abs_sdk_root = os.path.abspath(options.sdk_root)
+        abs_out_directory = os.path.abspath(options.out_directory)
+        for directory in [options.sdk_root, options.out_directory]:
+            if not os.path.isdir(directory):
+                bail("No directory named %s was found." % directory)
+    
+    if command == "diff":
+        abs_to_artwork_file_name = os.path.abspath(options.to_artwork_file_name)
+        
+        if not os.path.exists(abs_to_artwork_file_name):
+            bail("No artwork file named %s was found." % options.to_artwork_file_name)
+            
+        if not is_artwork_file_supported(abs_to_artwork_file_name):
+            bail("Sorry, but the artwork file %s is not currently supported by this software." % options.to_artwork_file_name)
+    
+    if options.bundle_file_name is not None:
+        abs_bundle_file_name = os.path.abspath(options.bundle_file_name)
+        
+        if (command == "patch") and not os.path.exists(abs_bundle_file_name):
+            bail("No bundle file named %s was found." % options.bundle_file_name)
+    else:
+        abs_bundle_file_name = None
+    
+    if command in ["create", "patch"]:
+        abs_create_file_name = os.path.abspath(options.create_file_name)
+        if os.path.exists(abs_create_file_name):
+            bail("Sorry, but the create file %s already exists." % options.create_file_name)
     
-    if not os.path.exists(abs_directory):
-        bail("No directory named %s was found." % options.directory)
-
     #
     # Execute
     #
 
-    if command == "export":
-        action_export(abs_artwork_file_name, abs_directory)
-    elif command == "create":
-        abs_create_file_name = os.path.abspath(options.create_file_name)
-        if os.path.exists(abs_create_file_name):
-            bail("Sorry, but the create file %s already exists." % options.create_file_name)
-        action_create(abs_artwork_file_name, abs_directory, abs_create_file_name)
+    try:
+        if (command == "export") and (options.archive_file_name is not None):
+            abs_archive_file_name = options.archive_file_name
+            if abs_archive_file_name != "-":
+                abs_archive_file_name = os.path.abspath(abs_archive_file_name)
+            action_export_archive(abs_artwork_file_name, abs_archive_file_name, options.jobs, options.image_format, options.compress_level, stats, options.compact)
+        elif command == "export-all":
+            action_export_all(abs_sdk_root, abs_out_directory, options.jobs, options.image_format, options.compress_level, stats, options.dedup, options.compact)
+        elif command == "serve":
+            action_serve(abs_directory, options.host, options.port, options.jobs, options.compress_level)
+        elif (command == "export") and options.atlas:
+            action_export_atlas(abs_artwork_file_name, abs_directory)
+        elif command == "export":
+            action_export(abs_artwork_file_name, abs_directory, options.jobs, options.incremental, options.image_format, options.compress_level, stats, options.dedup, scales, options.compact)
+        elif command == "create":
+            action_create(abs_artwork_file_name, abs_directory, abs_create_file_name, options.jobs, stats)
+        elif command == "diff":
+            action_diff(abs_artwork_file_name, abs_to_artwork_file_name, abs_bundle_file_name)
+        elif command == "patch":
+            action_patch(abs_artwork_file_name, abs_bundle_file_name, abs_create_file_name)
+        elif command == "infer":
+            action_infer(abs_artwork_file_name, abs_directory, options.ios_version)
+    finally:
+        # Even a failed run is worth timing.
+        if stats is not None:
+            if options.stats:
+                stats.print_summary(sys.stderr if options.archive_file_name == "-" else sys.stdout)
+            if options.stats_json_file_name is not None:
+                stats.save_json(options.stats_json_file_name)
             
 if __name__ == "__main__":
     main(sys.argv)
@@ -0,0 +1,170 @@
+#-------------------------------------------------------------------------------
+#
+# iOS .artwork file extractor
+# (c)2008-2011 Dave Peck <code [at] davepeck [dot] org> All Rights Reserved
+#
+# Released under the three-clause BSD license.
+#
+# http://github.com/davepeck/iphone-tidbits/
+#
+#-------------------------------------------------------------------------------
+
+import os
+import shutil
+import struct
+import tempfile
+import unittest
+
+import numpy
+import PIL.Image
+
+from artwork.artwork_file import ArtworkBinaryFile, WritableArtworkBinaryFile
+
+#-------------------------------------------------------------------------------
+# The vectorized decoder and encoder must give exactly what the original
+# per-pixel loops gave, for every (alpha, color) pair.
+#-------------------------------------------------------------------------------
+
+WIDTH = 13 # Rows are padded to 16 pixels.
+PADDING_BYTE = 0xEE
+
+def every_pair():
+    """(alpha, color) columns holding all 65536 pairs."""
+    pairs = numpy.arange(256 * 256)
+    return (pairs >> 8, pairs & 0xFF)
+
+def scalar_get_pil_image(data, width, height, offset):
+    """The original get_pil_image loop."""
+    pil_image = PIL.Image.new("RGBA", (width, height))
+    pil_pixels = pil_image.load()
+    aligned_width = ArtworkBinaryFile._align(width)
+    for y in range(height):
+        for x in range(width):
+            b, g, r, a = struct.unpack_from('<BBBB', data, offset + (4 * ((y * aligned_width) + x)))
+            if a != 0:
+                r = (r*255 + a//2)//a
+                g = (g*255 + a//2)//a
+                b = (b*255 + a//2)//a
+            pil_pixels[x, y] = (r, g, b, a)
+    return pil_image
+
+def scalar_premultiplied_bytes(pil_image):
+    """The pixels the original write_pil_image loop wrote, without row padding."""
+    pil_pixels = pil_image.load()
+    width, height = pil_image.size
+    packed = []
+    for y in range(height):
+        for x in range(width):
+            if pil_image.mode == 'RGBA':
+                r, g, b, a = pil_pixels[x, y]
+                packed.append(struct.pack('<BBBB', (b*a + 127)//255, (g*a + 127)//255, (r*a + 127)//255, a))
+            else:
+                r, g, b = pil_pixels[x, y]
+                packed.append(struct.pack('<BBBB', b, g, r, 255))
+    return b"".join(packed)
+
+
+class TestScalarEquivalence(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        alpha, color = every_pair()
+        self.height = -(-len(alpha) // WIDTH)
+        pixel_count = WIDTH * self.height
+        # Each channel sees every pair, shifted so that swapped channels would show.
+        self.alpha = numpy.resize(alpha, pixel_count).astype(numpy.uint8)
+        self.color = numpy.resize(color, pixel_count).astype(numpy.uint8)
+        self.aligned_width = ArtworkBinaryFile._align(WIDTH)
+        self.file_name = os.path.join(self.directory, "test.artwork")
+        f = open(self.file_name, "wb")
+        f.write(chr(PADDING_BYTE) * (4 * self.aligned_width * self.height))
+        f.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def channels(self):
+        return [self.color, self.color + numpy.uint8(85), self.color + numpy.uint8(170)]
+
+    def write_bgra(self, bgra):
+        artwork_binary = WritableArtworkBinaryFile(self.file_name)
+        artwork_binary.open()
+        artwork_binary._get_bgra_array(WIDTH, self.height, 0)[...] = bgra
+        artwork_binary.close()
+
+    def test_get_pil_image(self):
+        bgra = numpy.empty((self.height, WIDTH, 4), dtype=numpy.uint8)
+        for channel, values in enumerate(self.channels()):
+            bgra[:, :, channel] = values.reshape(self.height, WIDTH)
+        bgra[:, :, 3] = self.alpha.reshape(self.height, WIDTH)
+        self.write_bgra(bgra)
+
+        artwork_binary = ArtworkBinaryFile(self.file_name)
+        expected = scalar_get_pil_image(artwork_binary.data, WIDTH, self.height, 0)
+        actual = artwork_binary.get_pil_image(WIDTH, self.height, 0)
+        self.assertEqual(actual.mode, "RGBA")
+        self.assertEqual(actual.tobytes(), expected.tobytes())
+
+    def check_write_pil_image(self, pil_image):
+        template_binary = ArtworkBinaryFile(self.file_name)
+        create_file_name = os.path.join(self.directory, "created.artwork")
+        create_binary = WritableArtworkBinaryFile(create_file_name, template_binary)
+        create_binary.open()
+        create_binary.write_pil_image(WIDTH, self.height, 0, pil_image)
+        create_binary.close()
+
+        created = numpy.fromfile(create_file_name, dtype=numpy.uint8).reshape(self.height, self.aligned_width * 4)
+        self.assertEqual(created[:, 0:WIDTH * 4].tostring(), scalar_premultiplied_bytes(pil_image))
+        self.assertTrue((created[:, WIDTH * 4:] == PADDING_BYTE).all())
+
+    def test_write_rgba_pil_image(self):
+        rgba = numpy.empty((self.height, WIDTH, 4), dtype=numpy.uint8)
+        for channel, values in enumerate(self.channels()):
+            rgba[:, :, channel] = values.reshape(self.height, WIDTH)
+        rgba[:, :, 3] = self.alpha.reshape(self.height, WIDTH)
+        self.check_write_pil_image(PIL.Image.fromarray(rgba, "RGBA"))
+
+    def test_write_rgb_pil_image(self):
+        rgb = numpy.empty((self.height, WIDTH, 3), dtype=numpy.uint8)
+        for channel, values in enumerate(self.channels()):
+            rgb[:, :, channel] = values.reshape(self.height, WIDTH)
+        self.check_write_pil_image(PIL.Image.fromarray(rgb, "RGB"))
+
+
+class TestCompactImages(unittest.TestCase):
+    """Compact images must hold the same pixels as the RGBA ones."""
+
+    def check_compact(self, bgra, mode):
+        expected = ArtworkBinaryFile.pil_image_from_bgra(bgra)
+        actual = ArtworkBinaryFile.compact_pil_image_from_bgra(bgra)
+        self.assertEqual(actual.mode, mode)
+        self.assertEqual(actual.convert("RGBA").tobytes(), expected.tobytes())
+
+    def bgra(self, alpha, colors):
+        bgra = numpy.empty((len(alpha), 1, 4), dtype=numpy.uint8)
+        for channel, values in enumerate(colors):
+            bgra[:, 0, channel] = values
+        bgra[:, 0, 3] = alpha
+        return bgra
+
+    def test_grayscale_with_alpha(self):
+        alpha, color = every_pair()
+        color = numpy.minimum(color, alpha) # Premultiplied colors never exceed alpha.
+        self.check_compact(self.bgra(alpha, [color] * 3), "LA")
+
+    def test_color_with_alpha(self):
+        alpha, color = every_pair()
+        color = numpy.minimum(color, alpha)
+        self.check_compact(self.bgra(alpha, [color, color // 2, color]), "RGBA")
+
+    def test_opaque_grayscale(self):
+        color = numpy.arange(256)
+        self.check_compact(self.bgra(numpy.full(256, 255), [color] * 3), "L")
+
+    def test_opaque_color(self):
+        color = numpy.arange(256)
+        self.check_compact(self.bgra(numpy.full(256, 255), [color, 255 - color, color // 3]), "RGB")
+
+
+if __name__ == "__main__":
+    unittest.main()
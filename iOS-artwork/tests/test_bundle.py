@@ -0,0 +1,155 @@
+#-------------------------------------------------------------------------------
+#
+# iOS .artwork file extractor
+# (c)2008-2011 Dave Peck <code [at] davepeck [dot] org> All Rights Reserved
+#
+# Released under the three-clause BSD license.
+#
+# http://github.com/davepeck/iphone-tidbits/
+#
+#-------------------------------------------------------------------------------
+
+import os
+import shutil
+import zipfile
+import tempfile
+import unittest
+
+import numpy
+
+from artwork.artwork_file import ArtworkBinaryFile, WritableArtworkBinaryFile
+from artwork.bundle import diff_artwork, write_bundle, apply_bundle, bundle_target, gap_runs, PIXELS_DIRECTORY
+from artwork.catalog import ArtworkSetInfo, get_default_catalog
+from artwork.fixtures import write_artwork_file, random_premultiplied_bgra
+
+
+class TestPatchBundles(unittest.TestCase):
+    """Applying a bundle must give back the file it was made to, byte for byte."""
+
+    @classmethod
+    def setUpClass(cls):
+        catalog = get_default_catalog()
+        cls.set_info = catalog.get_set_info(u"Shared~iphone.artwork", 19529344)
+        cls.to_set_info = catalog.get_set_info(u"Shared~iphone.artwork", 34798848)
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file_name = self.file_name_in("old")
+        write_artwork_file(self.set_info, self.file_name)
+        self.random = numpy.random.RandomState(3)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def file_name_in(self, subdirectory):
+        os.mkdir(os.path.join(self.directory, subdirectory))
+        return os.path.join(self.directory, subdirectory, "Shared~iphone.artwork")
+
+    def read(self, file_name):
+        f = open(file_name, "rb")
+        contents = f.read()
+        f.close()
+        return contents
+
+    def change_images(self, file_name, image_infos):
+        artwork_binary = WritableArtworkBinaryFile(file_name)
+        artwork_binary.open()
+        for image_info in image_infos:
+            artwork_binary._get_bgra_array(image_info.width, image_info.height, image_info.offset)[...] = random_premultiplied_bgra(self.random, image_info.width, image_info.height)
+        artwork_binary.close()
+
+    def make_bundle(self, to_file_name, to_set_info):
+        bundle_file_name = os.path.join(self.directory, "patch.zip")
+        diff = diff_artwork(ArtworkBinaryFile(self.file_name), self.set_info, ArtworkBinaryFile(to_file_name), to_set_info)
+        write_bundle(bundle_file_name, diff, ArtworkBinaryFile(self.file_name), ArtworkBinaryFile(to_file_name))
+        self.assertEqual(bundle_target(bundle_file_name), (to_set_info.name, to_set_info.byte_size))
+        return (bundle_file_name, diff)
+
+    def check_patch(self, to_file_name, to_set_info):
+        bundle_file_name, diff = self.make_bundle(to_file_name, to_set_info)
+        create_file_name = self.file_name_in("created")
+        manifest = apply_bundle(bundle_file_name, self.file_name, self.set_info, to_set_info, create_file_name)
+        self.assertEqual(len(manifest["images"]), len(diff.changed) + len(diff.added))
+        self.assertTrue(self.read(create_file_name) == self.read(to_file_name))
+        return diff
+
+    def test_same_layout(self):
+        to_file_name = self.file_name_in("new")
+        shutil.copyfile(self.file_name, to_file_name)
+        image_infos = list(self.set_info.iter_images())
+        changed = [image_infos[i] for i in (0, 17, 400, len(image_infos) - 1)]
+        self.change_images(to_file_name, changed)
+        # And a byte between the images.
+        offset, length = gap_runs(self.set_info)[0]
+        f = open(to_file_name, "r+b")
+        f.seek(offset)
+        f.write(b"\x01")
+        f.close()
+
+        diff = self.check_patch(to_file_name, self.set_info)
+        self.assertTrue(set(image_info.name for image_info in changed) <= set(image_info.name for image_info in diff.changed))
+        self.assertEqual((diff.added, diff.removed), ([], []))
+
+    def test_cross_layout(self):
+        # The two versions share no image names: every image is added, every old one removed.
+        to_file_name = self.file_name_in("new")
+        write_artwork_file(self.to_set_info, to_file_name, seed = 1)
+        diff = self.check_patch(to_file_name, self.to_set_info)
+        self.assertEqual(len(diff.added), self.to_set_info.image_count)
+        self.assertEqual(diff.removed, self.set_info.names)
+
+    def test_moved_images(self):
+        # A layout two pages longer, with every image two pages further in: the
+        # unchanged images are copied from the old file rather than bundled.
+        shift = 2 * 4096
+        to_set_info = ArtworkSetInfo(self.set_info.name, "moved", self.set_info.byte_size + shift, self.set_info.names,
+            self.set_info.widths, self.set_info.heights, self.set_info.offsets + numpy.uint32(shift))
+        to_file_name = self.file_name_in("new")
+        f = open(to_file_name, "wb")
+        f.write(b"\0" * shift + self.read(self.file_name))
+        f.close()
+        changed = list(to_set_info.iter_images())[20:23]
+        self.change_images(to_file_name, changed)
+
+        diff = self.check_patch(to_file_name, to_set_info)
+        self.assertEqual([image_info.name for image_info in diff.changed], [image_info.name for image_info in changed])
+        self.assertEqual(diff.unchanged_count, self.set_info.image_count - len(changed))
+
+    def test_wrong_base(self):
+        to_file_name = self.file_name_in("new")
+        shutil.copyfile(self.file_name, to_file_name)
+        self.change_images(to_file_name, list(self.set_info.iter_images())[5:8])
+        bundle_file_name, diff = self.make_bundle(to_file_name, self.set_info)
+
+        # Same name and size as the base, but not its contents.
+        other_file_name = self.file_name_in("other")
+        write_artwork_file(self.set_info, other_file_name, seed = 2)
+        create_file_name = self.file_name_in("created")
+        self.assertRaises(ValueError, apply_bundle, bundle_file_name, other_file_name, self.set_info, self.set_info, create_file_name)
+        self.assertFalse(os.path.exists(create_file_name))
+
+    def test_bad_pixels(self):
+        to_file_name = self.file_name_in("new")
+        write_artwork_file(self.to_set_info, to_file_name, seed = 1)
+        bundle_file_name, diff = self.make_bundle(to_file_name, self.to_set_info)
+
+        # Right base, but the result can't match: it must not be left behind.
+        bundle_zip = zipfile.ZipFile(bundle_file_name, "r")
+        contents = [(info, bundle_zip.read(info.filename)) for info in bundle_zip.infolist()]
+        bundle_zip.close()
+        bundle_zip = zipfile.ZipFile(bundle_file_name, "w", zipfile.ZIP_DEFLATED)
+        tampered = False
+        for info, data in contents:
+            if info.filename.startswith(PIXELS_DIRECTORY) and (not tampered) and data:
+                data = chr(ord(data[0]) ^ 1) + data[1:]
+                tampered = True
+            bundle_zip.writestr(info, data)
+        bundle_zip.close()
+
+        create_file_name = self.file_name_in("created")
+        self.assertRaises(ValueError, apply_bundle, bundle_file_name, self.file_name, self.set_info, self.to_set_info, create_file_name)
+        self.assertFalse(os.path.exists(create_file_name))
+
+
+if __name__ == "__main__":
+    unittest.main()
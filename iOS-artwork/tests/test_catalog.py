@@ -0,0 +1,103 @@
+#-------------------------------------------------------------------------------
+#
+# iOS .artwork file extractor
+# (c)2008-2011 Dave Peck <code [at] davepeck [dot] org> All Rights Reserved
+#
+# Released under the three-clause BSD license.
+#
+# http://github.com/davepeck/iphone-tidbits/
+#
+#-------------------------------------------------------------------------------
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from artwork.catalog import ArtworkCatalog, ArtworkSetInfo, supported_artwork_files_directory
+
+
+class TestArtworkCatalog(unittest.TestCase):
+    """The compiled catalog must say exactly what the JSON files say."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.json_directory = os.path.join(self.directory, "supported_artwork_files")
+        shutil.copytree(supported_artwork_files_directory(), self.json_directory)
+        self.catalog_file_name = self.json_directory + ".catalog"
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def json_set_infos(self):
+        set_infos = []
+        for file_name in sorted(os.listdir(self.json_directory)):
+            f = open(os.path.join(self.json_directory, file_name), "r")
+            set_infos.append(ArtworkSetInfo.from_jsonable(json.loads(f.read())))
+            f.close()
+        return set_infos
+
+    def assertSameSetInfo(self, actual, expected):
+        self.assertTrue(actual is not None, expected.name)
+        self.assertEqual((actual.name, actual.version, actual.byte_size, actual.names), (expected.name, expected.version, expected.byte_size, expected.names))
+        for column in ("widths", "heights", "offsets"):
+            self.assertEqual(getattr(actual, column).tolist(), getattr(expected, column).tolist(), (expected.name, column))
+
+    def check_catalog(self, catalog):
+        set_infos = self.json_set_infos()
+        self.assertEqual(catalog.keys(), sorted((set_info.name, set_info.byte_size) for set_info in set_infos))
+        for set_info in set_infos:
+            self.assertSameSetInfo(catalog.get_set_info(set_info.name, set_info.byte_size), set_info)
+
+    def test_compiled_sets_match_json(self):
+        catalog = ArtworkCatalog(self.json_directory, self.catalog_file_name)
+        self.check_catalog(catalog)
+        self.assertTrue(os.path.exists(self.catalog_file_name))
+        self.assertTrue(catalog._data is not None)
+        # And again, from the file that is now on disk.
+        self.check_catalog(ArtworkCatalog(self.json_directory, self.catalog_file_name))
+
+    def test_changed_json_rebuilds(self):
+        ArtworkCatalog(self.json_directory, self.catalog_file_name).open()
+        json_file_name = os.path.join(self.json_directory, sorted(os.listdir(self.json_directory))[0])
+        f = open(json_file_name, "r")
+        jsonable = json.loads(f.read())
+        f.close()
+        jsonable["images"][0][1] += 1
+        f = open(json_file_name, "w")
+        f.write(json.dumps(jsonable))
+        f.close()
+        stat = os.stat(json_file_name)
+        os.utime(json_file_name, (stat.st_atime, stat.st_mtime + 10))
+
+        catalog = ArtworkCatalog(self.json_directory, self.catalog_file_name)
+        set_info = catalog.get_set_info(jsonable["name"], jsonable["byte_size"])
+        self.assertTrue(catalog._data is not None)
+        self.assertSameSetInfo(set_info, ArtworkSetInfo.from_jsonable(jsonable))
+
+    def test_touched_json_rebuilds(self):
+        ArtworkCatalog(self.json_directory, self.catalog_file_name).open()
+        compiled_stat = os.stat(self.catalog_file_name)
+        json_file_name = os.path.join(self.json_directory, sorted(os.listdir(self.json_directory))[-1])
+        stat = os.stat(json_file_name)
+        os.utime(json_file_name, (stat.st_atime, stat.st_mtime + 10))
+        os.utime(self.catalog_file_name, (compiled_stat.st_atime, compiled_stat.st_mtime - 10))
+
+        catalog = ArtworkCatalog(self.json_directory, self.catalog_file_name)
+        catalog.open()
+        self.assertTrue(catalog._data is not None)
+        self.assertNotEqual(os.stat(self.catalog_file_name).st_mtime, compiled_stat.st_mtime - 10)
+        self.check_catalog(catalog)
+
+    def test_unwritable_catalog_falls_back_to_memory(self):
+        catalog_file_name = os.path.join(self.directory, "missing", "supported_artwork_files.catalog")
+        catalog = ArtworkCatalog(self.json_directory, catalog_file_name)
+        self.check_catalog(catalog)
+        self.assertTrue(catalog._data is None)
+        self.assertTrue(catalog._in_memory_sets is not None)
+        self.assertFalse(os.path.exists(os.path.dirname(catalog_file_name)))
+
+
+if __name__ == "__main__":
+    unittest.main()
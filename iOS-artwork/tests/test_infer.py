@@ -0,0 +1,169 @@
+#-------------------------------------------------------------------------------
+#
+# iOS .artwork file extractor
+# (c)2008-2011 Dave Peck <code [at] davepeck [dot] org> All Rights Reserved
+#
+# Released under the three-clause BSD license.
+#
+# http://github.com/davepeck/iphone-tidbits/
+#
+#-------------------------------------------------------------------------------
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy
+
+from artwork.artwork_file import ArtworkBinaryFile
+from artwork.catalog import ArtworkSetInfo, get_default_catalog
+from artwork.fixtures import write_artwork_file
+from artwork.infer import infer_layout
+
+PAGE_SIZE = 4096
+
+def image_offsets(set_info):
+    return dict((image_info.name, (image_info.width, image_info.height, image_info.offset)) for image_info in set_info.iter_images())
+
+
+class TestKnownLayouts(unittest.TestCase):
+    """A file whose images are all where a catalog has them, give or take whole pages,
+    must come back exactly. Shared~iphone has special images, and a large one that
+    shares its bytes with many others."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        cls.set_info = get_default_catalog().get_set_info(u"Shared~iphone.artwork", 19529344)
+        cls.file_name = os.path.join(cls.directory, "Shared~iphone.artwork")
+        write_artwork_file(cls.set_info, cls.file_name)
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory)
+
+    def infer(self, contents):
+        file_name = os.path.join(self.directory, "changed", "Shared~iphone.artwork")
+        if not os.path.exists(os.path.dirname(file_name)):
+            os.mkdir(os.path.dirname(file_name))
+        f = open(file_name, "wb")
+        f.write(contents)
+        f.close()
+        return infer_layout(ArtworkBinaryFile(file_name), self.set_info)
+
+    def contents(self):
+        f = open(self.file_name, "rb")
+        contents = f.read()
+        f.close()
+        return contents
+
+    def check_placed(self, layout, shift):
+        expected = dict((name, (width, height, offset + shift)) for name, (width, height, offset) in image_offsets(self.set_info).iteritems())
+        self.assertEqual(image_offsets(layout.set_info), expected)
+        self.assertEqual(layout.missing, [])
+        self.assertEqual(layout.unresolved, [])
+
+    def test_unchanged(self):
+        layout = infer_layout(ArtworkBinaryFile(self.file_name), self.set_info)
+        self.check_placed(layout, 0)
+        self.assertEqual(layout.unknown_blocks, [])
+        self.assertTrue(layout.is_complete)
+
+    def test_zero_page_appended(self):
+        contents = self.contents()
+        layout = self.infer(contents + "\0" * (4 * PAGE_SIZE))
+        self.check_placed(layout, 0)
+        self.assertEqual(len(layout.unknown_blocks), 1)
+        offset, length = layout.unknown_blocks[0]
+        self.assertEqual(offset + length, len(contents) + 4 * PAGE_SIZE)
+
+    def test_shifted_by_pages(self):
+        layout = self.infer("\0" * (2 * PAGE_SIZE) + self.contents())
+        self.check_placed(layout, 2 * PAGE_SIZE)
+        self.assertEqual(layout.unknown_blocks, [(0, 2 * PAGE_SIZE)])
+
+    def removed_set_info(self, removed):
+        """The reference without the given images, each alone at its offset, and with the
+        pages after each one moved up."""
+        image_infos = sorted(self.set_info.iter_images(), key = lambda image_info: image_info.offset)
+        slots = [next_image_info.offset - image_info.offset for image_info, next_image_info in zip(image_infos, image_infos[1:])] + [self.set_info.byte_size - image_infos[-1].offset]
+        names, widths, heights, offsets = [], [], [], []
+        removed_bytes = 0
+        for image_info, slot in zip(image_infos, slots):
+            if image_info.name in removed:
+                removed_bytes += slot
+                continue
+            names.append(image_info.name)
+            widths.append(image_info.width)
+            heights.append(image_info.height)
+            offsets.append(image_info.offset - removed_bytes)
+        return ArtworkSetInfo(self.set_info.name, "removed", self.set_info.byte_size - removed_bytes, names,
+            numpy.array(widths, dtype=numpy.uint16), numpy.array(heights, dtype=numpy.uint16), numpy.array(offsets, dtype=numpy.uint32))
+
+    def test_removed_from_pinned_runs_are_unresolved(self):
+        # ProgressGear12_White_small to ProgressGear1_Blue_small are 14 images of 14x15, one
+        # page each, and the UISegmentBarDivider images 6 of 1x30; the other three are alone.
+        removed = [u"ProgressGear14_Blue_small.png", u"UISegmentBarDividerHighlightedSilverMail.png",
+            u"UIAlertViewTableDecoration.png", u"UIButtonBarPressedIndicator.png", u"UISearchFieldLeftProgress.png"]
+        changed_set_info = self.removed_set_info(removed)
+        file_name = os.path.join(self.directory, "removed", "Shared~iphone.artwork")
+        os.mkdir(os.path.dirname(file_name))
+        write_artwork_file(changed_set_info, file_name)
+        layout = infer_layout(ArtworkBinaryFile(file_name), self.set_info)
+
+        names_by_offset = [image_info.name for image_info in sorted(self.set_info.iter_images(), key = lambda image_info: image_info.offset)]
+        changed_offsets = image_offsets(changed_set_info)
+        def run(first, last):
+            names = names_by_offset[names_by_offset.index(first):names_by_offset.index(last) + 1]
+            return (names, [changed_offsets[name][2] for name in names if name not in removed])
+        # Which gear or divider is gone can't be told, so none of them is placed.
+        self.assertEqual(layout.unresolved, [
+            run(u"ProgressGear12_White_small.png", u"ProgressGear1_Blue_small.png"),
+            run(u"UISegmentBarDivider.png", u"UISegmentBarDividerSilverMail.png")])
+        unresolved_names = set(name for names, offsets in layout.unresolved for name in names)
+        self.assertEqual(image_offsets(layout.set_info), dict((name, offset) for name, offset in changed_offsets.iteritems() if name not in unresolved_names))
+        self.assertEqual(layout.missing, removed[2:])
+        self.assertEqual(layout.unknown_blocks, [])
+
+
+class TestSameSizeRuns(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def set_info(self, images):
+        """A set whose images, given as (name, width, height), each start a new page."""
+        offsets = []
+        offset = 0
+        for name, width, height in images:
+            offsets.append(offset)
+            offset += -(-4 * height * ArtworkBinaryFile._align(width) // PAGE_SIZE) * PAGE_SIZE
+        return ArtworkSetInfo(u"Test.artwork", "1.0", offset, [name for name, width, height in images],
+            numpy.array([width for name, width, height in images], dtype=numpy.uint16),
+            numpy.array([height for name, width, height in images], dtype=numpy.uint16),
+            numpy.array(offsets, dtype=numpy.uint32))
+
+    def test_removed_from_run_is_unresolved(self):
+        big = [(u"big-%d.png" % i, 40, 30) for i in range(3)]
+        small = [(u"small-%d.png" % i, 10, 10) for i in range(3)]
+        reference_set_info = self.set_info(big + small + [(u"last.png", 50, 20)])
+        changed_set_info = self.set_info(big + small[1:] + [(u"last.png", 50, 20)])
+        file_name = os.path.join(self.directory, "Test.artwork")
+        write_artwork_file(changed_set_info, file_name)
+
+        layout = infer_layout(ArtworkBinaryFile(file_name), reference_set_info)
+        changed_offsets = image_offsets(changed_set_info)
+        # Which of the three small images is gone can't be told.
+        self.assertEqual(layout.unresolved, [([name for name, width, height in small], [changed_offsets[u"small-1.png"][2], changed_offsets[u"small-2.png"][2]])])
+        self.assertEqual(image_offsets(layout.set_info), dict((name, changed_offsets[name]) for name in [u"big-0.png", u"big-1.png", u"big-2.png", u"last.png"]))
+        self.assertEqual(layout.missing, [])
+        self.assertEqual(layout.unknown_blocks, [])
+        self.assertFalse(layout.is_complete)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+#-------------------------------------------------------------------------------
+#
+# iOS .artwork file extractor
+# (c)2008-2011 Dave Peck <code [at] davepeck [dot] org> All Rights Reserved
+#
+# Released under the three-clause BSD license.
+#
+# http://github.com/davepeck/iphone-tidbits/
+#
+#-------------------------------------------------------------------------------
+
+import unittest
+
+from artwork.catalog import ArtworkInfo
+from artwork.jobs import run_jobs, split_overlapping, WINDOW_PER_JOB
+
+
+class TestRunJobs(unittest.TestCase):
+
+    def test_results_in_order_with_bounded_window(self):
+        jobs = 3
+        pulled = [0]
+        def tasks():
+            for i in range(100):
+                pulled[0] += 1
+                yield -i
+        results = []
+        for result in run_jobs(abs, tasks(), jobs):
+            # Only a window of tasks may be handed out ahead of the results.
+            self.assertTrue(pulled[0] - len(results) <= WINDOW_PER_JOB * jobs + 1)
+            results.append(result)
+        self.assertEqual(results, range(100))
+
+
+class TestSplitOverlapping(unittest.TestCase):
+
+    def test_split_overlapping(self):
+        image_infos = [
+            ArtworkInfo(["a.png", 16, 16, 0]),        # bytes 0 - 1024
+            ArtworkInfo(["big.png", 32, 32, 4099]),   # bytes 4099 - 8195, over the next two
+            ArtworkInfo(["b.png", 4, 4, 1024]),       # touches a.png, but doesn't overlap it
+            ArtworkInfo(["c.png", 8, 8, 8192]),
+            ArtworkInfo(["d.png", 8, 8, 6144]),
+            ArtworkInfo(["e.png", 8, 8, 16384]),
+        ]
+        independent, overlapping = split_overlapping(image_infos)
+        self.assertEqual([image_info.name for image_info in independent], ["a.png", "b.png", "e.png"])
+        self.assertEqual([image_info.name for image_info in overlapping], ["big.png", "c.png", "d.png"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+#-------------------------------------------------------------------------------
+#
+# iOS .artwork file extractor
+# (c)2008-2011 Dave Peck <code [at] davepeck [dot] org> All Rights Reserved
+#
+# Released under the three-clause BSD license.
+#
+# http://github.com/davepeck/iphone-tidbits/
+#
+#-------------------------------------------------------------------------------
+
+import os
+import sys
+import shutil
+import tempfile
+import subprocess
+import unittest
+
+import PIL.Image
+
+from artwork.catalog import get_default_catalog
+from artwork.fixtures import write_artwork_file
+
+TOOL = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "iOS-artwork.py")
+
+def run(arguments):
+    """Run iOS-artwork.py, returning the base names of the files it exported or imported."""
+    output = subprocess.check_output([sys.executable, TOOL] + arguments)
+    names = set()
+    for line in output.splitlines():
+        for prefix in ("\texported ", "\timported "):
+            if line.startswith(prefix):
+                names.add(os.path.basename(line[len(prefix):]))
+    return names
+
+
+class TestIncrementalExport(unittest.TestCase):
+    """export --incremental must skip exactly the images whose files are up to date."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.set_info = get_default_catalog().get_set_info(u"MobilePhonePackedImages.artwork", 1422592)
+        self.all_names = set(self.set_info.names)
+        self.artwork_file_name = os.path.join(self.directory, "MobilePhonePackedImages.artwork")
+        write_artwork_file(self.set_info, self.artwork_file_name)
+        self.export_directory = os.path.join(self.directory, "export")
+        os.mkdir(self.export_directory)
+        self.assertEqual(self.export(), self.all_names)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def export(self, *options):
+        return run(["export", "-a", self.artwork_file_name, "-d", self.export_directory, "--incremental"] + list(options))
+
+    def read(self, name):
+        f = open(os.path.join(self.export_directory, name), "rb")
+        contents = f.read()
+        f.close()
+        return contents
+
+    def touch(self, file_name):
+        stat = os.stat(file_name)
+        os.utime(file_name, (stat.st_atime, stat.st_mtime + 10))
+
+    def test_unchanged_is_skipped(self):
+        self.assertEqual(self.export(), set())
+
+    def test_touched_artwork_is_skipped(self):
+        self.touch(self.artwork_file_name)
+        self.assertEqual(self.export(), set())
+
+    def test_edited_output_is_exported(self):
+        name = self.set_info.names[3]
+        original = self.read(name)
+        # The same size, so only the digest can tell.
+        f = open(os.path.join(self.export_directory, name), "wb")
+        f.write(b"\0" * len(original))
+        f.close()
+        self.touch(os.path.join(self.export_directory, name))
+        self.assertEqual(self.export(), set([name]))
+        self.assertEqual(self.read(name), original)
+
+    def test_changed_source_image_is_exported(self):
+        image_info = list(self.set_info.iter_images())[5]
+        f = open(self.artwork_file_name, "r+b")
+        f.seek(image_info.offset)
+        pixel = f.read(4)
+        f.seek(image_info.offset)
+        f.write(b"".join(chr(255 - ord(byte)) for byte in pixel[:3]) + b"\xff")
+        f.close()
+        self.touch(self.artwork_file_name)
+        self.assertEqual(self.export(), set([image_info.name]))
+
+    def test_changed_options_export_everything(self):
+        self.assertEqual(self.export("--compact"), self.all_names)
+        self.assertEqual(self.export("--compact"), set())
+        self.assertEqual(self.export(), self.all_names)
+
+    def test_create_imports_only_edited_images(self):
+        name = self.set_info.names[7]
+        file_name = os.path.join(self.export_directory, name)
+        pil_image = PIL.Image.open(file_name)
+        pil_image.load()
+        pil_image.transpose(PIL.Image.ROTATE_180).save(file_name)
+        self.touch(file_name)
+        create_file_name = os.path.join(self.directory, "created", "MobilePhonePackedImages.artwork")
+        os.mkdir(os.path.dirname(create_file_name))
+        self.assertEqual(run(["create", "-a", self.artwork_file_name, "-d", self.export_directory, "-c", create_file_name]), set([name]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+#-------------------------------------------------------------------------------
+#
+# iOS .artwork file extractor
+# (c)2008-2011 Dave Peck <code [at] davepeck [dot] org> All Rights Reserved
+#
+# Released under the three-clause BSD license.
+#
+# http://github.com/davepeck/iphone-tidbits/
+#
+#-------------------------------------------------------------------------------
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from artwork.catalog import get_default_catalog
+from artwork.fixtures import build_macho, write_file
+from artwork.uikit_file import UIKitBinaryFile
+
+
+class TestUIKitBinaryFile(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        catalog = get_default_catalog()
+        self.iphone_set_infos = [catalog.get_set_info(u"Shared~iphone.artwork", 19529344)] * 2
+        self.ipad_set_infos = [catalog.get_set_info(u"Shared~iphone.artwork", 34798848)] * 2
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def uikit(self, is_64_bit):
+        file_name = os.path.join(self.directory, "UIKit%d" % (64 if is_64_bit else 32))
+        write_file(file_name, build_macho(self.iphone_set_infos, self.ipad_set_infos, is_64_bit))
+        return UIKitBinaryFile(file_name)
+
+    def test_32_bit_image_sets(self):
+        uikit = self.uikit(False)
+        for artwork_sets, set_infos in ((uikit.iter_shared_iphone_image_sets(), self.iphone_set_infos), (uikit.iter_shared_ipad_image_sets(), self.ipad_set_infos)):
+            for artwork_set, set_info in zip(artwork_sets, set_infos):
+                self.assertEqual(artwork_set.name + ".artwork", set_info.name)
+                artworks = [(name, size.width, size.height, size.offset) for name, size in artwork_set.iter_artworks()]
+                self.assertEqual(artworks, [(image_info.name, image_info.width, image_info.height, image_info.offset) for image_info in set_info.iter_images()])
+
+    def test_64_bit_is_refused(self):
+        # Its symbols can still be found; only the unverified artwork tables are refused.
+        uikit = self.uikit(True)
+        self.assertTrue(uikit.shared_iphone_image_sets_offset is not None)
+        self.assertRaises(ValueError, lambda: list(uikit.iter_shared_iphone_image_sets()))
+        self.assertRaises(ValueError, lambda: list(uikit.iter_shared_ipad_image_sets()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+#-------------------------------------------------------------------------------
+#
+# iOS .artwork file extractor
+# (c)2008-2011 Dave Peck <code [at] davepeck [dot] org> All Rights Reserved
+#
+# Released under the three-clause BSD license.
+#
+# http://github.com/davepeck/iphone-tidbits/
+#
+#-------------------------------------------------------------------------------
+
+import unittest
+from random import Random
+
+from artwork.util import MultiPatternSearch
+
+
+def naive_find_all(haystack, pattern, overlapping):
+    """The plain find() loop that MultiPatternSearch must agree with."""
+    offsets = []
+    offset = haystack.find(pattern)
+    while offset != -1:
+        offsets.append(offset)
+        offset = haystack.find(pattern, offset + (1 if overlapping else len(pattern)))
+    return offsets
+
+
+class TestMultiPatternSearch(unittest.TestCase):
+
+    LENGTHS = (1, 2, 3, 4, 8)
+
+    def random_bytes(self, random, length):
+        # A small alphabet, so that patterns occur often and overlap.
+        return "".join(random.choice("ab\0") for i in range(length))
+
+    def check(self, haystack, patterns):
+        search = MultiPatternSearch(patterns)
+        for overlapping in (True, False):
+            found = search.find_all(haystack, overlapping)
+            self.assertEqual(sorted(found.keys()), sorted(set(patterns)))
+            for pattern in set(patterns):
+                self.assertEqual(found[pattern], naive_find_all(haystack, pattern, overlapping), (haystack, pattern, overlapping))
+
+    def test_random_haystacks(self):
+        random = Random(5)
+        for trial in range(200):
+            patterns = [self.random_bytes(random, random.choice(self.LENGTHS)) for i in range(random.randint(1, 12))]
+            haystack = self.random_bytes(random, random.randint(0, 300))
+            # Make sure most patterns occur, at every alignment.
+            for pattern in patterns:
+                position = random.randint(0, len(haystack))
+                haystack = haystack[:position] + pattern + haystack[position:]
+            self.check(haystack, patterns)
+
+    def test_haystacks_shorter_than_a_word(self):
+        random = Random(7)
+        patterns = [self.random_bytes(random, length) for length in self.LENGTHS for i in range(3)]
+        for length in range(0, 8):
+            for trial in range(20):
+                self.check(self.random_bytes(random, length), patterns)
+
+    def test_overlapping_runs(self):
+        haystack = "a" * 37
+        self.check(haystack, ["a", "aa", "aaa", "aaaa", "a" * 8])
+
+
+if __name__ == "__main__":
+    unittest.main()